@@ -0,0 +1,60 @@
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Small in-process worker pool for work that must not hold the request thread (e.g. purging the tasks of a
+# deleted project). Created lazily on first submit and recreated in forked children, so gunicorn --preload
+# workers never share the parent's threads.
+_executor = None
+_lock = threading.Lock()
+
+
+def _config():
+    conf = getattr(settings, "BACKGROUND_TASKS", {})
+    return conf.get("EAGER", False), conf.get("MAX_WORKERS", 2)
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _, max_workers = _config()
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="background")
+        return _executor
+
+
+def _reset_after_fork():
+    global _executor, _lock
+    _executor = None
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _run(fn, args, kwargs):
+    try:
+        return fn(*args, **kwargs)
+    except Exception:
+        logger.exception("Background task %s failed", getattr(fn, "__name__", fn))
+        raise
+
+
+# runs fn(*args, **kwargs) on the worker pool and returns its Future;
+# with BACKGROUND_TASKS["EAGER"] it runs inline instead (tests, management commands)
+def submit(fn, *args, **kwargs):
+    eager, _ = _config()
+    if eager:
+        future = Future()
+        try:
+            future.set_result(_run(fn, args, kwargs))
+        except Exception as exc:
+            future.set_exception(exc)
+        return future
+    return _get_executor().submit(_run, fn, args, kwargs)
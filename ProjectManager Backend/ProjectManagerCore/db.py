@@ -1,7 +1,11 @@
 from pathlib import Path
+import asyncio
 import os
+import threading
+import weakref
 from dotenv import load_dotenv
-from mongoengine import connect
+from mongoengine import disconnect, register_connection
+from pymongo import AsyncMongoClient, MongoClient, ReadPreference
 
 # Optional mongomock fallback for tests/local dev when no real Mongo is available
 try:
@@ -20,13 +24,179 @@ if not CONNECTION_STRING:
     if not mongomock:
         raise Exception("The Connection String is not set in the .env file and mongomock is not installed. Set CONNECTION_STRING or install mongomock.")
 
+# Database behind each mongoengine alias, shared by the sync connections and the async clients below
+DATABASES = {
+    "auth_db": "project_manager_auth",
+    "project_db": "project_manager",
+}
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primarypreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondarypreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+
+def _env_int(name, default=None):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+# pymongo client options from the environment, shared by the mongoengine connections and the async clients.
+# Unset variables keep the driver default, except the two connect timeouts: 5s instead of 30s/20s so a missing
+# cluster fails a request quickly instead of holding a worker.
+#   MONGO_MAX_POOL_SIZE / MONGO_MIN_POOL_SIZE         connections per process (driver default 100 / 0)
+#   MONGO_MAX_IDLE_TIME_MS                            close pooled connections idle for longer than this
+#   MONGO_WAIT_QUEUE_TIMEOUT_MS                       max wait for a free pooled connection
+#   MONGO_SERVER_SELECTION_TIMEOUT_MS                 max wait for a suitable server (default 5000)
+#   MONGO_CONNECT_TIMEOUT_MS                          TCP connect timeout (default 5000)
+#   MONGO_SOCKET_TIMEOUT_MS                           max time for one operation on the socket
+#   MONGO_COMPRESSORS                                 wire compression, e.g. "zstd,snappy,zlib" (zstd/snappy
+#                                                     need the zstandard / python-snappy packages)
+def client_options():
+    options = {
+        "maxPoolSize": _env_int("MONGO_MAX_POOL_SIZE"),
+        "minPoolSize": _env_int("MONGO_MIN_POOL_SIZE"),
+        "maxIdleTimeMS": _env_int("MONGO_MAX_IDLE_TIME_MS"),
+        "waitQueueTimeoutMS": _env_int("MONGO_WAIT_QUEUE_TIMEOUT_MS"),
+        "serverSelectionTimeoutMS": _env_int("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000),
+        "connectTimeoutMS": _env_int("MONGO_CONNECT_TIMEOUT_MS", 5000),
+        "socketTimeoutMS": _env_int("MONGO_SOCKET_TIMEOUT_MS"),
+        "compressors": os.getenv("MONGO_COMPRESSORS") or None,
+    }
+    return {name: value for name, value in options.items() if value is not None}
+
+
+# MONGO_READ_PREFERENCE: primary (default), primaryPreferred, secondary, secondaryPreferred or nearest
+def read_preference():
+    name = os.getenv("MONGO_READ_PREFERENCE") or "primary"
+    try:
+        return READ_PREFERENCES[name.replace("_", "").lower()]
+    except KeyError:
+        raise ValueError(f"Unknown MONGO_READ_PREFERENCE {name!r}, choose from {sorted(READ_PREFERENCES)}")
+
+
+_registered = False
+_lock = threading.Lock()
+
+
+# The MongoClient class mongoengine builds for an alias on its first query. mongoengine parses a host URI as soon
+# as the alias is registered, and for mongodb+srv:// that is a SRV/TXT DNS lookup; so the aliases are registered
+# without a host and the URI only reaches pymongo here, where MongoClient(connect=False) resolves it on first use.
+def uri_client(host=None, port=None, **options):
+    return MongoClient(CONNECTION_STRING, **options)
+
+
+# Registers the auth_db / project_db aliases, once per process (later calls are no-ops). Nothing connects and
+# nothing is resolved here: mongoengine builds the client on the first query of an alias (uri_client above), and
+# connect=False keeps pymongo from starting its monitor threads or SRV lookups before that, so importing settings
+# (manage.py, gunicorn --preload) never touches the network, even when DNS is unavailable.
 def init_db():
-    # Connect auth DB (alias: auth_db)
-    if CONNECTION_STRING:
-        connect(db="project_manager_auth", alias="auth_db", host=CONNECTION_STRING)
-        connect(db="project_manager", alias="project_db", host=CONNECTION_STRING)
-    else:
-        # Use mongomock for in-memory testing/dev
-        connect(db="project_manager_auth", alias="auth_db", host="mongodb://localhost", mongo_client_class=mongomock.MongoClient)
-        connect(db="project_manager", alias="project_db", host="mongodb://localhost", mongo_client_class=mongomock.MongoClient)
+    global _registered
+    with _lock:
+        if _registered:
+            return
+        for alias, db in DATABASES.items():
+            if CONNECTION_STRING:
+                register_connection(alias, db=db, read_preference=read_preference(), connect=False,
+                                    mongo_client_class=uri_client, **client_options())
+            else:
+                # Use mongomock for in-memory testing/dev
+                register_connection(alias, db=db, host="mongodb://localhost", read_preference=read_preference(),
+                                    mongo_client_class=mongomock.MongoClient)
+        _registered = True
+
+
+# A forked worker must not reuse the parent's clients (sockets, monitor threads). If the parent already connected,
+# the child drops those clients and registers the aliases again, so its first query opens its own pool.
+# mongomock clients hold the in-memory data instead of sockets and are kept.
+def _reset_after_fork():
+    global _registered, _lock
+    _lock = threading.Lock()
+    _async_clients.clear()
+    if CONNECTION_STRING and _registered:
+        for alias in DATABASES:
+            disconnect(alias)
+        _registered = False
+        init_db()
+
+
+# Async access for the ASGI views (project_handler/async_views.py). An AsyncMongoClient belongs to the event loop
+# it first ran on, so there is one client per loop (uvicorn: one per worker), dropped together with its loop.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+# the async pymongo collection of a mongoengine document, on the same alias/database as the sync connection;
+# without CONNECTION_STRING it wraps the document's mongomock collection, so sync and async views share data
+def get_async_collection(document):
+    if not CONNECTION_STRING:
+        return MockAsyncCollection(document._get_collection())
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncMongoClient(
+            CONNECTION_STRING, read_preference=read_preference(), **client_options()
+        )
+    return client[DATABASES[document._meta["db_alias"]]][document._get_collection_name()]
+
+
+# The part of pymongo's AsyncCollection API the async views use, on top of a (sync, in-memory) mongomock collection.
+# Every call is plain in-memory work, so running it directly inside the coroutine never blocks on I/O.
+class MockAsyncCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, limit):
+        self._cursor = self._cursor.limit(limit)
+        return self
+
+    async def to_list(self, length=None):
+        rows = list(self._cursor)
+        return rows if length is None else rows[:length]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for row in self._cursor:
+            yield row
+
+
+class MockAsyncCollection:
+    def __init__(self, collection):
+        self._collection = collection
+
+    def with_options(self, **kwargs):
+        return MockAsyncCollection(self._collection.with_options(**kwargs))
+
+    def find(self, *args, **kwargs):
+        return MockAsyncCursor(self._collection.find(*args, **kwargs))
+
+    async def aggregate(self, pipeline, **kwargs):
+        return MockAsyncCursor(self._collection.aggregate(pipeline, **kwargs))
+
+    async def find_one(self, *args, **kwargs):
+        return self._collection.find_one(*args, **kwargs)
+
+    async def insert_one(self, *args, **kwargs):
+        return self._collection.insert_one(*args, **kwargs)
+
+    async def update_one(self, *args, **kwargs):
+        return self._collection.update_one(*args, **kwargs)
+
+    async def find_one_and_update(self, *args, **kwargs):
+        return self._collection.find_one_and_update(*args, **kwargs)
+
+    async def find_one_and_delete(self, *args, **kwargs):
+        return self._collection.find_one_and_delete(*args, **kwargs)
 # `os` is Python's standard library module for interacting with the operating system (env vars, paths, etc.).
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
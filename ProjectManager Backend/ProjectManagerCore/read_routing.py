@@ -0,0 +1,84 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+
+from ProjectManagerCore.db import READ_PREFERENCES
+
+# Opt-in routing of reads to secondaries (MONGO_READ_ROUTING in settings).
+# A view that uses ReadRoutingMixin (or AsyncAPIView) marks its safe requests (GET/HEAD/OPTIONS) as routable; inside
+# such a request every read wrapped in route_read() carries the routed read preference, everything else (writes,
+# unsafe requests, management commands, reads that are not wrapped) stays on the connection default, the primary.
+# Works the same on real clusters and on the mongomock stand-in aliases (which accept and ignore the preference).
+
+# read preference name for reads in the current request, None = primary
+_routed = ContextVar("mongo_routed_read_preference", default=None)
+
+
+def _config():
+    conf = getattr(settings, "MONGO_READ_ROUTING", {})
+    return conf.get("ENABLED", False), conf.get("READ_PREFERENCE", "secondaryPreferred"), conf.get("MAX_STALENESS_SECONDS")
+
+
+@lru_cache(maxsize=16)
+def _read_preference(name, max_staleness):
+    preference = READ_PREFERENCES[name.replace("_", "").lower()]
+    if max_staleness and preference.mode:
+        # maxStalenessSeconds keeps lagging secondaries out of selection (the server requires >= 90)
+        preference = type(preference)(max_staleness=max_staleness)
+    return preference
+
+
+# the read preference a routed read gets right now, None when it must go to the primary
+def current_read_preference():
+    enabled, _, max_staleness = _config()
+    name = _routed.get()
+    if not enabled or not name or name == "primary":
+        return None
+    return _read_preference(name, max_staleness)
+
+
+# returns the mongoengine queryset / (async) pymongo collection with the routed read preference applied,
+# or unchanged when the current request is not routed
+def route_read(target):
+    preference = current_read_preference()
+    if preference is None:
+        return target
+    if hasattr(target, "with_options"):
+        return target.with_options(read_preference=preference)
+    return target.read_preference(preference)
+
+
+# marks the code inside as routable with the given read preference name (None/"primary" = primary)
+@contextmanager
+def routed_reads(name):
+    token = _routed.set(name)
+    try:
+        yield
+    finally:
+        _routed.reset(token)
+
+
+# read-your-writes: every read inside goes to the primary, even in a routed request
+def primary_reads():
+    return routed_reads(None)
+
+
+# preference name for one request to a view: safe methods use the view's read_preference attribute, falling
+# back to MONGO_READ_ROUTING["READ_PREFERENCE"]; unsafe methods always read from the primary
+def read_preference_for(view, method):
+    if method not in SAFE_METHODS:
+        return None
+    return view.read_preference or _config()[1]
+
+
+class ReadRoutingMixin:
+    # None: follow MONGO_READ_ROUTING; "primary" pins the view to the primary (read-your-writes endpoints);
+    # any other name ("nearest", ...) overrides the configured preference for this view
+    read_preference = None
+
+    def dispatch(self, request, *args, **kwargs):
+        with routed_reads(read_preference_for(self, request.method)):
+            return super().dispatch(request, *args, **kwargs)
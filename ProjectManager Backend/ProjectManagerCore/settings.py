@@ -112,25 +112,158 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    # proxies in front of the app; the throttles take the client IP from X-Forwarded-For only behind that many
+    # (0 = REMOTE_ADDR, so a client cannot pick its own IP with a forged header)
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '0')),
 }
 
+# Hard cap on operations accepted by one POST /api/projects/<id>/tasks/batch/ call
+TASK_BATCH_MAX_OPERATIONS = int(os.getenv('TASK_BATCH_MAX_OPERATIONS', '500'))
+
+# NDJSON export/import of a project's tasks (project_handler/transfer.py): export reads EXPORT_BATCH_SIZE tasks per
+# streamed chunk, import writes IMPORT_CHUNK_SIZE tasks per insert_many; longer lines than MAX_LINE_BYTES are rejected
+# and only the first MAX_REPORTED_ERRORS rejected lines are listed in the report (all are counted)
+TASK_TRANSFER = {
+    'EXPORT_BATCH_SIZE': int(os.getenv('TASK_EXPORT_BATCH_SIZE', '500')),
+    'IMPORT_CHUNK_SIZE': int(os.getenv('TASK_IMPORT_CHUNK_SIZE', '500')),
+    'MAX_LINE_BYTES': 64 * 1024,
+    'MAX_REPORTED_ERRORS': 100,
+}
+
+# In-process worker pool (ProjectManagerCore/background.py); EAGER runs submitted work inline
+BACKGROUND_TASKS = {
+    'EAGER': os.getenv('BACKGROUND_TASKS_EAGER', 'False') == 'True',
+    'MAX_WORKERS': int(os.getenv('BACKGROUND_TASKS_MAX_WORKERS', '2')),
+}
+
+# Tasks removed per delete_many when a deleted project is purged
+PROJECT_PURGE_BATCH_SIZE = int(os.getenv('PROJECT_PURGE_BATCH_SIZE', '1000'))
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=30),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# jti denylist (auth_handler/revocation.py): tokens revoked by logout / refresh rotation are stored in
+# auth_db.revoked_tokens (a TTL index drops them at expiry) and mirrored into a per-process Bloom filter, so a
+# token that was never revoked is accepted without a Mongo read. The filter syncs every SYNC_SECONDS (how long a
+# revocation made by another worker takes to reach this one's access-token check; refresh tokens are always
+# checked in Mongo) and is rebuilt every REBUILD_SECONDS. CAPACITY / ERROR_RATE size it (~180 KB by default).
+TOKEN_DENYLIST = {
+    'SYNC_SECONDS': int(os.getenv('TOKEN_DENYLIST_SYNC_SECONDS', '30')),
+    'REBUILD_SECONDS': int(os.getenv('TOKEN_DENYLIST_REBUILD_SECONDS', '3600')),
+    'CAPACITY': int(os.getenv('TOKEN_DENYLIST_CAPACITY', '100000')),
+    'ERROR_RATE': float(os.getenv('TOKEN_DENYLIST_ERROR_RATE', '0.001')),
+}
+
+# Per-process cache of authenticated users (auth_handler/cache.py), saves one Mongo read per request
+AUTH_USER_CACHE = {
+    'ENABLED': os.getenv('AUTH_USER_CACHE_ENABLED', 'True') == 'True',
+    'MAX_SIZE': int(os.getenv('AUTH_USER_CACHE_MAX_SIZE', '1024')),
+    'TTL_SECONDS': int(os.getenv('AUTH_USER_CACHE_TTL_SECONDS', '60')),
+}
+
+# Django caches. "projects" holds the read-through project/task cache (project_handler/cache.py). LocMemCache is
+# per process; entries are checked against the project version in Mongo, so that stays correct with several
+# workers, and a shared PROJECT_CACHE_BACKEND (FileBasedCache with PROJECT_CACHE_LOCATION=/some/dir on one host,
+# Redis/Memcached across hosts) only lets the workers share their fills.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'projects': {
+        'BACKEND': os.getenv('PROJECT_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('PROJECT_CACHE_LOCATION', 'projects'),
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('PROJECT_CACHE_MAX_ENTRIES', '10000'))},
+    },
+    'throttle': {
+        'BACKEND': os.getenv('AUTH_THROTTLE_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('AUTH_THROTTLE_CACHE_LOCATION', 'throttle'),
+    },
+}
+
+PROJECT_CACHE = {
+    'ENABLED': os.getenv('PROJECT_CACHE_ENABLED', 'True') == 'True',
+    'ALIAS': 'projects',
+    'TTL_SECONDS': int(os.getenv('PROJECT_CACHE_TTL_SECONDS', '30')),
+}
+
+# Search endpoint (project_handler/search.py). BACKEND "text" uses $text on the owner_text indexes (build them with
+# sync_indexes --create), "inverted" an in-process inverted index per owner (LRU of MAX_OWNERS), "auto" picks "text"
+# on a real server and "inverted" on mongomock. Pages cover the first MAX_RESULTS hits; queries use MAX_TERMS words.
+PROJECT_SEARCH = {
+    'BACKEND': os.getenv('PROJECT_SEARCH_BACKEND', 'auto'),
+    'MAX_RESULTS': int(os.getenv('PROJECT_SEARCH_MAX_RESULTS', '200')),
+    'MAX_TERMS': 10,
+    'MAX_OWNERS': int(os.getenv('PROJECT_SEARCH_MAX_OWNERS', '1000')),
+}
+
+# Live task events over SSE (project_handler/events.py, GET /api/async/projects/<id>/events/ on ASGI). BUS
+# "change_stream" publishes through the task_events collection and one change stream per worker (needs a replica
+# set, and costs every task write one task_events insert), "local" is in-process pub/sub (one worker only), "off"
+# publishes nothing and serves no streams, "auto" picks "change_stream" on a real server. Each worker
+# serves at most MAX_SUBSCRIBERS streams; a stream closes after MAX_SECONDS (the client reconnects with
+# Last-Event-ID), sends a keepalive every HEARTBEAT_SECONDS and drops a client QUEUE_SIZE events behind.
+# HISTORY is how many missed events a reconnect may replay before it is told to reload instead. Browsers open a
+# stream with a ticket from POST .../events/ticket/ that is valid for TICKET_SECONDS.
+PROJECT_EVENTS = {
+    'BUS': os.getenv('PROJECT_EVENTS_BUS', 'auto'),
+    'MAX_SUBSCRIBERS': int(os.getenv('PROJECT_EVENTS_MAX_SUBSCRIBERS', '1000')),
+    'QUEUE_SIZE': 100,
+    'HISTORY': 100,
+    'HEARTBEAT_SECONDS': 15,
+    'MAX_SECONDS': int(os.getenv('PROJECT_EVENTS_MAX_SECONDS', '300')),
+    'TICKET_SECONDS': int(os.getenv('PROJECT_EVENTS_TICKET_SECONDS', '60')),
+}
+
+# Login/registration throttling (auth_handler/throttling.py): token buckets keyed by client IP and by credential,
+# checked before any Mongo lookup or password hash. BACKEND "local" keeps them in this process (LRU of MAX_KEYS
+# buckets), "cache" keeps them in CACHES["throttle"] (point AUTH_THROTTLE_CACHE_BACKEND at Redis/Memcached)
+# so all workers share them. Rates are "<requests>/<s|min|hour|day>".
+AUTH_THROTTLE = {
+    'ENABLED': os.getenv('AUTH_THROTTLE_ENABLED', 'True') == 'True',
+    'BACKEND': os.getenv('AUTH_THROTTLE_BACKEND', 'local'),
+    'CACHE_ALIAS': 'throttle',
+    'MAX_KEYS': int(os.getenv('AUTH_THROTTLE_MAX_KEYS', '10000')),
+    'RATES': {
+        'login_ip': os.getenv('AUTH_THROTTLE_LOGIN_IP', '20/min'),
+        'login_credential': os.getenv('AUTH_THROTTLE_LOGIN_CREDENTIAL', '5/min'),
+        'register_ip': os.getenv('AUTH_THROTTLE_REGISTER_IP', '10/hour'),
+        'register_email': os.getenv('AUTH_THROTTLE_REGISTER_EMAIL', '3/hour'),
+    },
+}
+
+# Password hashing (auth_handler/hashing.py). METHOD is a werkzeug method string, e.g. "scrypt:32768:8:1" or
+# "pbkdf2:sha256:600000"; hashes made with anything else are upgraded on the next successful login.
+PASSWORD_HASHING = {
+    'METHOD': os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1'),
+    'SALT_LENGTH': int(os.getenv('PASSWORD_HASH_SALT_LENGTH', '16')),
+    'MAX_WORKERS': int(os.getenv('PASSWORD_HASH_MAX_WORKERS', '4')),
+    'MAX_PENDING': int(os.getenv('PASSWORD_HASH_MAX_PENDING', '64')),
+    'ACQUIRE_TIMEOUT': float(os.getenv('PASSWORD_HASH_ACQUIRE_TIMEOUT', '5')),
+}
+
 # CORS
 CORS_ALLOWED_ORIGINS = [FRONTEND_ORIGIN]
 
-# Initialize MongoEngine DB connections early so aliases exist during
-# Django setup (tests import settings and need the `auth_db` alias).
-try:
-    from .db import init_db
-    init_db()
-except Exception:
-    # If init fails, let runtime code handle it; tests will surface errors.
-    pass
+# When True, mongoengine creates the declared indexes on first use of each collection (handy for local dev
+# and tests). In production set it to False and run `python manage.py sync_indexes --create` instead.
+MONGO_AUTO_CREATE_INDEX = os.getenv('MONGO_AUTO_CREATE_INDEX', 'True') == 'True'
+
+# Opt-in routing of GET/HEAD reads in the API views to replica set secondaries (ProjectManagerCore/read_routing.py).
+# Writes, non-GET requests and views pinned with read_preference = "primary" always use the primary.
+MONGO_READ_ROUTING = {
+    'ENABLED': os.getenv('MONGO_READ_ROUTING', 'False') == 'True',
+    'READ_PREFERENCE': os.getenv('MONGO_ROUTED_READ_PREFERENCE', 'secondaryPreferred'),
+    'MAX_STALENESS_SECONDS': int(os.getenv('MONGO_MAX_STALENESS_SECONDS', '0')) or None,
+}
+
+# Register the MongoEngine aliases (auth_db / project_db) early so they exist during Django setup.
+# This only records the connection settings (no URI parsing, no DNS); each process connects lazily on its first query
+# (pool size, timeouts, compression and read preference come from MONGO_* env vars, see ProjectManagerCore/db.py).
+from .db import init_db
+init_db()
 
 # keep DB connection logic in ProjectManagerCore/db.py
 
@@ -0,0 +1,56 @@
+# API-only deployment profile:
+#   DJANGO_SETTINGS_MODULE=ProjectManagerCore.settings_api gunicorn ProjectManagerCore.wsgi
+#
+# Same API, same env vars as settings.py, minus everything a bearer-token JSON API never touches:
+# no admin/sessions/messages/staticfiles apps, no session/CSRF/auth/messages/clickjacking middleware, no template
+# engine or browsable API, and no SQLite database (all data lives in MongoDB through mongoengine).
+# Compare both profiles with `python -m benchmarks.settings_profiles`.
+import os
+
+from .settings import *  # noqa: F401,F403
+
+# django.contrib.auth/contenttypes stay: DRF (AnonymousUser) and simplejwt import their models,
+# but nothing reads or writes them, so they need no database
+INSTALLED_APPS = [
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+
+    # third-party
+    'rest_framework',
+    'rest_framework_mongoengine',
+    'corsheaders',
+
+    # local apps
+    'auth_handler',
+    'project_handler',
+]
+
+# APIView/AsyncAPIView are csrf_exempt and authenticate from the Authorization header, so session, CSRF,
+# AuthenticationMiddleware and messages only cost time on every request
+MIDDLEWARE = [
+    'corsheaders.middleware.CorsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+]
+
+TEMPLATES = []
+
+# no SQL database; Django falls back to its dummy backend, which is never queried
+DATABASES = {}
+
+AUTH_PASSWORD_VALIDATORS = []
+
+# JSON only: the browsable API needs templates and sessions
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,  # noqa: F405
+    'DEFAULT_RENDERER_CLASSES': (
+        'rest_framework.renderers.JSONRenderer',
+    ),
+}
+
+# a WSGI worker serves no event streams, so by default task writes skip the task_events outbox insert (one Mongo
+# operation per write); set PROJECT_EVENTS_BUS=change_stream when ASGI workers stream from the same database
+PROJECT_EVENTS = {
+    **PROJECT_EVENTS,  # noqa: F405
+    'BUS': os.getenv('PROJECT_EVENTS_BUS', 'off'),
+}
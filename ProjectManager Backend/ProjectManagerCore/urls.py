@@ -1,9 +1,16 @@
-
-from django.contrib import admin
+from django.apps import apps
 from django.urls import path, include
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
     path('api/auth/', include('auth_handler.urls')),
     path('api/projects/', include('project_handler.urls')),
+    # async register/login and list/detail/create views for ASGI workers (same responses as the routes above)
+    path('api/async/auth/', include('auth_handler.async_urls')),
+    path('api/async/projects/', include('project_handler.async_urls')),
 ]
+
+# the API-only profile (ProjectManagerCore/settings_api.py) does not install the admin
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+
+    urlpatterns.insert(0, path('admin/', admin.site.urls))
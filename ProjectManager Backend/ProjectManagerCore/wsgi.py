@@ -8,12 +8,8 @@ from django.core.wsgi import get_wsgi_application
 # Set the Django settings module if not already defined
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ProjectManagerCore.settings')
 
-# Initialize MongoEngine DB connections (defined in ProjectManagerCore.db)
-try:
-	from .db import init_db
-	init_db()
-except Exception:
-	pass  # defer connection errors to runtime
+# MongoEngine aliases are registered while the settings load (ProjectManagerCore.db.init_db, lazy and once per
+# process), so nothing to set up here
 
 # WSGI application callable exposed to the WSGI server
 application = get_wsgi_application()
@@ -0,0 +1,8 @@
+from django.urls import path
+from auth_handler.async_views import AsyncRegisterAPIView, AsyncLoginAPIView
+
+# register/login for ASGI workers, mounted under /api/async/auth/ (same responses as auth_handler/urls.py)
+urlpatterns = [
+    path("register/", AsyncRegisterAPIView.as_view(), name="async-auth-register"),
+    path("login/", AsyncLoginAPIView.as_view(), name="async-auth-login"),
+]
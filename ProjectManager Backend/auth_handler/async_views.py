@@ -0,0 +1,126 @@
+from pymongo.errors import DuplicateKeyError
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from auth_handler.models import User
+from auth_handler.serializers import UserSerializer
+from auth_handler.cache import user_cache
+from auth_handler.hashing import HashingBusy
+from auth_handler import hashing
+from auth_handler.throttling import LoginIPThrottle, LoginCredentialThrottle, RegisterIPThrottle, RegisterEmailThrottle
+from auth_handler.views import validate_keys, hashing_busy_response, credential_lookup, pick_login_user, DUPLICATE_USER_MESSAGES
+from project_handler.async_views import AsyncAPIView
+from ProjectManagerCore.db import get_async_collection
+
+
+# Async counterparts of RegisterAPIView/LoginAPIView for ASGI deployments (mounted under /api/async/auth/): the same
+# throttles, checks and response bodies, with the user lookup/insert on the async client and the password hash
+# awaited on the hashing pool (hashing.ahash_password / averify_password), so a login burst never runs a hash on the
+# event loop. A full pool answers 503 right away instead of waiting for a slot.
+
+#Register a new user and return JWT tokens (async).
+
+class AsyncRegisterAPIView(AsyncAPIView):
+    authentication = None
+    throttle_classes = (RegisterIPThrottle, RegisterEmailThrottle)
+
+    async def post(self, request):
+        # Variables---------------------------------------------------------------------------------------------------
+        data = request.data or {}
+        username = data.get("username", None)
+        email = (data.get("email") or "").strip().lower()
+        password = data.get("password", None)
+        password_confirm = data.get("password_confirm", None)
+        # Checking if any field is empty------------------------------------------------------------------------------
+        req = ("username", "email", "password", "password_confirm") #RequiredList
+        missing_response = validate_keys(data, req)
+        if missing_response:
+            return missing_response
+        # Other validations--------------------------------------------------------------------------------------------
+        if password != password_confirm:
+            return Response({"detail": "Passwords do not match"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # one insert, duplicates are rejected by the unique indexes like in RegisterAPIView-----------------------------
+        user = User()
+        try:
+            user.username = username
+            user.email = email
+            user.password = await hashing.ahash_password(password)
+            user.validate()  # runs clean(), which fills username_lower/email_lower
+            result = await get_async_collection(User).insert_one(user.to_mongo())
+            user.id = result.inserted_id
+        except DuplicateKeyError as exc:
+            return Response(
+                {"detail": DUPLICATE_USER_MESSAGES[user.duplicate_field(exc)]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except HashingBusy:
+            return hashing_busy_response()
+        except Exception:
+            return Response({"detail": "Failed to create user"}, status=status.HTTP_400_BAD_REQUEST)
+        # JWT is getting created---------------------------------------------------------------------------------------
+        refresh = RefreshToken.for_user(user)
+        return Response(
+            {
+                "user": UserSerializer(user).data,
+                "access": str(refresh.access_token),
+                "refresh": str(refresh),
+                "message":"User Created Succesfully ..."
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+
+#Authenticate user and return JWT tokens (async).
+
+class AsyncLoginAPIView(AsyncAPIView):
+    authentication = None
+    throttle_classes = (LoginIPThrottle, LoginCredentialThrottle)
+
+    async def post(self, request):
+        # Variables---------------------------------------------------------------------------------------------------
+        data = request.data or {}
+
+        # Checking if any field is empty------------------------------------------------------------------------------
+        req = ("first_credential", "password")  #RequiredList
+        missing_resp = validate_keys(data, req)
+        if missing_resp:
+            return missing_resp
+
+        first_credential = (data.get("first_credential") or "").strip().lower()
+        password = data.get("password")
+
+        # empty value checks------------------------------------------------------------------------------------------
+        if not first_credential:
+            return Response({"detail": "first_credential is required"}, status=status.HTTP_400_BAD_REQUEST)
+        if not password:
+            return Response({"detail": "password is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # the same indexed $or as LoginAPIView, on the async client------------------------------------------------
+        collection = get_async_collection(User)
+        cursor = collection.find(credential_lookup(first_credential)).limit(4)
+        user = pick_login_user([User._from_son(doc) for doc in await cursor.to_list()], first_credential)
+
+        try:
+            if not user or not await hashing.averify_password(user.password, password):
+                return Response({"detail": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
+            # hash made with older PASSWORD_HASHING parameters: upgrade it now that we know the raw password
+            if user.password_needs_rehash():
+                user.password = await hashing.ahash_password(password)
+                await collection.update_one({"_id": user.id}, {"$set": {"password": user.password}})
+                user_cache.invalidate(user.id)
+        except HashingBusy:
+            return hashing_busy_response()
+
+        # JWT is getting created--------------------------------------------------------------------------------------
+        refresh = RefreshToken.for_user(user)
+
+        return Response(
+            {
+                "user": UserSerializer(user).data,
+                "access": str(refresh.access_token),
+                "refresh": str(refresh),
+            },
+            status=status.HTTP_200_OK,
+        )
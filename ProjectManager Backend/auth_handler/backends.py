@@ -1,21 +1,84 @@
+from bson import ObjectId
+from bson.errors import InvalidId
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework.exceptions import AuthenticationFailed
 
 from auth_handler.models import User
+from auth_handler.cache import user_cache
+from auth_handler.revocation import denylist
+from ProjectManagerCore.db import get_async_collection
+from ProjectManagerCore import read_routing
 
 
 class MongoJWTAuthentication(JWTAuthentication):
     user_id_claim = "user_id"
 
+    # signature/expiry as before, then the jti denylist: a Bloom filter check in memory for almost every token,
+    # a Mongo lookup only when the filter says the token may be revoked (auth_handler/revocation.py)
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if denylist.is_revoked(validated_token.get(api_settings.JTI_CLAIM)):
+            raise InvalidToken("Token has been revoked")
+        return validated_token
+
     def get_user(self, validated_token):
         # Extract user id claim from token (default 'user_id')
         user_id = validated_token.get(self.user_id_claim)
         if not user_id:
             raise AuthenticationFailed("Token contained no user identification")
 
-        # Lookup MongoEngine User by id
-        user = User.objects(id=user_id).first()
+        # Per-process LRU/TTL cache first, Mongo only on a miss (see auth_handler/cache.py)
+        user = user_cache.get(user_id)
+        if user is not None:
+            return user
+
+        # Lookup MongoEngine User by id (a secondary in routed GETs; a user registered a moment ago may not have
+        # replicated yet, so a miss there is retried on the primary before the token is rejected)
+        user = read_routing.route_read(User.objects(id=user_id)).first()
+        if user is None and read_routing.current_read_preference() is not None:
+            user = User.objects(id=user_id).first()
         if user is None:
             raise AuthenticationFailed("User not found for given token")
 
+        user_cache.set(user_id, user)
+        return user
+
+# Same checks as MongoJWTAuthentication for the async views: header parsing and token validation are CPU-only and
+# reused as-is, only the user lookup goes through the async client (and the same per-process user cache)
+class AsyncMongoJWTAuthentication(MongoJWTAuthentication):
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = JWTAuthentication.get_validated_token(self, raw_token)
+        if await denylist.ais_revoked(validated_token.get(api_settings.JTI_CLAIM)):
+            raise InvalidToken("Token has been revoked")
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        user_id = validated_token.get(self.user_id_claim)
+        if not user_id:
+            raise AuthenticationFailed("Token contained no user identification")
+
+        user = user_cache.get(user_id)
+        if user is not None:
+            return user
+
+        try:
+            query = {"_id": ObjectId(user_id)}
+        except InvalidId:
+            raise AuthenticationFailed("User not found for given token")
+        doc = await read_routing.route_read(get_async_collection(User)).find_one(query)
+        if doc is None and read_routing.current_read_preference() is not None:
+            doc = await get_async_collection(User).find_one(query)
+        if doc is None:
+            raise AuthenticationFailed("User not found for given token")
+
+        user = User._from_son(doc)
+        user_cache.set(user_id, user)
         return user
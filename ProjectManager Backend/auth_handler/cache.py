@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+# bounded LRU + TTL cache of User documents keyed by user id, one per process.
+# MongoJWTAuthentication.get_user reads through it so repeated requests with the same token skip the
+# User.objects(id=...) round trip. User.save()/delete() invalidate the entry in this process; other
+# processes pick up the change once their entry expires (TTL_SECONDS).
+class UserCache:
+	def __init__(self):
+		self._entries = OrderedDict()  # user_id -> (expires_at, user)
+		self._lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	# settings are read on every call so override_settings / env changes apply without a restart
+	@staticmethod
+	def config():
+		conf = getattr(settings, "AUTH_USER_CACHE", {})
+		return (
+			conf.get("ENABLED", True),
+			conf.get("MAX_SIZE", 1024),
+			conf.get("TTL_SECONDS", 60),
+		)
+
+	@property
+	def enabled(self):
+		return self.config()[0]
+
+	# returns the cached user or None (expired entries count as a miss and are dropped)
+	def get(self, user_id):
+		enabled, _, _ = self.config()
+		if not enabled:
+			return None
+		key = str(user_id)
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is None:
+				self.misses += 1
+				return None
+			expires_at, user = entry
+			if expires_at <= time.monotonic():
+				del self._entries[key]
+				self.misses += 1
+				return None
+			self._entries.move_to_end(key)
+			self.hits += 1
+			return user
+
+	def set(self, user_id, user):
+		enabled, max_size, ttl = self.config()
+		if not enabled or max_size <= 0:
+			return
+		key = str(user_id)
+		with self._lock:
+			self._entries[key] = (time.monotonic() + ttl, user)
+			self._entries.move_to_end(key)
+			while len(self._entries) > max_size:
+				self._entries.popitem(last=False)
+				self.evictions += 1
+
+	def invalidate(self, user_id):
+		with self._lock:
+			self._entries.pop(str(user_id), None)
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+			self.hits = 0
+			self.misses = 0
+			self.evictions = 0
+
+	def stats(self):
+		enabled, max_size, ttl = self.config()
+		with self._lock:
+			lookups = self.hits + self.misses
+			return {
+				"enabled": enabled,
+				"size": len(self._entries),
+				"max_size": max_size,
+				"ttl_seconds": ttl,
+				"hits": self.hits,
+				"misses": self.misses,
+				"evictions": self.evictions,
+				"hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+			}
+
+
+user_cache = UserCache()
@@ -0,0 +1,105 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+# Raised when the hashing pool already has MAX_PENDING jobs and no slot frees up within ACQUIRE_TIMEOUT seconds.
+# Views turn it into a 503 instead of letting a login burst pile up behind every worker.
+class HashingBusy(Exception):
+    pass
+
+
+# Password hashing runs on a small dedicated thread pool:
+# - MAX_WORKERS caps how many hashes burn CPU at the same time (hashlib's scrypt/pbkdf2 release the GIL)
+# - MAX_PENDING caps queued + running jobs, so a burst gets a fast 503 instead of an unbounded queue
+# - the async helpers await the same pool, so an ASGI event loop never runs a hash itself (auth_handler/async_views.py)
+_executor = None
+_slots = None
+_lock = threading.Lock()
+
+
+def _config():
+    conf = getattr(settings, "PASSWORD_HASHING", {})
+    return {
+        "METHOD": conf.get("METHOD", "scrypt"),
+        "SALT_LENGTH": conf.get("SALT_LENGTH", 16),
+        "MAX_WORKERS": conf.get("MAX_WORKERS", 4),
+        "MAX_PENDING": conf.get("MAX_PENDING", 64),
+        "ACQUIRE_TIMEOUT": conf.get("ACQUIRE_TIMEOUT", 5),
+    }
+
+
+def _get_pool():
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            conf = _config()
+            _executor = ThreadPoolExecutor(max_workers=conf["MAX_WORKERS"], thread_name_prefix="password-hash")
+            _slots = threading.BoundedSemaphore(conf["MAX_PENDING"])
+        return _executor, _slots
+
+
+def _reset_after_fork():
+    global _executor, _slots, _lock
+    _executor = None
+    _slots = None
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+# blocking callers wait up to ACQUIRE_TIMEOUT for a slot; async callers never block the loop and fail fast
+def _submit(fn, *args, blocking=True):
+    executor, slots = _get_pool()
+    acquired = slots.acquire(timeout=_config()["ACQUIRE_TIMEOUT"]) if blocking else slots.acquire(blocking=False)
+    if not acquired:
+        raise HashingBusy("Too many password hashes in flight")
+    future = executor.submit(fn, *args)
+    future.add_done_callback(lambda _: slots.release())
+    return future
+
+
+# werkzeug expands short methods ("scrypt" -> "scrypt:32768:8:1"), so the full prefix is taken from a real hash
+@lru_cache(maxsize=8)
+def _full_method(method):
+    return generate_password_hash("", method=method, salt_length=1).split("$", 1)[0]
+
+
+def current_method():
+    return _full_method(_config()["METHOD"])
+
+
+# True when the stored hash was made with other parameters than the configured ones (upgrade it on next login)
+def needs_rehash(password_hash):
+    if not password_hash or "$" not in password_hash:
+        return True
+    return password_hash.split("$", 1)[0] != current_method()
+
+
+def _hash(raw_password, method, salt_length):
+    return generate_password_hash(raw_password, method=method, salt_length=salt_length)
+
+
+def hash_password(raw_password):
+    conf = _config()
+    return _submit(_hash, raw_password, conf["METHOD"], conf["SALT_LENGTH"]).result()
+
+
+def verify_password(password_hash, raw_password):
+    return _submit(check_password_hash, password_hash, raw_password).result()
+
+
+async def ahash_password(raw_password):
+    conf = _config()
+    return await asyncio.wrap_future(_submit(_hash, raw_password, conf["METHOD"], conf["SALT_LENGTH"], blocking=False))
+
+
+async def averify_password(password_hash, raw_password):
+    return await asyncio.wrap_future(_submit(check_password_hash, password_hash, raw_password, blocking=False))
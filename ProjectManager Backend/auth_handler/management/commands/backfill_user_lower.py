@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from mongoengine.queryset.visitor import Q
+from pymongo import UpdateMany
+from pymongo.errors import BulkWriteError
+
+from auth_handler.cache import user_cache
+from auth_handler.models import User
+
+
+class Command(BaseCommand):
+	help = "Fill User.username_lower / User.email_lower for users created before the fields existed."
+
+	def add_arguments(self, parser):
+		parser.add_argument("--batch-size", type=int, default=500, help="Users updated per bulk_write")
+
+	def handle(self, *args, **options):
+		batch_size = options["batch_size"]
+		pending = User.objects(Q(username_lower=None) | Q(email_lower=None)).only("id", "username", "email").as_pymongo()
+
+		updated = 0
+		conflicts = []
+		batch = []
+		for row in pending:
+			set_doc = {
+				"username_lower": User.normalize(row.get("username")) or None,
+				"email_lower": User.normalize(row.get("email")) or None,
+			}
+			# UpdateMany on the unique _id touches one user (mongomock's bulk API rejects pymongo 4's UpdateOne)
+			batch.append((row, UpdateMany({"_id": row["_id"]}, {"$set": set_doc})))
+			if len(batch) >= batch_size:
+				updated += self.flush(batch, conflicts)
+				batch = []
+		if batch:
+			updated += self.flush(batch, conflicts)
+
+		# this process may have these users cached with the old field values
+		user_cache.clear()
+		for row in conflicts:
+			self.stdout.write(self.style.WARNING(
+				f"conflict: {row['_id']} ({row.get('username')}, {row.get('email')}) differs from another user only by case"
+			))
+		self.stdout.write(self.style.SUCCESS(f"updated {updated} user(s), {len(conflicts)} conflict(s)"))
+
+	# unordered, so one case-only duplicate does not stop the rest of the batch
+	def flush(self, batch, conflicts):
+		try:
+			result = User._get_collection().bulk_write([write for _, write in batch], ordered=False)
+			return result.modified_count
+		except BulkWriteError as exc:
+			for error in exc.details.get("writeErrors", []):
+				conflicts.append(batch[error["index"]][0])
+			return exc.details.get("nModified", 0)
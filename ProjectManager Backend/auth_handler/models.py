@@ -1,24 +1,81 @@
+import re
+
 from mongoengine import Document, EmailField, StringField, DateTimeField
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+from django.conf import settings
+
+from auth_handler.cache import user_cache
+from auth_handler import hashing
 
 # User document stored in the auth_db alias
 class User(Document):
-	meta = {"collection": "users", "db_alias": "auth_db"}
+	# username/email/username_lower/email_lower get their unique indexes from unique=True
+	# (the *_lower ones are sparse so users that are not backfilled yet do not collide on null)
+	meta = {
+		"collection": "users",
+		"db_alias": "auth_db",
+		"index_background": True,
+		"auto_create_index": settings.MONGO_AUTO_CREATE_INDEX,
+	}
 	username = StringField(required=True, unique=True)
 	email = EmailField(required=True, unique=True)
 	password = StringField(required=True)
 	created_at = DateTimeField(default=datetime.utcnow)
+	# normalized copies used for login lookups, filled in clean() on every save (backfill_user_lower for old rows)
+	username_lower = StringField(unique=True, sparse=True)
+	email_lower = StringField(unique=True, sparse=True)
 
 	@property
 	def is_authenticated(self):
 		return True
 
+	@staticmethod
+	def normalize(value):
+		return (value or "").strip().lower()
+
+	# runs as part of validate() on save, keeps the normalized fields in step with username/email
+	def clean(self):
+		self.username_lower = self.normalize(self.username) or None
+		self.email_lower = self.normalize(self.email) or None
+
+	# hashing runs on the bounded pool in auth_handler/hashing.py with the PASSWORD_HASHING settings
 	def set_password(self, raw_password):
-		self.password = generate_password_hash(raw_password)
+		self.password = hashing.hash_password(raw_password)
 
 	def check_password(self, raw_password):
-		return check_password_hash(self.password, raw_password)
+		return hashing.verify_password(self.password, raw_password)
+
+	# stored hash was made with an older method/cost than PASSWORD_HASHING["METHOD"]
+	def password_needs_rehash(self):
+		return hashing.needs_rehash(self.password)
+
+	# which unique field ("email" or "username") a NotUniqueError raised by save() (or a DuplicateKeyError) collided on.
+	# MongoDB reports it in the DuplicateKeyError (keyPattern / index name); stand-ins that do not
+	# (mongomock) get one lookup on this already-failed path, never on a successful insert
+	def duplicate_field(self, exc):
+		error = exc.__cause__ or exc.__context__ or exc  # the DuplicateKeyError itself on the async insert path
+		details = getattr(error, "details", None) or {}
+		index = " ".join(details.get("keyPattern") or {})
+		if not index:
+			match = re.search(r"index: (\S+)", str(error))
+			index = match.group(1) if match else ""
+		if "email" in index:
+			return "email"
+		if "username" in index:
+			return "username"
+		if User.objects(email_lower=self.normalize(self.email)).only("id").first():
+			return "email"
+		return "username"
+
+	# drop this user from the per-process auth cache whenever it is written or removed
+	def save(self, *args, **kwargs):
+		result = super().save(*args, **kwargs)
+		user_cache.invalidate(self.id)
+		return result
+
+	def delete(self, *args, **kwargs):
+		user_cache.invalidate(self.id)
+		return super().delete(*args, **kwargs)
 
 	def to_safe_dict(self):
 		# return a dict safe for JSON responses (no password)
@@ -30,6 +87,28 @@ class User(Document):
 		}
 
 
+# jti of a revoked token (logout, refresh token rotation). Mongo removes each row once the token would have expired
+# anyway (TTL index on expires_at), so the collection only holds tokens that could still be presented.
+# auth_handler/revocation.py keeps a per-process Bloom filter of these ids in front of it.
+class RevokedToken(Document):
+	meta = {
+		"collection": "revoked_tokens",
+		"db_alias": "auth_db",
+		"indexes": [
+			{"fields": ["expires_at"], "expireAfterSeconds": 0, "name": "expires_at_ttl"},
+			# incremental Bloom filter syncs read the rows revoked since the previous sync
+			{"fields": ["revoked_at"], "name": "revoked_at"},
+		],
+		"index_background": True,
+		"auto_create_index": settings.MONGO_AUTO_CREATE_INDEX,
+	}
+	jti = StringField(primary_key=True)
+	token_type = StringField()
+	user_id = StringField()
+	expires_at = DateTimeField(required=True)
+	revoked_at = DateTimeField(default=datetime.utcnow)
+
+
 
 # This is how i understood the flow :
 # Register:
@@ -44,4 +123,5 @@ class User(Document):
 # Step 1 : receive raw_password 
 # Step 2 : load user by email
 # Step 3 : call user.check_password(raw_password)
-# Step 4 : check_password_hash(self.password, raw_password) returns True/False.
\ No newline at end of file
+# Step 4 : check_password_hash(self.password, raw_password) returns True/False.
+# Step 5 : if the hash used old parameters (password_needs_rehash), set_password + save upgrades it.
\ No newline at end of file
@@ -0,0 +1,154 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from mongoengine.errors import NotUniqueError
+from rest_framework_simplejwt.settings import api_settings
+
+from auth_handler.models import RevokedToken
+
+
+# Fixed-size Bloom filter over strings: no false negatives, false positives at about error_rate once `capacity`
+# items are in. Positions come from one blake2b digest split into two halves (double hashing h1 + i * h2).
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+# jti denylist: RevokedToken rows in auth_db, fronted by a Bloom filter of them in every process.
+# - a jti that is not in the filter was not revoked as of the last sync: accepted without touching Mongo
+# - a filter hit (revoked, or a false positive) is confirmed with one _id lookup
+# - revoke() inserts the row (the _id makes it atomic, a second revoke of the same jti reports False) and adds
+#   the jti to this process's filter right away; other processes see it after their next sync (SYNC_SECONDS)
+# - syncs read only the rows revoked since the previous one; every REBUILD_SECONDS the filter is rebuilt from
+#   the unexpired rows, so tokens the TTL index dropped stop taking up bits
+class Denylist:
+    # revoked_at comes from the clock of whichever worker revoked; the incremental sync reads back this far
+    SYNC_OVERLAP = timedelta(seconds=60)
+
+    def __init__(self):
+        self._sync_lock = threading.Lock()
+        self.reset()
+
+    @staticmethod
+    def config():
+        conf = getattr(settings, "TOKEN_DENYLIST", {})
+        return {
+            "SYNC_SECONDS": conf.get("SYNC_SECONDS", 30),
+            "REBUILD_SECONDS": conf.get("REBUILD_SECONDS", 3600),
+            "CAPACITY": conf.get("CAPACITY", 100000),
+            "ERROR_RATE": conf.get("ERROR_RATE", 0.001),
+        }
+
+    def reset(self):
+        self._bloom = None
+        self._synced_at = 0.0  # monotonic
+        self._rebuilt_at = 0.0  # monotonic
+        self._watermark = None  # utc datetime the next incremental sync reads from
+        self.checks = 0
+        self.lookups = 0
+        self.false_positives = 0
+
+    def sync(self):
+        conf = self.config()
+        now = time.monotonic()
+        started = datetime.utcnow()
+        rebuild = self._bloom is None or now - self._rebuilt_at >= conf["REBUILD_SECONDS"]
+        bloom = BloomFilter(conf["CAPACITY"], conf["ERROR_RATE"]) if rebuild else self._bloom
+        query = RevokedToken.objects(expires_at__gt=started)
+        if not rebuild:
+            query = query.filter(revoked_at__gte=self._watermark)
+        for jti in query.scalar("jti"):
+            bloom.add(jti)
+        if rebuild:
+            self._bloom, self._rebuilt_at = bloom, now
+        self._watermark = started - self.SYNC_OVERLAP
+        self._synced_at = now
+
+    def sync_due(self):
+        return self._bloom is None or time.monotonic() - self._synced_at >= self.config()["SYNC_SECONDS"]
+
+    # one thread syncs, the others keep using the current filter instead of waiting (unless there is none yet)
+    def _maybe_sync(self):
+        if not self.sync_due():
+            return
+        if not self._sync_lock.acquire(blocking=self._bloom is None):
+            return
+        try:
+            if self.sync_due():
+                self.sync()
+        finally:
+            self._sync_lock.release()
+
+    def is_revoked(self, jti):
+        if not jti:
+            return False
+        self._maybe_sync()
+        self.checks += 1
+        if jti not in self._bloom:
+            return False
+        self.lookups += 1
+        revoked = RevokedToken.objects(jti=jti).only("jti").first() is not None
+        if not revoked:
+            self.false_positives += 1
+        return revoked
+
+    # the async views only leave the event loop when Mongo may be involved (a sync is due or the filter hit)
+    async def ais_revoked(self, jti):
+        if jti and not self.sync_due() and jti not in self._bloom:
+            self.checks += 1
+            return False
+        return await sync_to_async(self.is_revoked)(jti)
+
+    # revokes a simplejwt token until it expires; False when its jti was revoked already (e.g. a replayed refresh token)
+    def revoke(self, token):
+        jti = token[api_settings.JTI_CLAIM]
+        row = RevokedToken(
+            jti=jti,
+            token_type=token.get(api_settings.TOKEN_TYPE_CLAIM),
+            user_id=str(token.get(api_settings.USER_ID_CLAIM)),
+            expires_at=datetime.utcfromtimestamp(token["exp"]),
+        )
+        try:
+            row.save(force_insert=True)
+            revoked = True
+        except NotUniqueError:
+            revoked = False
+        self._maybe_sync()
+        self._bloom.add(jti)
+        return revoked
+
+    def stats(self):
+        bloom = self._bloom
+        return {
+            "items": bloom.count if bloom else 0,
+            "bits": bloom.size if bloom else 0,
+            "hashes": bloom.hashes if bloom else 0,
+            "checks": self.checks,
+            "lookups": self.lookups,
+            "false_positives": self.false_positives,
+        }
+
+
+denylist = Denylist()
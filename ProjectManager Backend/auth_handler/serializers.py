@@ -1,3 +1,4 @@
+from mongoengine.errors import NotUniqueError
 from rest_framework_mongoengine.serializers import DocumentSerializer
 from auth_handler.models import User
 from rest_framework.exceptions import ValidationError
@@ -26,16 +27,6 @@ class RegisterSerializer(DocumentSerializer):
             raise ValidationError("Passwords do not match")
         return attrs
 
-    def validate_email(self, value):
-        if User.objects(email=value).first():
-            raise ValidationError("This email is already registered")
-        return value
-
-    def validate_username(self, value):
-        if User.objects(username=value).first():
-            raise ValidationError("This username is already taken")
-        return value
-
     def create(self, validated_data):
         # ensure confirmation isn't saved if present
         validated_data.pop("password_confirm", None)
@@ -44,7 +35,13 @@ class RegisterSerializer(DocumentSerializer):
         user = User(**validated_data)
         if raw_password:
             user.set_password(raw_password)
-        user.save()
+        # uniqueness is enforced by the indexes on User, not by pre-check queries
+        try:
+            user.save()
+        except NotUniqueError as exc:
+            field = user.duplicate_field(exc)
+            message = "This email is already registered" if field == "email" else "This username is already taken"
+            raise ValidationError({field: [message]})
         return user
 
 # Notes:
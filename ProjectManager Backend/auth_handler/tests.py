@@ -1,9 +1,32 @@
 from rest_framework.test import APITestCase
 from django.urls import reverse
-from auth_handler.models import User
+import asyncio
+from io import StringIO
+from datetime import datetime, timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+
+from django.core.cache import caches
+from django.test import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from auth_handler.models import User, RevokedToken
+from auth_handler.revocation import BloomFilter, denylist
+from auth_handler.cache import user_cache
+from auth_handler import hashing, throttling
 
 
 class AuthTests(APITestCase):
+	def setUp(self):
+		# every test registers/logs in from the same client IP, so start with full buckets
+		throttling.reset()
+
+	def tearDown(self):
+		# mongo data is not rolled back with the test transaction, so drop it explicitly
+		User.drop_collection()
+		user_cache.clear()
+
 	def test_register_and_login(self):
 		url = reverse('auth-register')
 		data = {
@@ -19,7 +42,446 @@ class AuthTests(APITestCase):
 
 		# login
 		url = reverse('auth-login')
-		resp2 = self.client.post(url, {'email': 'test@example.com', 'password': 'securepass'}, format='json')
+		resp2 = self.client.post(url, {'first_credential': 'test@example.com', 'password': 'securepass'}, format='json')
 		self.assertEqual(resp2.status_code, 200)
 		self.assertIn('access', resp2.data)
 		self.assertIn('refresh', resp2.data)
+
+	def test_login_with_username_is_case_insensitive(self):
+		self.client.post(reverse('auth-register'), {
+			'username': 'MixedCase',
+			'email': 'Mixed@Example.com',
+			'password': 'securepass',
+			'password_confirm': 'securepass'
+		}, format='json')
+		user = User.objects.get(username='MixedCase')
+		self.assertEqual(user.username_lower, 'mixedcase')
+		self.assertEqual(user.email_lower, 'mixed@example.com')
+		url = reverse('auth-login')
+		for credential in ('mixedcase', 'MIXEDCASE', ' MixedCase ', 'MIXED@example.com'):
+			resp = self.client.post(url, {'first_credential': credential, 'password': 'securepass'}, format='json')
+			self.assertEqual(resp.status_code, 200, credential)
+		resp = self.client.post(url, {'first_credential': 'mixedcase', 'password': 'wrong'}, format='json')
+		self.assertEqual(resp.status_code, 401)
+
+	def test_login_by_email_before_backfill(self):
+		User._get_collection().insert_one({'username': 'Legacy', 'email': 'legacy@example.com', 'password': ''})
+		user = User.objects.get(username='Legacy')
+		user.set_password('securepass')
+		User._get_collection().update_one({'_id': user.id}, {'$set': {'password': user.password}})
+		resp = self.client.post(reverse('auth-login'), {'first_credential': 'Legacy@Example.com', 'password': 'securepass'}, format='json')
+		self.assertEqual(resp.status_code, 200)
+		# the raw username too (the credential is lowercased, so only usernames stored in lowercase match before the backfill)
+		User._get_collection().insert_one({'username': 'oldtimer', 'email': 'oldtimer@example.com', 'password': user.password})
+		resp = self.client.post(reverse('auth-login'), {'first_credential': 'OldTimer', 'password': 'securepass'}, format='json')
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp.data['user']['username'], 'oldtimer')
+
+	def test_username_is_unique_ignoring_case(self):
+		data = {'username': 'Taken', 'email': 'one@example.com', 'password': 'securepass', 'password_confirm': 'securepass'}
+		self.assertEqual(self.client.post(reverse('auth-register'), data, format='json').status_code, 201)
+		data.update(username='TAKEN', email='two@example.com')
+		self.assertEqual(self.client.post(reverse('auth-register'), data, format='json').status_code, 400)
+
+	def test_register_duplicate_is_reported_per_field(self):
+		url = reverse('auth-register')
+		data = {'username': 'first', 'email': 'first@example.com', 'password': 'securepass', 'password_confirm': 'securepass'}
+		self.assertEqual(self.client.post(url, data, format='json').status_code, 201)
+		resp = self.client.post(url, dict(data, username='second'), format='json')
+		self.assertEqual(resp.status_code, 400)
+		self.assertEqual(resp.data['detail'], 'User with that email already exists')
+		resp = self.client.post(url, dict(data, email='second@example.com'), format='json')
+		self.assertEqual(resp.status_code, 400)
+		self.assertEqual(resp.data['detail'], 'User with that username already exists')
+		self.assertEqual(User.objects.count(), 1)
+
+	def test_register_does_not_query_before_insert(self):
+		url = reverse('auth-register')
+		data = {'username': 'solo', 'email': 'solo@example.com', 'password': 'securepass', 'password_confirm': 'securepass'}
+		with mock.patch.object(User, 'duplicate_field') as duplicate_field, \
+				mock.patch('auth_handler.views.User.objects') as objects:
+			resp = self.client.post(url, data, format='json')
+		self.assertEqual(resp.status_code, 201)
+		objects.assert_not_called()
+		duplicate_field.assert_not_called()
+
+	def test_backfill_user_lower_command(self):
+		collection = User._get_collection()
+		collection.insert_one({'username': 'Legacy', 'email': 'Legacy@Example.com', 'password': 'x'})
+		out = StringIO()
+		call_command('backfill_user_lower', stdout=out)
+		self.assertIn('updated 1 user(s)', out.getvalue())
+		row = collection.find_one({'username': 'Legacy'})
+		self.assertEqual(row['username_lower'], 'legacy')
+		self.assertEqual(row['email_lower'], 'legacy@example.com')
+
+
+class UserCacheTests(APITestCase):
+	def setUp(self):
+		throttling.reset()
+		user_cache.clear()
+		resp = self.client.post(reverse('auth-register'), {
+			'username': 'cacheuser',
+			'email': 'cache@example.com',
+			'password': 'securepass',
+			'password_confirm': 'securepass'
+		}, format='json')
+		self.assertEqual(resp.status_code, 201)
+		self.user_id = resp.data['user']['id']
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + resp.data['access'])
+
+	def tearDown(self):
+		User.drop_collection()
+		user_cache.clear()
+
+	def test_repeated_requests_hit_the_cache(self):
+		for _ in range(3):
+			resp = self.client.get(reverse('auth-me'))
+			self.assertEqual(resp.status_code, 200)
+		stats = self.client.get(reverse('auth-user-cache-stats')).data
+		self.assertEqual(stats['misses'], 1)
+		self.assertEqual(stats['hits'], 3)
+		self.assertEqual(stats['size'], 1)
+
+	def test_save_invalidates_entry(self):
+		self.client.get(reverse('auth-me'))
+		user = User.objects.get(id=self.user_id)
+		user.username = 'renamed'
+		user.save()
+		resp = self.client.get(reverse('auth-me'))
+		self.assertEqual(resp.data['user']['username'], 'renamed')
+
+	@override_settings(AUTH_USER_CACHE={'ENABLED': False})
+	def test_disabled_cache_always_reads_mongo(self):
+		self.client.get(reverse('auth-me'))
+		self.client.get(reverse('auth-me'))
+		self.assertEqual(user_cache.stats()['size'], 0)
+		self.assertEqual(user_cache.stats()['hits'], 0)
+
+	@override_settings(AUTH_USER_CACHE={'ENABLED': True, 'MAX_SIZE': 2, 'TTL_SECONDS': 60})
+	def test_lru_eviction(self):
+		user_cache.set('a', object())
+		user_cache.set('b', object())
+		user_cache.get('a')
+		user_cache.set('c', object())
+		self.assertIsNotNone(user_cache.get('a'))
+		self.assertIsNone(user_cache.get('b'))
+		self.assertEqual(user_cache.stats()['evictions'], 1)
+
+	@override_settings(AUTH_USER_CACHE={'ENABLED': True, 'MAX_SIZE': 10, 'TTL_SECONDS': 0})
+	def test_expired_entry_is_a_miss(self):
+		user_cache.set('a', object())
+		self.assertIsNone(user_cache.get('a'))
+
+
+class PasswordHashingTests(APITestCase):
+	def setUp(self):
+		# every test registers/logs in from the same client IP, so start with full buckets
+		throttling.reset()
+
+	def tearDown(self):
+		User.drop_collection()
+		user_cache.clear()
+
+	def register(self):
+		resp = self.client.post(reverse('auth-register'), {
+			'username': 'hashuser',
+			'email': 'hash@example.com',
+			'password': 'securepass',
+			'password_confirm': 'securepass'
+		}, format='json')
+		self.assertEqual(resp.status_code, 201)
+
+	def login(self):
+		return self.client.post(reverse('auth-login'), {'first_credential': 'hash@example.com', 'password': 'securepass'}, format='json')
+
+	@override_settings(PASSWORD_HASHING={'METHOD': 'pbkdf2:sha256:1000'})
+	def test_hash_uses_configured_method(self):
+		self.register()
+		self.assertTrue(User.objects.get(username='hashuser').password.startswith('pbkdf2:sha256:1000$'))
+
+	def test_login_rehashes_outdated_hash(self):
+		with self.settings(PASSWORD_HASHING={'METHOD': 'pbkdf2:sha256:1000'}):
+			self.register()
+		with self.settings(PASSWORD_HASHING={'METHOD': 'pbkdf2:sha256:2000'}):
+			self.assertEqual(self.login().status_code, 200)
+			stored = User.objects.get(username='hashuser').password
+			self.assertTrue(stored.startswith('pbkdf2:sha256:2000$'))
+			# already current: a second login leaves the hash alone
+			self.assertEqual(self.login().status_code, 200)
+			self.assertEqual(User.objects.get(username='hashuser').password, stored)
+
+	@override_settings(PASSWORD_HASHING={'METHOD': 'pbkdf2:sha256:1000'})
+	def test_busy_pool_returns_503(self):
+		self.register()
+		with mock.patch('auth_handler.models.hashing.verify_password', side_effect=hashing.HashingBusy):
+			resp = self.login()
+		self.assertEqual(resp.status_code, 503)
+		self.assertEqual(resp['Retry-After'], '1')
+
+	@override_settings(PASSWORD_HASHING={'METHOD': 'pbkdf2:sha256:1000'})
+	def test_async_helpers_run_on_the_pool(self):
+		async def roundtrip():
+			password_hash = await hashing.ahash_password('secret')
+			return password_hash, await hashing.averify_password(password_hash, 'secret')
+		password_hash, ok = asyncio.run(roundtrip())
+		self.assertTrue(ok)
+		self.assertFalse(hashing.needs_rehash(password_hash))
+		self.assertTrue(hashing.needs_rehash('scrypt:16384:8:1$salt$hash'))
+
+
+def throttle_settings(backend='local', max_keys=100, **rates):
+	return {
+		'ENABLED': True,
+		'BACKEND': backend,
+		'CACHE_ALIAS': 'throttle',
+		'MAX_KEYS': max_keys,
+		'RATES': dict({'login_ip': '100/min', 'login_credential': '100/min', 'register_ip': '100/hour',
+			'register_email': '100/hour'}, **rates),
+	}
+
+
+@override_settings(PASSWORD_HASHING={'METHOD': 'pbkdf2:sha256:1000'})
+class ThrottleTests(APITestCase):
+	def setUp(self):
+		throttling.reset()
+
+	def tearDown(self):
+		User.drop_collection()
+		user_cache.clear()
+		throttling.reset()
+
+	def register(self, username, **extra):
+		return self.client.post(reverse('auth-register'), {
+			'username': username,
+			'email': f'{username}@example.com',
+			'password': 'securepass',
+			'password_confirm': 'securepass'
+		}, format='json', **extra)
+
+	def login(self, credential, **extra):
+		return self.client.post(reverse('auth-login'), {'first_credential': credential, 'password': 'wrongpass'},
+			format='json', **extra)
+
+	@override_settings(AUTH_THROTTLE=throttle_settings(login_credential='2/min'))
+	def test_login_throttled_per_credential_before_lookup_and_hash(self):
+		self.register('throttled')
+		self.assertEqual(self.login('throttled@example.com').status_code, 401)
+		self.assertEqual(self.login(' THROTTLED@example.com').status_code, 401)
+		with mock.patch('auth_handler.views.User.objects') as objects, \
+				mock.patch('auth_handler.models.hashing.verify_password') as verify:
+			resp = self.login('throttled@example.com')
+		self.assertEqual(resp.status_code, 429)
+		self.assertEqual(resp['Retry-After'], '30')
+		objects.assert_not_called()
+		verify.assert_not_called()
+		# other credentials from the same IP still get through
+		self.assertEqual(self.login('someone@example.com').status_code, 401)
+
+	@override_settings(AUTH_THROTTLE=throttle_settings(login_ip='3/min'))
+	def test_login_throttled_per_ip_even_with_forged_forwarded_for(self):
+		for i in range(3):
+			self.assertEqual(self.login(f'user{i}@example.com', HTTP_X_FORWARDED_FOR=f'10.0.0.{i}').status_code, 401)
+		self.assertEqual(self.login('user9@example.com', HTTP_X_FORWARDED_FOR='10.0.0.9').status_code, 429)
+		# another client IP has its own bucket
+		self.assertEqual(self.login('user9@example.com', REMOTE_ADDR='10.1.1.1').status_code, 401)
+
+	@override_settings(AUTH_THROTTLE=throttle_settings(register_ip='2/hour', register_email='1/hour'))
+	def test_register_throttled_per_ip_and_email(self):
+		self.assertEqual(self.register('first').status_code, 201)
+		# same email again: the email bucket stops it before the duplicate key error
+		self.assertEqual(self.register('first').status_code, 429)
+		self.assertEqual(self.register('second').status_code, 429)
+		self.assertEqual(User.objects.count(), 1)
+
+	def test_bucket_refills_over_time(self):
+		bucket = throttling.LocalBuckets()
+		with mock.patch('auth_handler.throttling.time.monotonic', return_value=100.0):
+			self.assertEqual([bucket.take('k', 2, 1 / 30) for _ in range(3)], [0, 0, 30])
+		with mock.patch('auth_handler.throttling.time.monotonic', return_value=115.0):
+			self.assertEqual(bucket.take('k', 2, 1 / 30), 15)
+		with mock.patch('auth_handler.throttling.time.monotonic', return_value=130.0):
+			self.assertEqual(bucket.take('k', 2, 1 / 30), 0)
+
+	@override_settings(AUTH_THROTTLE=throttle_settings(max_keys=2))
+	def test_local_buckets_are_bounded(self):
+		bucket = throttling.LocalBuckets()
+		for key in ('a', 'b', 'a', 'c'):
+			bucket.take(key, 5, 1)
+		self.assertEqual(len(bucket), 2)
+		self.assertEqual(bucket.evictions, 1)
+		self.assertEqual(list(bucket._buckets), ['a', 'c'])
+
+	@override_settings(AUTH_THROTTLE=throttle_settings(backend='cache', login_credential='1/min'))
+	def test_cache_backend_is_shared(self):
+		self.assertEqual(self.login('shared@example.com').status_code, 401)
+		# the bucket lives in CACHES["throttle"], not in this process: a fresh local store changes nothing
+		throttling.BACKENDS['local'].reset()
+		self.assertEqual(self.login('shared@example.com').status_code, 429)
+		key = 'throttle:login_credential:' + throttling.credential_key('shared@example.com')
+		self.assertIsNotNone(caches['throttle'].get(key))
+
+	@override_settings(AUTH_THROTTLE=dict(throttle_settings(login_ip='1/min'), ENABLED=False))
+	def test_disabled(self):
+		for _ in range(3):
+			self.assertEqual(self.login('free@example.com').status_code, 401)
+
+
+@override_settings(PASSWORD_HASHING={'METHOD': 'pbkdf2:sha256:1000'})
+class AsyncAuthTests(APITestCase):
+	def setUp(self):
+		throttling.reset()
+
+	def tearDown(self):
+		User.drop_collection()
+		user_cache.clear()
+		throttling.reset()
+
+	async def register(self, username, email=None):
+		return await self.async_client.post(reverse('async-auth-register'), {
+			'username': username,
+			'email': email or f'{username}@example.com',
+			'password': 'securepass',
+			'password_confirm': 'securepass'
+		}, content_type='application/json')
+
+	async def login(self, credential, password='securepass'):
+		return await self.async_client.post(reverse('async-auth-login'), {'first_credential': credential, 'password': password},
+			content_type='application/json')
+
+	async def test_register_and_login_await_the_hashing_pool(self):
+		# the blocking helpers would run the hash on the event loop
+		with mock.patch('auth_handler.hashing.hash_password', side_effect=AssertionError('blocking hash')), \
+				mock.patch('auth_handler.hashing.verify_password', side_effect=AssertionError('blocking verify')):
+			resp = await self.register('asyncuser')
+			self.assertEqual(resp.status_code, 201)
+			self.assertEqual(resp.json()['user']['username'], 'asyncuser')
+			for credential in ('AsyncUser', 'asyncuser@example.com'):
+				resp = await self.login(credential)
+				self.assertEqual(resp.status_code, 200, credential)
+				self.assertIn('access', resp.json())
+			self.assertEqual((await self.login('asyncuser', 'wrongpass')).status_code, 401)
+		user = await sync_to_async(User.objects.get)(username='asyncuser')
+		self.assertEqual((user.username_lower, user.email_lower), ('asyncuser', 'asyncuser@example.com'))
+		# the sync login accepts the user the async view created
+		resp = await sync_to_async(self.client.post)(reverse('auth-login'),
+			{'first_credential': 'asyncuser', 'password': 'securepass'}, format='json')
+		self.assertEqual(resp.status_code, 200)
+
+	async def test_register_duplicates_are_reported_per_field(self):
+		self.assertEqual((await self.register('first')).status_code, 201)
+		resp = await self.register('second', 'first@example.com')
+		self.assertEqual((resp.status_code, resp.json()['detail']), (400, 'User with that email already exists'))
+		resp = await self.register('FIRST', 'other@example.com')
+		self.assertEqual((resp.status_code, resp.json()['detail']), (400, 'User with that username already exists'))
+
+	async def test_login_rehashes_and_busy_pool_returns_503(self):
+		await self.register('rehash')
+		with self.settings(PASSWORD_HASHING={'METHOD': 'pbkdf2:sha256:2000'}):
+			self.assertEqual((await self.login('rehash')).status_code, 200)
+			user = await sync_to_async(User.objects.get)(username='rehash')
+			self.assertTrue(user.password.startswith('pbkdf2:sha256:2000$'))
+		with mock.patch('auth_handler.hashing.averify_password', side_effect=hashing.HashingBusy):
+			resp = await self.login('rehash')
+		self.assertEqual((resp.status_code, resp['Retry-After']), (503, '1'))
+
+	@override_settings(AUTH_THROTTLE=throttle_settings(login_credential='1/min'))
+	async def test_login_is_throttled(self):
+		self.assertEqual((await self.login('nobody@example.com')).status_code, 401)
+		with mock.patch('auth_handler.hashing.averify_password') as verify:
+			resp = await self.login('nobody@example.com')
+		self.assertEqual((resp.status_code, resp['Retry-After']), (429, '60'))
+		verify.assert_not_called()
+
+
+@override_settings(PASSWORD_HASHING={'METHOD': 'pbkdf2:sha256:1000'})
+class TokenRevocationTests(APITestCase):
+	def setUp(self):
+		throttling.reset()
+		denylist.reset()
+		resp = self.client.post(reverse('auth-register'), {
+			'username': 'revoker',
+			'email': 'revoker@example.com',
+			'password': 'securepass',
+			'password_confirm': 'securepass'
+		}, format='json')
+		self.access, self.refresh = resp.data['access'], resp.data['refresh']
+
+	def tearDown(self):
+		User.drop_collection()
+		RevokedToken.drop_collection()
+		user_cache.clear()
+		denylist.reset()
+
+	def refresh_with(self, token):
+		return self.client.post(reverse('auth-token-refresh'), {'refresh': token}, format='json')
+
+	def test_refresh_rotates_and_is_single_use(self):
+		resp = self.refresh_with(self.refresh)
+		self.assertEqual(resp.status_code, 200)
+		self.assertNotEqual(resp.data['refresh'], self.refresh)
+		# replaying the old refresh token fails, the rotated one works once
+		self.assertEqual(self.refresh_with(self.refresh).status_code, 401)
+		self.assertEqual(self.refresh_with(resp.data['refresh']).status_code, 200)
+		self.assertEqual(self.refresh_with(resp.data['refresh']).status_code, 401)
+		self.assertEqual(RevokedToken.objects(token_type='refresh').count(), 2)
+
+	def test_logout_revokes_refresh_and_access(self):
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.access)
+		self.assertEqual(self.client.get(reverse('auth-me')).status_code, 200)
+		resp = self.client.post(reverse('auth-logout'), {'refresh': self.refresh}, format='json')
+		self.assertEqual(resp.status_code, 200)
+
+		self.assertEqual(self.client.get(reverse('auth-me')).status_code, 401)
+		self.client.credentials()
+		self.assertEqual(self.refresh_with(self.refresh).status_code, 401)
+		resp = self.client.post(reverse('auth-token-verify'), {'token': self.access}, format='json')
+		self.assertEqual(resp.status_code, 401)
+		self.assertEqual(resp.data['detail'], 'Token has been revoked')
+
+	def test_logout_and_refresh_with_expired_access_header(self):
+		expired = AccessToken(self.access)
+		expired.set_exp(lifetime=-timedelta(minutes=1))
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(expired))
+		resp = self.refresh_with(self.refresh)
+		self.assertEqual(resp.status_code, 200)
+		rotated = resp.data['refresh']
+		resp = self.client.post(reverse('auth-logout'), {'refresh': rotated}, format='json')
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(self.refresh_with(rotated).status_code, 401)
+
+	def test_logout_leaves_another_users_access_token(self):
+		other = self.client.post(reverse('auth-register'), {
+			'username': 'bystander', 'email': 'bystander@example.com', 'password': 'securepass', 'password_confirm': 'securepass'
+		}, format='json')
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + other.data['access'])
+		self.assertEqual(self.client.post(reverse('auth-logout'), {'refresh': self.refresh}, format='json').status_code, 200)
+		self.assertEqual(self.client.get(reverse('auth-me')).status_code, 200)
+		self.assertEqual(self.refresh_with(self.refresh).status_code, 401)
+
+	def test_unrevoked_token_is_checked_in_memory(self):
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.access)
+		self.assertEqual(self.client.get(reverse('auth-me')).status_code, 200)
+		with mock.patch.object(RevokedToken, 'objects', side_effect=AssertionError('denylist hit Mongo')):
+			for _ in range(3):
+				self.assertEqual(self.client.get(reverse('auth-me')).status_code, 200)
+		self.assertEqual(denylist.lookups, 0)
+
+	def test_revocation_from_another_worker_arrives_on_sync(self):
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.access)
+		self.assertEqual(self.client.get(reverse('auth-me')).status_code, 200)
+		# another worker revoked the token: only the row exists, this process's filter does not know it yet
+		token = AccessToken(self.access)
+		RevokedToken(jti=token['jti'], token_type='access', user_id=str(token['user_id']),
+			expires_at=datetime.utcfromtimestamp(token['exp'])).save()
+		self.assertEqual(self.client.get(reverse('auth-me')).status_code, 200)
+		with override_settings(TOKEN_DENYLIST={'SYNC_SECONDS': 0}):
+			self.assertEqual(self.client.get(reverse('auth-me')).status_code, 401)
+
+	def test_bloom_filter_error_rate(self):
+		bloom = BloomFilter(1000, 0.01)
+		for i in range(1000):
+			bloom.add(f'revoked-{i}')
+		self.assertTrue(all(f'revoked-{i}' in bloom for i in range(1000)))
+		false_positives = sum(f'valid-{i}' in bloom for i in range(10000))
+		self.assertLess(false_positives, 300)
@@ -0,0 +1,166 @@
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+
+# Token buckets in front of login/register, keyed by client IP and by credential. A bucket holds up to N tokens
+# and refills N per period ("5/min"); every request takes one, an empty bucket means 429 + Retry-After.
+# The DRF throttles run in APIView.initial(), i.e. before the view touches Mongo or the password hashing pool.
+
+PERIODS = {"s": 1, "sec": 1, "m": 60, "min": 60, "h": 3600, "hour": 3600, "d": 86400, "day": 86400}
+
+
+def _config():
+    conf = getattr(settings, "AUTH_THROTTLE", {})
+    return {
+        "ENABLED": conf.get("ENABLED", True),
+        "BACKEND": conf.get("BACKEND", "local"),
+        "CACHE_ALIAS": conf.get("CACHE_ALIAS", "default"),
+        "MAX_KEYS": conf.get("MAX_KEYS", 10000),
+        "RATES": conf.get("RATES", {}),
+    }
+
+
+# "5/min" -> (capacity, tokens refilled per second)
+def parse_rate(rate):
+    count, period = rate.split("/")
+    return int(count), int(count) / PERIODS[period]
+
+
+# one step of a bucket: refill for the time elapsed, take a token if there is one;
+# returns the new token count and the seconds until a token is available (0 when this request may pass)
+def _take(tokens, elapsed, capacity, refill):
+    tokens = min(capacity, tokens + elapsed * refill)
+    if tokens >= 1:
+        return tokens - 1, 0
+    return tokens, (1 - tokens) / refill
+
+
+# shared-nothing backend: one bounded LRU of buckets per process, O(1) per check under one lock.
+# An evicted bucket starts full again, so MAX_KEYS should cover the keys seen in one refill period
+# (a flood of fresh keys can only evict credential buckets; its own IP bucket stays hot and keeps limiting it)
+class LocalBuckets:
+    def __init__(self):
+        self._buckets = OrderedDict()  # key -> (tokens, monotonic time of the last update)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def take(self, key, capacity, refill):
+        now = time.monotonic()
+        max_keys = _config()["MAX_KEYS"]
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (capacity, now))
+            tokens, wait = _take(tokens, now - updated_at, capacity, refill)
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > max_keys:
+                self._buckets.popitem(last=False)
+                self.evictions += 1
+        return wait
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+            self.evictions = 0
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+# shared backend: buckets live in a Django cache (CACHES[CACHE_ALIAS], e.g. Redis/Memcached), so every worker
+# draws from the same bucket. The read-modify-write is not atomic: racing requests may both take the last token,
+# which lets a burst slightly exceed the rate but never bypass it. Entries expire once the bucket would be full.
+class CacheBuckets:
+    def take(self, key, capacity, refill):
+        cache = caches[_config()["CACHE_ALIAS"]]
+        now = time.time()
+        tokens, updated_at = cache.get(f"throttle:{key}") or (capacity, now)
+        tokens, wait = _take(tokens, max(0, now - updated_at), capacity, refill)
+        cache.set(f"throttle:{key}", (tokens, now), math.ceil(capacity / refill))
+        return wait
+
+    # meant for tests: the throttle alias should be a cache of its own
+    def reset(self):
+        caches[_config()["CACHE_ALIAS"]].clear()
+
+
+BACKENDS = {"local": LocalBuckets(), "cache": CacheBuckets()}
+
+
+def buckets():
+    return BACKENDS[_config()["BACKEND"]]
+
+
+# empties every bucket of both backends (tests call it in setUp, the test client always comes from one IP)
+def reset():
+    for backend in BACKENDS.values():
+        backend.reset()
+
+
+# credentials are hashed before they become bucket keys, so the buckets never hold emails/usernames
+def credential_key(value):
+    return hashlib.blake2b(value.strip().lower().encode(), digest_size=12).hexdigest()
+
+
+class BucketThrottle(BaseThrottle):
+    scope = None
+
+    # bucket key for this request, or None to not throttle it
+    def get_key(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        conf = _config()
+        self.wait_seconds = 0
+        if not conf["ENABLED"]:
+            return True
+        key = self.get_key(request)
+        if key is None:
+            return True
+        capacity, refill = parse_rate(conf["RATES"][self.scope])
+        self.wait_seconds = buckets().take(f"{self.scope}:{key}", capacity, refill)
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
+
+
+# client IP: REMOTE_ADDR, or the X-Forwarded-For entry added by the last of REST_FRAMEWORK["NUM_PROXIES"] proxies
+class IPThrottle(BucketThrottle):
+    def get_key(self, request):
+        return self.get_ident(request)
+
+
+# one field of the JSON body, normalized and hashed; requests without it are left to the IP bucket
+class CredentialThrottle(BucketThrottle):
+    field = None
+
+    def get_key(self, request):
+        data = request.data if hasattr(request.data, "get") else {}
+        value = data.get(self.field)
+        if not isinstance(value, str) or not value.strip():
+            return None
+        return credential_key(value)
+
+
+class LoginIPThrottle(IPThrottle):
+    scope = "login_ip"
+
+
+class LoginCredentialThrottle(CredentialThrottle):
+    scope = "login_credential"
+    field = "first_credential"
+
+
+class RegisterIPThrottle(IPThrottle):
+    scope = "register_ip"
+
+
+class RegisterEmailThrottle(CredentialThrottle):
+    scope = "register_email"
+    field = "email"
@@ -1,12 +1,19 @@
+from mongoengine.errors import NotUniqueError
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework_simplejwt.tokens import RefreshToken, TokenError, AccessToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken, TokenError, UntypedToken
 
+from auth_handler.backends import MongoJWTAuthentication
 from auth_handler.models import User
 from auth_handler.serializers import UserSerializer
+from auth_handler.cache import user_cache
+from auth_handler.hashing import HashingBusy
+from auth_handler.revocation import denylist
+from auth_handler.throttling import LoginIPThrottle, LoginCredentialThrottle, RegisterIPThrottle, RegisterEmailThrottle
 
 
 def validate_keys(data, required_keys):
@@ -21,10 +28,61 @@ def validate_keys(data, required_keys):
         )
     return None
 
+
+# the password hashing pool is saturated, ask the client to come back instead of queueing without bound
+def hashing_busy_response():
+    return Response(
+        {"detail": "Server is busy, please retry shortly"},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": "1"},
+    )
+
+
+# the access token of the Authorization header, or None when there is none or it does not decode (expired, bad
+# signature); read by views that run without authentication classes
+def header_access_token(request):
+    authentication = MongoJWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        return None
+    try:
+        return AccessToken(raw_token)
+    except TokenError:
+        return None
+
+
+# first_credential could be email or username: one indexed $or over the normalized fields, plus the raw email and
+# username (both unique indexes) so users that backfill_user_lower has not reached yet still log in by either one
+# (a raw filter, so the async login runs the same query on the async client)
+def credential_lookup(first_credential):
+    return {"$or": [{"email_lower": first_credential}, {"email": first_credential}, {"username_lower": first_credential},
+                    {"username": first_credential}]}
+
+
+# the user a login matched (up to 4 candidates): an email match wins if one user's username happens to equal
+# another user's email
+def pick_login_user(matches, first_credential):
+    return next(
+        (m for m in matches if first_credential in (m.email_lower, m.email)),
+        matches[0] if matches else None,
+    )
+
+
+# field reported by User.duplicate_field() -> message of the 400 response
+DUPLICATE_USER_MESSAGES = {
+    "username": "User with that username already exists",
+    "email": "User with that email already exists",
+}
+
 #Register a new user and return JWT tokens.
 
 class RegisterAPIView(APIView):
     permission_classes = (AllowAny,)
+    # no token to check here, and the throttles must run before anything reaches Mongo or the hashing pool
+    authentication_classes = ()
+    throttle_classes = (RegisterIPThrottle, RegisterEmailThrottle)
+
     def post(self, request):
         # Variables---------------------------------------------------------------------------------------------------
         data = request.data or {}
@@ -42,19 +100,22 @@ class RegisterAPIView(APIView):
         if password != password_confirm:
             return Response({"detail": "Passwords do not match"}, status=status.HTTP_400_BAD_REQUEST)
 
-        if User.objects(username=username).first():
-            return Response({"detail": "User with that username already exists"}, status=status.HTTP_400_BAD_REQUEST)
-
-        if User.objects(email=email).first():
-            return Response({"detail": "User with that email already exists"}, status=status.HTTP_400_BAD_REQUEST)
-        
         # all validations passed now we create user object and save once-----------------------------------------------
+        # no "already exists" pre-check queries: the unique indexes on User reject duplicates atomically (also
+        # for two signups racing each other) and NotUniqueError is mapped back to the field-specific message
         user = User()
         try:
             user.username = username
             user.email = email
             user.set_password(password)
             user.save()
+        except NotUniqueError as exc:
+            return Response(
+                {"detail": DUPLICATE_USER_MESSAGES[user.duplicate_field(exc)]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except HashingBusy:
+            return hashing_busy_response()
         except Exception:
             return Response({"detail": "Failed to create user"}, status=status.HTTP_400_BAD_REQUEST)
         # JWT is getting created---------------------------------------------------------------------------------------
@@ -75,6 +136,9 @@ class LoginAPIView(APIView):
     """Authenticate user and return JWT tokens."""
 
     permission_classes = (AllowAny,)
+    # per IP and per credential, checked before the user lookup and the password hash (429 + Retry-After)
+    authentication_classes = ()
+    throttle_classes = (LoginIPThrottle, LoginCredentialThrottle)
 
     def post(self, request):
         # Variables---------------------------------------------------------------------------------------------------
@@ -96,13 +160,18 @@ class LoginAPIView(APIView):
         if not password:
             return Response({"detail": "password is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # first_credential could be email or username, try email first then username----------------------------------
-        user = User.objects(email=first_credential).first()
-        if not user:
-            user = User.objects(username=first_credential).first()
+        # first_credential could be email or username: one indexed $or lookup------------------------------------
+        user = pick_login_user(list(User.objects(__raw__=credential_lookup(first_credential)).limit(4)), first_credential)
 
-        if not user or not user.check_password(password):
-            return Response({"detail": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
+        try:
+            if not user or not user.check_password(password):
+                return Response({"detail": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
+            # hash made with older PASSWORD_HASHING parameters: upgrade it now that we know the raw password
+            if user.password_needs_rehash():
+                user.set_password(password)
+                user.save()
+        except HashingBusy:
+            return hashing_busy_response()
 
         # JWT is getting created--------------------------------------------------------------------------------------
         refresh = RefreshToken.for_user(user)
@@ -121,10 +190,12 @@ class LoginAPIView(APIView):
 
 class TokenRefreshAPIView(APIView):
     """
-    Takes a valid refresh token and returns a new access token.
-    The refresh token itself remains valid until it expires (7 days).
+    Takes a valid refresh token and returns a new access token plus a new refresh token.
+    The presented refresh token is revoked in the same step, so each one can be used exactly once.
     """
     permission_classes = (AllowAny,)
+    # the refresh token in the body is the credential; an expired access header must not turn this into a 401
+    authentication_classes = ()
 
     def post(self, request):
         # Variables---------------------------------------------------------------------------------------------------
@@ -135,19 +206,30 @@ class TokenRefreshAPIView(APIView):
         if not refresh_token:
             return Response({"detail": "Refresh token is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Attempting to generate new access token from the refresh token---------------------------------------------
+        # Decoding the refresh token (signature, expiry, type)-----------------------------------------------------
         try:
             refresh = RefreshToken(refresh_token)
-            new_access = str(refresh.access_token)
         except TokenError as e:
             return Response(
                 {"detail": "Invalid or expired refresh token", "error": str(e)},
                 status=status.HTTP_401_UNAUTHORIZED,
             )
 
+        # Rotation: revoking the presented token is an insert on its jti, so of two requests replaying the same
+        # token only one gets through; a token revoked before (used already, or logged out) is rejected--------
+        if not denylist.revoke(refresh):
+            return Response(
+                {"detail": "Refresh token has already been used or revoked"},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+        refresh.set_jti()
+        refresh.set_exp()
+        refresh.set_iat()
+
         return Response(
             {
-                "access": new_access,
+                "access": str(refresh.access_token),
+                "refresh": str(refresh),
                 "message": "Token refreshed successfully ..."
             },
             status=status.HTTP_200_OK,
@@ -171,23 +253,52 @@ class TokenVerifyAPIView(APIView):
         if not token:
             return Response({"detail": "Token is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Try to decode the token to check validity------------------------------------------------------------------
+        # Decoding once, whatever its type (access or refresh), then checking the denylist-------------------------
         try:
-            AccessToken(token)
-            return Response({"valid": True, "message": "Token is valid"}, status=status.HTTP_200_OK)
+            validated = UntypedToken(token)
         except TokenError:
-            pass
+            return Response(
+                {"valid": False, "detail": "Token is invalid or expired"},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+        if denylist.is_revoked(validated.get("jti")):
+            return Response({"valid": False, "detail": "Token has been revoked"}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response({"valid": True, "message": "Token is valid"}, status=status.HTTP_200_OK)
+
+
+# Revoke a refresh token (and the access token the request was made with).
+
+class LogoutAPIView(APIView):
+    """
+    Takes a refresh token and revokes it until it expires.
+    When the request carries a valid access token of the same user, that token is revoked as well.
+    """
+    permission_classes = (AllowAny,)
+    # the client sends its stored access header even after it expired; logout must still revoke the refresh token
+    authentication_classes = ()
+
+    def post(self, request):
+        # Variables---------------------------------------------------------------------------------------------------
+        data = request.data or {}
+        refresh_token = data.get("refresh")
+        if not refresh_token:
+            return Response({"detail": "Refresh token is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # If not a valid access token, try as refresh token----------------------------------------------------------
         try:
-            RefreshToken(token)
-            return Response({"valid": True, "message": "Token is valid"}, status=status.HTTP_200_OK)
-        except TokenError:
+            refresh = RefreshToken(refresh_token)
+        except TokenError as e:
             return Response(
-                {"valid": False, "detail": "Token is invalid or expired"},
+                {"detail": "Invalid or expired refresh token", "error": str(e)},
                 status=status.HTTP_401_UNAUTHORIZED,
             )
 
+        # Revoking both (revoking one that is revoked already is not an error)----------------------------------------
+        denylist.revoke(refresh)
+        access = header_access_token(request)
+        if access is not None and access.get(api_settings.USER_ID_CLAIM) == refresh.get(api_settings.USER_ID_CLAIM):
+            denylist.revoke(access)
+        return Response({"message": "Logged out successfully ..."}, status=status.HTTP_200_OK)
+
 
 # Get current logged-in user information.
 
@@ -207,3 +318,16 @@ class MeAPIView(APIView):
             status=status.HTTP_200_OK,
         )
 
+
+
+# Hit/miss counters of the per-process user cache used by MongoJWTAuthentication.
+
+class UserCacheStatsAPIView(APIView):
+    """
+    Returns the counters of this worker process's user cache.
+    Each worker keeps its own cache, so the numbers are per process.
+    """
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request):
+        return Response(user_cache.stats(), status=status.HTTP_200_OK)
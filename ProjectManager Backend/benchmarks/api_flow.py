@@ -0,0 +1,336 @@
+# Load test of the whole API flow: register -> login -> me -> project CRUD -> task CRUD/list/filter, run by
+# --users virtual users on --concurrency threads. Reports p50/p95/p99 latency, throughput and Mongo operations per
+# request for every step, and saves/compares JSON baselines so a later run shows regressions.
+#
+#   cd "ProjectManager Backend"
+#   python -m benchmarks.api_flow                                         # 20 users, 4 threads
+#   python -m benchmarks.api_flow --users 100 --concurrency 8 --projects 2 --tasks 20
+#   python -m benchmarks.api_flow --save benchmarks/baseline.json
+#   python -m benchmarks.api_flow --compare benchmarks/baseline.json      # exit code 1 on a regression
+#
+# Requests go through django.test.Client in this process (the full middleware stack, no socket), so latency is
+# the server side of a request and the threads share one process like the threads of one worker.
+# CONNECTION_STRING decides the target (empty = mongomock); point it at a scratch database, never at production.
+# Every user it registers is removed afterwards, with its projects and tasks.
+#
+# Mongo operations are counted per thread, so each request gets the operations it issued itself: pymongo command
+# events against a server, collection method calls on mongomock (which has no command monitoring; a cursor counts
+# once, however many batches it reads). Work handed to the background pool (project purges) is reported separately.
+# Login throttling is switched off (AUTH_THROTTLE_ENABLED), one client IP registering hundreds of users would
+# otherwise be measured as 429s.
+import argparse
+import functools
+import json
+import os
+import platform
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ProjectManagerCore.settings")
+os.environ.setdefault("AUTH_THROTTLE_ENABLED", "False")
+
+import django
+
+django.setup()
+
+from bson import ObjectId
+from django.test import Client
+from pymongo import monitoring
+
+from auth_handler.models import User
+from project_handler.models import Project, Task
+from ProjectManagerCore import db
+
+STATUSES = ("Todo", "In Progress", "Done")
+# below this many requests a step's p95 is about its slowest request, too noisy to call a regression
+MIN_P95_SAMPLES = 20
+
+
+def percentile(timings, pct):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+# Mongo operations issued by the current thread; the background pool threads add to `background`
+class OpCounter(monitoring.CommandListener):
+    # mongomock collection methods that reach the data (one call = one operation)
+    MONGOMOCK_METHODS = (
+        "find", "find_one", "insert_one", "insert_many", "update_one", "update_many", "replace_one",
+        "delete_one", "delete_many", "find_one_and_update", "find_one_and_replace", "find_one_and_delete",
+        "aggregate", "count_documents", "estimated_document_count", "distinct", "bulk_write",
+    )
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.background = 0
+
+    @property
+    def ops(self):
+        return getattr(self._local, "ops", 0)
+
+    # marks the current thread as one that runs the measured requests
+    def attach(self):
+        self._local.attached = True
+
+    def add(self):
+        self._local.ops = self.ops + 1
+        if not getattr(self._local, "attached", False):
+            with self._lock:
+                self.background += 1
+
+    def install(self):
+        if db.CONNECTION_STRING:
+            monitoring.register(self)  # applies to the clients mongoengine creates on their first query
+            return
+        import mongomock
+
+        for name in self.MONGOMOCK_METHODS:
+            setattr(mongomock.collection.Collection, name, self._counted(getattr(mongomock.collection.Collection, name)))
+
+    # counts the outermost call only (mongomock's find_one calls find, insert_one calls insert_many, ...)
+    def _counted(self, method):
+        @functools.wraps(method)
+        def counted(*args, **kwargs):
+            depth = getattr(self._local, "depth", 0)
+            if not depth:
+                self.add()
+            self._local.depth = depth + 1
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self._local.depth = depth
+        return counted
+
+    # pymongo calls these in the thread that runs the command
+    def started(self, event):
+        if event.command_name not in ("hello", "ismaster", "endSessions", "killCursors"):
+            self.add()
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+op_counter = OpCounter()
+
+
+# one virtual user walking the flow; every request is timed and recorded under its step name
+class VirtualUser:
+    def __init__(self, runner, number):
+        self.runner = runner
+        self.client = Client()
+        self.name = f"{runner.prefix}-{number}"
+        self.headers = {}
+
+    def request(self, step, method, path, data=None, expect=200):
+        ops = op_counter.ops
+        started = time.perf_counter()
+        try:
+            if method == "get":
+                resp = self.client.get(path, data, **self.headers)
+            else:
+                resp = getattr(self.client, method)(path, data, content_type="application/json", **self.headers)
+            ok = resp.status_code == expect
+        except Exception:
+            resp, ok = None, False
+        self.runner.record(step, time.perf_counter() - started, op_counter.ops - ops, ok)
+        return resp.json() if ok and resp.content else None
+
+    def run(self):
+        op_counter.attach()
+        conf = self.runner.conf
+        credentials = {"password": "benchpass"}
+        body = self.request("register", "post", "/api/auth/register/", dict(
+            credentials, username=self.name, email=f"{self.name}@example.com", password_confirm="benchpass",
+        ), expect=201)
+        if body is None:
+            return
+        body = self.request("login", "post", "/api/auth/login/", dict(credentials, first_credential=self.name))
+        if body is None:
+            return
+        self.headers = {"HTTP_AUTHORIZATION": "Bearer " + body["access"]}
+        self.request("me", "get", "/api/auth/me/")
+
+        for p in range(conf.projects):
+            project = self.request("project_create", "post", "/api/projects/", {"name": f"Project {p}"}, expect=201)
+            if project is None:
+                continue
+            project_url = f"/api/projects/{project['project']['id']}/"
+            self.request("project_list", "get", "/api/projects/")
+            self.request("project_detail", "get", project_url)
+            self.request("project_patch", "patch", project_url, {"description": "benchmark project"}, expect=204)
+
+            task_ids = []
+            for t in range(conf.tasks):
+                task = self.request("task_create", "post", f"{project_url}tasks/", {
+                    "title": f"Task {t}", "description": "benchmark task", "status": STATUSES[t % len(STATUSES)],
+                }, expect=201)
+                if task is not None:
+                    task_ids.append(task["task"]["id"])
+            for _ in range(conf.reads):
+                self.request("task_list", "get", f"{project_url}tasks/")
+                self.request("task_filter", "get", f"{project_url}tasks/", {"status": "Done"})
+            for task_id in task_ids[:conf.writes]:
+                task_url = f"/api/projects/tasks/{task_id}/"
+                self.request("task_detail", "get", task_url)
+                self.request("task_patch", "patch", task_url, {"status": "Done"}, expect=204)
+                self.request("task_delete", "delete", task_url, expect=204)
+            self.request("project_delete", "delete", project_url, expect=204)
+
+
+class Runner:
+    def __init__(self, conf):
+        self.conf = conf
+        self.prefix = f"bench-{ObjectId()}"
+        self._lock = threading.Lock()
+        self.steps = defaultdict(lambda: {"timings": [], "ops": 0, "errors": 0})
+
+    def record(self, step, seconds, ops, ok):
+        with self._lock:
+            stats = self.steps[step]
+            stats["timings"].append(seconds * 1000)
+            stats["ops"] += ops
+            stats["errors"] += not ok
+
+    # a warm-up user first (imports, URL resolver, connection pools, lazily built indexes), then the timed users
+    def run(self):
+        VirtualUser(self, "warmup").run()
+        self.steps.clear()
+        op_counter.background = 0
+        started = time.perf_counter()
+        with ThreadPoolExecutor(self.conf.concurrency, thread_name_prefix="api-flow") as pool:
+            for future in [pool.submit(VirtualUser(self, number).run) for number in range(self.conf.users)]:
+                future.result()
+        return time.perf_counter() - started
+
+    def cleanup(self):
+        users = list(User.objects(username__startswith=self.prefix).scalar("id"))
+        projects = list(Project.objects(owner__in=users).scalar("id"))
+        Task.objects(project__in=projects).delete()
+        Project.objects(id__in=projects).delete()
+        User.objects(id__in=users).delete()
+
+    def report(self, seconds):
+        steps = {}
+        for step, stats in self.steps.items():
+            timings = stats["timings"]
+            steps[step] = {
+                "count": len(timings),
+                "errors": stats["errors"],
+                "p50_ms": round(percentile(timings, 50), 3),
+                "p95_ms": round(percentile(timings, 95), 3),
+                "p99_ms": round(percentile(timings, 99), 3),
+                "mean_ms": round(statistics.fmean(timings), 3),
+                "ops_per_request": round(stats["ops"] / len(timings), 2),
+            }
+        requests = sum(step["count"] for step in steps.values())
+        return {
+            "meta": {
+                "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "backend": "mongodb" if db.CONNECTION_STRING else "mongomock",
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "users": self.conf.users,
+                "concurrency": self.conf.concurrency,
+                "projects": self.conf.projects,
+                "tasks": self.conf.tasks,
+                "reads": self.conf.reads,
+                "writes": self.conf.writes,
+            },
+            "total": {
+                "requests": requests,
+                "errors": sum(step["errors"] for step in steps.values()),
+                "seconds": round(seconds, 3),
+                "requests_per_second": round(requests / seconds, 1),
+                "background_ops": op_counter.background,
+            },
+            "steps": steps,
+        }
+
+
+def print_report(result):
+    print(f"{'step':<16}{'count':>7}{'errors':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/req':>9}")
+    for step, stats in result["steps"].items():
+        print(
+            f"{step:<16}{stats['count']:>7}{stats['errors']:>7}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+            f"{stats['p99_ms']:>10.2f}{stats['ops_per_request']:>9.2f}"
+        )
+    total, meta = result["total"], result["meta"]
+    print(
+        f"{total['requests']} requests ({total['errors']} errors) in {total['seconds']:.2f}s = "
+        f"{total['requests_per_second']:.1f} req/s on {meta['backend']}, {meta['users']} users / "
+        f"{meta['concurrency']} threads, {total['background_ops']} background Mongo ops"
+    )
+
+
+# the regressions of `result` against `baseline` as printable lines: p95 beyond the tolerance (steps with at least
+# MIN_P95_SAMPLES requests), any growth of ops per request, throughput below the tolerance, new errors
+def compare(result, baseline, tolerance):
+    regressions = []
+    if baseline["meta"]["backend"] != result["meta"]["backend"]:
+        print(f"warning: baseline ran on {baseline['meta']['backend']}, this run on {result['meta']['backend']}")
+    for step, stats in result["steps"].items():
+        old = baseline["steps"].get(step)
+        if old is None:
+            continue
+        p95_limit = old["p95_ms"] * (1 + tolerance)
+        print(
+            f"{step:<16} p95 {old['p95_ms']:>9.2f} -> {stats['p95_ms']:>9.2f} ms | "
+            f"ops/req {old['ops_per_request']:>6.2f} -> {stats['ops_per_request']:>6.2f}"
+        )
+        if stats["p95_ms"] > p95_limit and min(stats["count"], old["count"]) >= MIN_P95_SAMPLES:
+            regressions.append(f"{step}: p95 {stats['p95_ms']:.2f}ms > {p95_limit:.2f}ms")
+        if stats["ops_per_request"] > old["ops_per_request"]:
+            regressions.append(f"{step}: {stats['ops_per_request']} Mongo ops per request, was {old['ops_per_request']}")
+    rps, old_rps = result["total"]["requests_per_second"], baseline["total"]["requests_per_second"]
+    print(f"{'throughput':<16} {old_rps:>9.1f} -> {rps:>9.1f} req/s")
+    if rps < old_rps * (1 - tolerance):
+        regressions.append(f"throughput {rps} req/s < {old_rps * (1 - tolerance):.1f} req/s")
+    if result["total"]["errors"] > baseline["total"]["errors"]:
+        regressions.append(f"{result['total']['errors']} failed requests, was {baseline['total']['errors']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of register -> login -> me -> project/task CRUD")
+    parser.add_argument("--users", type=int, default=20, help="virtual users, each registers and walks the flow once")
+    parser.add_argument("--concurrency", type=int, default=4, help="users running at the same time (threads)")
+    parser.add_argument("--projects", type=int, default=1, help="projects per user")
+    parser.add_argument("--tasks", type=int, default=10, help="tasks created per project")
+    parser.add_argument("--reads", type=int, default=5, help="task list + status filter reads per project")
+    parser.add_argument("--writes", type=int, default=3, help="tasks per project read, patched and deleted")
+    parser.add_argument("--save", metavar="PATH", help="write the result as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare with a saved baseline, exit 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95/throughput change (default 0.2)")
+    args = parser.parse_args()
+
+    op_counter.install()
+    runner = Runner(args)
+    try:
+        result = runner.report(runner.run())
+    finally:
+        runner.cleanup()
+    print_report(result)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"baseline saved to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
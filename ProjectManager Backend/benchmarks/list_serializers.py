@@ -0,0 +1,94 @@
+# Compares the DocumentSerializer list path with the projection-based list serializers
+# (project_handler/serializers.py) on the same rows.
+#
+#   cd "ProjectManager Backend"
+#   python -m benchmarks.list_serializers                    # 1k and 10k rows
+#   python -m benchmarks.list_serializers --rows 500 --repeat 3
+#
+# Rows are inserted under a throwaway user/project and removed afterwards. CONNECTION_STRING decides the
+# target (empty = mongomock); point it at a scratch database, never at production.
+import argparse
+import os
+import statistics
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ProjectManagerCore.settings")
+
+import django
+
+django.setup()
+
+from bson import ObjectId
+
+from auth_handler.models import User
+from project_handler.models import Project, Task
+from project_handler.serializers import ProjectSerializer, TaskSerializer, ProjectListSerializer, TaskListSerializer
+
+
+def seed_owner():
+    owner = User(username=f"bench-{ObjectId()}", email=f"bench-{ObjectId()}@example.com", password="x").save()
+    return owner, Project(name="benchmark", owner=owner).save()
+
+
+def seed(document, rows, **fields):
+    start = datetime.utcnow()
+    document._get_collection().insert_many([
+        dict(fields, created_at=start + timedelta(milliseconds=i), description="benchmark row")
+        for i in range(rows)
+    ])
+
+
+# best and median wall time in ms over `repeat` runs of fn()
+def measure(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return min(timings), statistics.median(timings)
+
+
+def compare(label, rows, repeat, document_path, projection_path):
+    assert document_path() == projection_path(), f"{label}: list serializers disagree"
+    doc_best, doc_median = measure(document_path, repeat)
+    fast_best, fast_median = measure(projection_path, repeat)
+    print(
+        f"{label:<9} rows={rows:<6} document best={doc_best:9.1f}ms median={doc_median:9.1f}ms | "
+        f"projection best={fast_best:9.1f}ms median={fast_median:9.1f}ms | speedup x{doc_median / fast_median:.1f}"
+    )
+
+
+# clone() per run: an iterated queryset caches its Documents (and their dereferenced references)
+def run(rows, repeat):
+    owner, project = seed_owner()
+    try:
+        # tasks first, while the owner has a single project to dereference
+        seed(Task, rows, title="Task", status="Todo", project=project.id, owner=owner.id)
+        tasks = Task.objects.filter(project=project).order_by("created_at", "id")
+        compare("tasks", rows, repeat,
+                lambda: TaskSerializer(tasks.clone(), many=True).data,
+                lambda: TaskListSerializer(TaskListSerializer.projected(tasks.clone())).data)
+
+        seed(Project, rows - 1, name="Project", owner=owner.id)
+        projects = Project.objects.filter(owner=owner, deleted_at=None).order_by("created_at", "id")
+        compare("projects", rows, repeat,
+                lambda: ProjectSerializer(projects.clone(), many=True).data,
+                lambda: ProjectListSerializer(ProjectListSerializer.projected(projects.clone())).data)
+    finally:
+        Task.objects.filter(project=project).delete()
+        Project.objects.filter(owner=owner).delete()
+        owner.delete()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DocumentSerializer vs projection list serializers")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    for rows in args.rows:
+        run(rows, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# Compares the full settings profile (ProjectManagerCore.settings) with the API-only one
+# (ProjectManagerCore.settings_api): worker boot time and per-request time through the middleware stack.
+#
+#   cd "ProjectManager Backend"
+#   python -m benchmarks.settings_profiles                   # 5 boots, 1000 requests per boot
+#   python -m benchmarks.settings_profiles --boots 3 --requests 200
+#
+# Settings can only be loaded once per process, so every boot is a fresh child process
+# (`--child <settings module>`) that reports its timings as JSON. Each child registers a throwaway user with one
+# project, times GET /api/projects/ with that user's token and removes both afterwards. CONNECTION_STRING decides
+# the target (empty = mongomock); point it at a scratch database, never at production.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROFILES = ("ProjectManagerCore.settings", "ProjectManagerCore.settings_api")
+
+
+def percentile(timings, pct):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+# boot: django.setup() + WSGI handler (loads the middleware) + URLconf import, i.e. what a worker does before its
+# first request; then `requests` GETs through django.test.Client, which runs the same middleware chain
+def child(settings_module, requests):
+    os.environ["DJANGO_SETTINGS_MODULE"] = settings_module
+    started = time.perf_counter()
+    import django
+
+    django.setup()
+    from django.core.wsgi import get_wsgi_application
+    from django.urls import get_resolver
+
+    get_wsgi_application()
+    get_resolver().url_patterns
+    startup_ms = (time.perf_counter() - started) * 1000
+
+    from bson import ObjectId
+    from django.test import Client
+
+    from auth_handler.models import User
+    from project_handler.models import Project
+
+    client = Client()
+    name = f"bench-{ObjectId()}"
+    resp = client.post("/api/auth/register/", {
+        "username": name, "email": f"{name}@example.com", "password": "benchpass", "password_confirm": "benchpass",
+    }, content_type="application/json")
+    assert resp.status_code == 201, resp.content
+    headers = {"HTTP_AUTHORIZATION": "Bearer " + resp.json()["access"]}
+    try:
+        assert client.post("/api/projects/", {"name": "benchmark"}, content_type="application/json", **headers).status_code == 201
+        timings = []
+        for _ in range(requests):
+            request_started = time.perf_counter()
+            resp = client.get("/api/projects/", **headers)
+            timings.append((time.perf_counter() - request_started) * 1_000_000)
+            assert resp.status_code == 200, resp.content
+    finally:
+        owner = User.objects(username=name).first()
+        Project.objects.filter(owner=owner).delete()
+        owner.delete()
+
+    return {
+        "startup_ms": startup_ms,
+        "request_median_us": statistics.median(timings),
+        "request_p95_us": percentile(timings, 95),
+        "response_headers": sorted(resp.headers),
+    }
+
+
+def run(boots, requests):
+    results = {}
+    for settings_module in PROFILES:
+        runs = []
+        for _ in range(boots):
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.settings_profiles", "--child", settings_module, "--requests", str(requests)],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            runs.append(json.loads(out.strip().splitlines()[-1]))
+        results[settings_module] = runs
+        print(
+            f"{settings_module:<32} boot median={statistics.median(r['startup_ms'] for r in runs):7.1f}ms | "
+            f"request median={statistics.median(r['request_median_us'] for r in runs):7.0f}us "
+            f"p95={statistics.median(r['request_p95_us'] for r in runs):7.0f}us | "
+            f"headers={','.join(runs[-1]['response_headers'])}"
+        )
+    full, api = (results[profile] for profile in PROFILES)
+    boot = statistics.median(r["startup_ms"] for r in full) / statistics.median(r["startup_ms"] for r in api)
+    request = statistics.median(r["request_median_us"] for r in full) / statistics.median(r["request_median_us"] for r in api)
+    print(f"settings_api speedup: boot x{boot:.2f}, request x{request:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full vs API-only settings profile: boot and per-request time")
+    parser.add_argument("--boots", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--child", choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(child(args.child, args.requests)))
+    else:
+        run(args.boots, args.requests)
+
+
+if __name__ == "__main__":
+    main()
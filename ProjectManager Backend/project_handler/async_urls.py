@@ -0,0 +1,18 @@
+from django.urls import path
+from project_handler.async_views import (
+	AsyncProjectListCreateAPIView,
+	AsyncProjectDetailAPIView,
+	AsyncTaskListCreateAPIView,
+	AsyncTaskEventsAPIView,
+	AsyncTaskEventsTicketAPIView,
+)
+
+# same routes as urls.py for the async views, mounted under /api/async/projects/
+urlpatterns = [
+	path("", AsyncProjectListCreateAPIView.as_view(), name="async-project-list-create"),
+	path("<str:project_id>/", AsyncProjectDetailAPIView.as_view(), name="async-project-detail"),
+	path("<str:project_id>/tasks/", AsyncTaskListCreateAPIView.as_view(), name="async-task-list-create"),
+	# ASGI only: a WSGI worker would buffer the endless stream
+	path("<str:project_id>/events/", AsyncTaskEventsAPIView.as_view(), name="async-task-events"),
+	path("<str:project_id>/events/ticket/", AsyncTaskEventsTicketAPIView.as_view(), name="async-task-events-ticket"),
+]
@@ -0,0 +1,344 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import exception_handler
+
+from auth_handler.backends import AsyncMongoJWTAuthentication
+from project_handler.models import Project, Task
+from project_handler.serializers import ProjectSerializer, TaskSerializer, ProjectListSerializer, TaskListSerializer
+from project_handler.pagination import KeysetPagination
+from project_handler.views import validate_keys, to_object_id
+from project_handler import counters, events, versions
+from ProjectManagerCore.db import get_async_collection
+from ProjectManagerCore import read_routing
+
+
+# Async counterparts of the list/detail/create views in views.py for ASGI deployments (mounted under /api/async/).
+# DRF's APIView is sync only, so this small base does what it does for these views: parse the request with the same
+# parsers, authenticate the JWT (user lookup on the async client), require a user, turn APIExceptions into the same
+# error bodies and render with the JSON renderer. Every Mongo call is awaited, so one worker serves many slow
+# clients without a thread per request. The response bodies match the sync views byte for byte.
+class AsyncAPIView(View):
+	authentication = AsyncMongoJWTAuthentication()  # None: anonymous views (async login/register)
+	throttle_classes = ()
+	parser_classes = (JSONParser, FormParser, MultiPartParser)
+	renderer = JSONRenderer()
+	read_preference = None  # same meaning as ReadRoutingMixin.read_preference
+
+	# csrf_exempt like APIView.as_view: the API authenticates with bearer tokens, not session cookies
+	@classonlymethod
+	def as_view(cls, **initkwargs):
+		return csrf_exempt(super().as_view(**initkwargs))
+
+	async def dispatch(self, request, *args, **kwargs):
+		with read_routing.routed_reads(read_routing.read_preference_for(self, request.method)):
+			return await self.handle(request, *args, **kwargs)
+
+	async def handle(self, request, *args, **kwargs):
+		request = Request(request, parsers=[parser() for parser in self.parser_classes])
+		handler = getattr(self, request.method.lower(), None)
+		try:
+			if request.method.lower() not in self.http_method_names or handler is None:
+				raise exceptions.MethodNotAllowed(request.method)
+			if self.authentication is not None:
+				auth = await self.authentication.aauthenticate(request._request)
+				if auth is None:
+					raise exceptions.NotAuthenticated()
+				request.user, request.auth = auth
+			await self.check_throttles(request)
+			# what APIView's content negotiation sets; the ETags digest it (versions.etag)
+			request.accepted_media_type = self.renderer.media_type
+			response = await handler(request, *args, **kwargs)
+		except exceptions.APIException as exc:
+			if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)) and self.authentication:
+				exc.auth_header = self.authentication.authenticate_header(request)
+			response = exception_handler(exc, {"view": self, "args": args, "kwargs": kwargs, "request": request})
+		return self.finalize_response(request, response)
+
+	# APIView.check_throttles: every throttle takes its token, the longest wait wins (429 + Retry-After). Off the loop,
+	# the "cache" throttle backend does blocking cache I/O
+	async def check_throttles(self, request):
+		waits = []
+		for throttle in (throttle_class() for throttle_class in self.throttle_classes):
+			if not await sync_to_async(throttle.allow_request, thread_sensitive=False)(request, self):
+				waits.append(throttle.wait())
+		if waits:
+			raise exceptions.Throttled(max(waits))
+
+	def finalize_response(self, request, response):
+		response.accepted_renderer = self.renderer
+		response.accepted_media_type = self.renderer.media_type
+		response.renderer_context = {"view": self, "request": request, "response": response}
+		response["Allow"] = ", ".join(self._allowed_methods())
+		patch_vary_headers(response, ("Accept",))
+		return response
+
+
+#List all projects for the logged-in user or create a new project (async).
+
+class AsyncProjectListCreateAPIView(AsyncAPIView):
+	includes = ("task_stats",)
+
+	# returns one page of the projects owned by the currently logged-in user (?cursor=, ?limit=, ?include=task_stats);
+	# a poll with a current If-None-Match gets 304 after a single version lookup
+	async def get(self, request):
+		# Variables---------------------------------------------------------------------------------------------------
+		paginator = KeysetPagination(request)
+		include = [name for name in request.query_params.get("include", "").split(",") if name]
+		unknown = [name for name in include if name not in self.includes]
+		if unknown:
+			return Response({"detail": f"Unknown include {unknown}, choose from {self.includes}"},
+				status=status.HTTP_400_BAD_REQUEST)
+		# Answering an unchanged poll from the owner's list version, before loading any project--------------------
+		etag = versions.etag(request, "projects", await versions.alist_version(request.user.id))
+		if versions.matches(request, etag):
+			return versions.not_modified(etag)
+		# Fetching one page of projects owned by user-----------------------------------------------------------------
+		match = {"owner": request.user.id, "deleted_at": None}
+		page, next_cursor, prev_cursor = await paginator.apaginate_collection(
+			read_routing.route_read(get_async_collection(Project)), match, ProjectListSerializer.projection()
+		)
+		data = ProjectListSerializer(page).data
+		if "task_stats" in include:
+			stats = await counters.atask_stats([row["_id"] for row in page])
+			for row, project in zip(page, data):
+				project["task_stats"] = stats.get(row["_id"]) or counters.empty_stats(row["created_at"])
+		response = Response(paginator.get_paginated_data(data, next_cursor, prev_cursor), status=status.HTTP_200_OK)
+		return versions.tagged(response, etag)
+
+	# creates a new project with the current user automatically set as the owner
+	async def post(self, request):
+		# Variables---------------------------------------------------------------------------------------------------
+		data = request.data or {}
+		name = data.get("name")
+		description = data.get("description")
+
+		# Checking if any field is empty------------------------------------------------------------------------------
+		missing = validate_keys(data, ("name",))
+		if missing:
+			return missing
+
+		# all validations passed now we create project object and insert once-----------------------------------------
+		project = Project()
+		try:
+			project.name = name
+			if description:
+				project.description = description
+			project.owner = request.user
+			project.validate()
+			result = await get_async_collection(Project).insert_one(project.to_mongo())
+			project.id = result.inserted_id
+		except Exception:
+			return Response({"detail": "Failed to create project ..."}, status=status.HTTP_400_BAD_REQUEST)
+		await versions.aowner_changed(request.user.id)
+
+		return Response(
+			{
+				"project": ProjectSerializer(project).data,
+				"message": "Project Created Successfully ..."
+			},
+			status=status.HTTP_201_CREATED,
+		)
+
+
+#Retrieve a specific project (owner only, async).
+
+class AsyncProjectDetailAPIView(AsyncAPIView):
+	# retrieve a single project; a poll with a current If-None-Match gets 304
+	async def get(self, request, project_id):
+		project_oid = to_object_id(project_id)
+		doc = None
+		if project_oid is not None:
+			collection = read_routing.route_read(get_async_collection(Project))
+			doc = await collection.find_one({"_id": project_oid, "deleted_at": None})
+		if not doc:
+			return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+		if doc["owner"] != request.user.id:
+			return Response({"detail": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
+		etag = versions.etag(request, "project", doc.get("version", 0))
+		if versions.matches(request, etag):
+			return versions.not_modified(etag)
+		project = Project._from_son(doc, _auto_dereference=False)
+		return versions.tagged(Response(ProjectSerializer(project).data, status=status.HTTP_200_OK), etag)
+
+
+# base of the async views under one project: the parent project for the ownership check
+class AsyncProjectChildAPIView(AsyncAPIView):
+	# returns (project document with owner/created_at/version, None) or (None, error response)
+	async def get_project(self, request, project_id):
+		project_oid = to_object_id(project_id)
+		doc = None
+		if project_oid is not None:
+			collection = read_routing.route_read(get_async_collection(Project))
+			doc = await collection.find_one(
+				{"_id": project_oid, "deleted_at": None}, {"owner": 1, "created_at": 1, "version": 1}
+			)
+		if not doc:
+			return None, Response({"detail": "Project not found"}, status=status.HTTP_404_NOT_FOUND)
+		if doc["owner"] != request.user.id:
+			return None, Response({"detail": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
+		return doc, None
+
+
+#List tasks of a project or create a new task in it (async).
+
+class AsyncTaskListCreateAPIView(AsyncProjectChildAPIView):
+	# lists one page of tasks under a project (?cursor=, ?limit=), supports optional ?status= query param for filtering;
+	# a poll with a current If-None-Match gets 304 without reading any task
+	async def get(self, request, project_id):
+		paginator = KeysetPagination(request)
+		project, error = await self.get_project(request, project_id)
+		if error:
+			return error
+		etag = versions.etag(request, "tasks", project.get("version", 0))
+		if versions.matches(request, etag):
+			return versions.not_modified(etag)
+		match = {"project": project["_id"]}
+		status_filter = request.query_params.get("status")
+		if status_filter:
+			match["status"] = status_filter
+		page, next_cursor, prev_cursor = await paginator.apaginate_collection(
+			read_routing.route_read(get_async_collection(Task)), match, TaskListSerializer.projection()
+		)
+		data = TaskListSerializer(page).data
+		response = Response(paginator.get_paginated_data(data, next_cursor, prev_cursor), status=status.HTTP_200_OK)
+		return versions.tagged(response, etag)
+
+	# creates a new task under the given project, only if the requesting user owns the project
+	async def post(self, request, project_id):
+		project, error = await self.get_project(request, project_id)
+		if error:
+			return error
+		raw = request.data or {}
+		missing = validate_keys(raw, ("title",))
+		if missing:
+			return missing
+
+		description = raw.get("description")
+		task = Task()
+		try:
+			task.title = raw.get("title")
+			if description:
+				task.description = description
+			task.status = raw.get("status") or "Todo"
+			task.project = Project._from_son(project, _auto_dereference=False)
+			task.owner = request.user
+			task.validate()
+			result = await get_async_collection(Task).insert_one(task.to_mongo())
+			task.id = result.inserted_id
+		except Exception:
+			return Response({"detail": "Failed to create task"}, status=status.HTTP_400_BAD_REQUEST)
+		await versions.aproject_changed(project["_id"], request.user.id, counters.task_deltas(new_status=task.status))
+		data = TaskSerializer(task).data
+		await events.apublish(project["_id"], events.CREATED, data)
+
+		return Response(
+			{
+				"task": data,
+				"message": "Task Created Successfully ..."
+			},
+			status=status.HTTP_201_CREATED,
+		)
+
+
+# EventSource cannot send headers: a browser authenticates its stream with ?ticket= (events.issue_ticket), other
+# clients keep sending the Authorization header. request.auth is then the ticket, which names the one project it opens
+class EventStreamAuthentication(AsyncMongoJWTAuthentication):
+	async def aauthenticate(self, request):
+		ticket = request.GET.get("ticket")
+		if not ticket or self.get_header(request) is not None:
+			return await super().aauthenticate(request)
+		claims = events.read_ticket(ticket)
+		if claims is None:
+			raise exceptions.AuthenticationFailed("Invalid or expired stream ticket")
+		return await self.aget_user(claims), claims
+
+
+# PROJECT_EVENTS_BUS=off: nothing is published, so there is nothing to stream
+def events_off_response():
+	return Response({"detail": "Live task events are switched off"}, status=status.HTTP_501_NOT_IMPLEMENTED)
+
+
+#Stream ticket for the live task events of a project (async, ASGI only).
+
+class AsyncTaskEventsTicketAPIView(AsyncProjectChildAPIView):
+	# a short-lived ticket for ?ticket= on the events URL. It is only issued by an ASGI server, so the answer
+	# doubles as the capability check: 501 tells the page that this deployment cannot stream and it keeps polling
+	async def post(self, request, project_id):
+		if not events.enabled():
+			return events_off_response()
+		if not isinstance(request._request, ASGIRequest):
+			return Response({"detail": "Live task events need an ASGI server"}, status=status.HTTP_501_NOT_IMPLEMENTED)
+		project, error = await self.get_project(request, project_id)
+		if error:
+			return error
+		return Response(
+			{"ticket": events.issue_ticket(request.user.id, project["_id"]), "expires_in": events.config()["TICKET_SECONDS"]},
+			status=status.HTTP_200_OK,
+		)
+
+
+#Live task events of a project over Server-Sent Events (async, ASGI only).
+
+class AsyncTaskEventsAPIView(AsyncProjectChildAPIView):
+	"""
+	Streams task.created / task.updated / task.deleted events of one project as text/event-stream, instead of
+	polling the task list. The stream ends after PROJECT_EVENTS["MAX_SECONDS"], when the project is deleted or when
+	the client falls too far behind; EventSource then reconnects with Last-Event-ID and gets what it missed.
+	"""
+	authentication = EventStreamAuthentication()
+	retry_ms = 3000  # reconnect delay announced to EventSource
+
+	async def get(self, request, project_id):
+		if not events.enabled():
+			return events_off_response()
+		project, error = await self.get_project(request, project_id)
+		if error:
+			return error
+		# a ticket opens the stream of the project it was issued for only
+		if request.auth.get("project") not in (None, str(project["_id"])):
+			return Response({"detail": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
+		# Subscribing (bounded per process) and reading what a reconnecting client missed----------------------------
+		last_event_id = request.headers.get("Last-Event-ID") or request.query_params.get("last_event_id")
+		try:
+			subscription, missed = await events.bus().subscribe(project["_id"], last_event_id)
+		except events.TooManySubscribers:
+			return Response({"detail": "Too many open event streams, retry later"},
+				status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": str(self.retry_ms // 1000)})
+		response = StreamingHttpResponse(self.stream(subscription, missed), content_type="text/event-stream")
+		response["Cache-Control"] = "no-cache"
+		response["X-Accel-Buffering"] = "no"  # keeps nginx from buffering the stream
+		return response
+
+	async def stream(self, subscription, missed):
+		conf = events.config()
+		loop = asyncio.get_running_loop()
+		deadline = loop.time() + conf["MAX_SECONDS"]
+		sent = {event["id"] for event in missed}
+		try:
+			yield f"retry: {self.retry_ms}\n\n"
+			for event in missed:
+				yield events.format_event(event)
+			while (remaining := deadline - loop.time()) > 0:
+				event = await subscription.next(min(conf["HEARTBEAT_SECONDS"], remaining))
+				if subscription.overflowed:
+					return
+				if event is None:
+					yield ": keepalive\n\n"
+				elif event["id"] not in sent:
+					yield events.format_event(event)
+					if event["type"] == events.PROJECT_DELETED:
+						return
+		finally:
+			subscription.close()
@@ -0,0 +1,131 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+from project_handler.models import Project, Task
+from project_handler.serializers import ProjectSerializer, TaskSerializer
+from ProjectManagerCore import read_routing
+
+
+# read-through cache of project/task reads on a Django cache (CACHES[PROJECT_CACHE["ALIAS"]]):
+# - "project:<id>" -> {"owner", "version", "data"}: the serialized project at one version
+# - "task:<id>" -> {"project", "version", "data"}: the serialized task at one version of its project
+# Readers take the project's current {owner, version} from Mongo first (versions.project_state) and pass the version
+# in; an entry of another version is refilled, so an entry a write in another worker left behind (LocMem is per
+# process) is never served. Every task write bumps its project's version, which covers the task entries as well.
+# Fills read from the primary: a secondary that lags the version read could store older data under a newer version.
+# Entries expire after TTL_SECONDS and every write also drops the entries it touched (versions.project_changed drops
+# the project, the task views drop their tasks). Ownership and deletion are never taken from the cache.
+class ProjectCache:
+	kinds = ("project", "task")
+	events = ("hits", "misses", "sets", "invalidations")
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._counts = {}
+		self.clear_stats()
+
+	# settings are read on every call so override_settings / env changes apply without a restart
+	@staticmethod
+	def config():
+		conf = getattr(settings, "PROJECT_CACHE", {})
+		return (
+			conf.get("ENABLED", True),
+			conf.get("ALIAS", "default"),
+			conf.get("TTL_SECONDS", 30),
+		)
+
+	def _count(self, kind, event, amount=1):
+		with self._lock:
+			self._counts[kind][event] += amount
+
+	# cached entry or None (counted as a hit/miss); always None while the cache is disabled
+	def _get(self, kind, key):
+		enabled, alias, _ = self.config()
+		if not enabled:
+			return None
+		entry = caches[alias].get(f"{kind}:{key}")
+		self._count(kind, "hits" if entry is not None else "misses")
+		return entry
+
+	def _set(self, kind, key, entry):
+		enabled, alias, ttl = self.config()
+		if enabled and ttl > 0:
+			caches[alias].set(f"{kind}:{key}", entry, ttl)
+			self._count(kind, "sets")
+		return entry
+
+	# {"owner", "version", "data"} of an undeleted project at `version` (one primary read on a miss or another
+	# version), None if there is none
+	def project(self, project_id, version):
+		entry = self._get("project", project_id)
+		if entry is not None and entry["version"] == version:
+			return entry
+		with read_routing.primary_reads():
+			project = Project.objects.filter(id=project_id, deleted_at=None).no_dereference().first()
+		if project is None:
+			return None
+		return self._set("project", project_id, {
+			"owner": project.owner.id,
+			"version": project.version,
+			"data": dict(ProjectSerializer(project).data),
+		})
+
+	# {"project", "version", "data"} of a task, None if there is none. Without a version any entry will do (a task
+	# never changes project, so it tells which project to check); a miss is read once and stored unverified (version
+	# None: its project version was not read before it), the returned copy is marked "fresh" so the caller serves the
+	# document it just read instead of reading it again. With a version, an entry of another version (an unverified one
+	# included) is refilled with one primary read and stored under that version, read before this fill
+	def task(self, task_id, version=None):
+		entry = self._get("task", task_id)
+		if entry is not None and (version is None or entry["version"] == version):
+			return entry
+		with read_routing.primary_reads():
+			task = Task.objects.filter(id=task_id).no_dereference().first()
+		if task is None:
+			return None
+		entry = self._set("task", task_id, {
+			"project": task.project.id,
+			"version": version,
+			"data": dict(TaskSerializer(task).data),
+		})
+		return entry if version is not None else dict(entry, fresh=True)
+
+	def invalidate(self, kind, *keys):
+		enabled, alias, _ = self.config()
+		if enabled and keys:
+			caches[alias].delete_many([f"{kind}:{key}" for key in keys])
+			self._count(kind, "invalidations", len(keys))
+
+	async def ainvalidate(self, kind, *keys):
+		enabled, alias, _ = self.config()
+		if enabled and keys:
+			await caches[alias].adelete_many([f"{kind}:{key}" for key in keys])
+			self._count(kind, "invalidations", len(keys))
+
+	def clear(self):
+		_, alias, _ = self.config()
+		caches[alias].clear()
+		self.clear_stats()
+
+	def clear_stats(self):
+		with self._lock:
+			self._counts = {kind: dict.fromkeys(self.events, 0) for kind in self.kinds}
+
+	def stats(self):
+		enabled, alias, ttl = self.config()
+		with self._lock:
+			counts = {kind: dict(events) for kind, events in self._counts.items()}
+		for events in counts.values():
+			lookups = events["hits"] + events["misses"]
+			events["hit_ratio"] = round(events["hits"] / lookups, 4) if lookups else 0.0
+		return {
+			"enabled": enabled,
+			"backend": settings.CACHES[alias]["BACKEND"].rsplit(".", 1)[-1],
+			"ttl_seconds": ttl,
+			**counts,
+		}
+
+
+project_cache = ProjectCache()
@@ -0,0 +1,108 @@
+from rest_framework.fields import DateTimeField
+
+from project_handler.models import Project, Task, TASK_STATUS_COUNTERS, empty_task_counts
+from ProjectManagerCore.db import get_async_collection
+from ProjectManagerCore import read_routing
+
+
+datetime_field = DateTimeField()
+
+
+# applies per-status deltas ({"Todo": 1, "Done": -1}) to one project's counters with a single atomic $inc.
+# Projects without task_counts (created before the counters) are left alone: an $inc there would create a
+# partial set of counters that looks valid; they get a full recount instead
+def counter_update(project_id, deltas):
+	inc = {
+		f"task_counts.{TASK_STATUS_COUNTERS[status]}": amount
+		for status, amount in deltas.items()
+		if amount and status in TASK_STATUS_COUNTERS
+	}
+	if not inc:
+		return None
+	return {"_id": project_id, "task_counts": {"$exists": True}}, {"$inc": inc}
+
+
+def apply_deltas(project_id, deltas):
+	update = counter_update(project_id, deltas)
+	if update:
+		Project._get_collection().update_one(*update)
+
+
+# deltas of one task write: created, deleted, or moved from one status to another (nothing when it stays put)
+def task_deltas(old_status=None, new_status=None):
+	deltas = {}
+	if old_status != new_status:
+		if old_status:
+			deltas[old_status] = -1
+		if new_status:
+			deltas[new_status] = 1
+	return deltas
+
+
+# the $group fallback: counts the project's tasks per status straight from the tasks collection
+def count_tasks(project_id):
+	counts = empty_task_counts()
+	pipeline = [
+		{"$match": {"project": project_id}},
+		{"$group": {"_id": "$status", "count": {"$sum": 1}}},
+	]
+	for row in Task._get_collection().aggregate(pipeline):
+		if row["_id"] in TASK_STATUS_COUNTERS:
+			counts[TASK_STATUS_COUNTERS[row["_id"]]] = row["count"]
+	return counts
+
+
+# replaces the stored counters with a fresh $group count, returns the new counters
+def recount(project_id):
+	counts = count_tasks(project_id)
+	Project._get_collection().update_one({"_id": project_id}, {"$set": {"task_counts": counts}})
+	return counts
+
+
+# response body of the summary endpoint, keyed by the status values the API uses everywhere else
+def summary(project_id, counts):
+	by_status = {status: counts.get(key, 0) for status, key in TASK_STATUS_COUNTERS.items()}
+	return {"project": str(project_id), "counts": by_status, "total": sum(by_status.values())}
+
+
+# task_stats of a project with no tasks: zero counts, last activity is the project's creation
+def empty_stats(created_at):
+	counts = {status: 0 for status in TASK_STATUS_COUNTERS}
+	return {"counts": counts, "total": 0, "last_activity_at": datetime_field.to_representation(created_at)}
+
+
+# counts per status and the latest task write for a page of projects, in one $group over their tasks.
+# The ids come from an already paginated page, so the join only ever touches the tasks of <= limit projects
+# (the $match is served by the project_created_at index)
+def task_stats_pipeline(project_ids):
+	group = {"_id": "$project", "total": {"$sum": 1}, "last": {"$max": {"$ifNull": ["$updated_at", "$created_at"]}}}
+	for status, key in TASK_STATUS_COUNTERS.items():
+		group[key] = {"$sum": {"$cond": [{"$eq": ["$status", status]}, 1, 0]}}
+	return [{"$match": {"project": {"$in": list(project_ids)}}}, {"$group": group}]
+
+
+# returns {project_id: task_stats}
+def task_stats(project_ids):
+	if not project_ids:
+		return {}
+	collection = read_routing.route_read(Task._get_collection())
+	return stats_from_rows(collection.aggregate(task_stats_pipeline(project_ids)))
+
+
+async def atask_stats(project_ids):
+	if not project_ids:
+		return {}
+	collection = read_routing.route_read(get_async_collection(Task))
+	cursor = await collection.aggregate(task_stats_pipeline(project_ids))
+	return stats_from_rows(await cursor.to_list())
+
+
+def stats_from_rows(rows):
+	stats = {}
+	for row in rows:
+		stats[row["_id"]] = {
+			"counts": {status: row[key] for status, key in TASK_STATUS_COUNTERS.items()},
+			"total": row["total"],
+			"last_activity_at": datetime_field.to_representation(row["last"]) if row["last"] else None,
+		}
+	return stats
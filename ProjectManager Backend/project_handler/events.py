@@ -0,0 +1,385 @@
+import asyncio
+import json
+import logging
+import secrets
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.conf import settings
+from django.core import signing
+
+from project_handler.models import TaskEvent
+from project_handler.serializers import TaskListSerializer
+from ProjectManagerCore import db
+from ProjectManagerCore.db import get_async_collection
+
+logger = logging.getLogger(__name__)
+
+
+# Task events of one project for the SSE endpoint (async_views.AsyncTaskEventsAPIView). The write views publish
+# task.created / task.updated / task.deleted (and project.deleted) to a bus, each open stream is a Subscription:
+# - LocalBus: in-process pub/sub, the stand-in for one process (tests, runserver, a single uvicorn worker).
+#   Event ids are "<boot>-<n>", the last HISTORY events of each project are kept for Last-Event-ID resumes.
+# - ChangeStreamBus: the write views insert into task_events (TTL-indexed, models.TaskEvent) and one change stream
+#   per process fans the inserts out to its subscribers, so events reach every worker. Event ids are the
+#   task_events _ids, a resume reads the missed events back from the collection.
+# A resume that cannot be served (unknown id, or more missed events than HISTORY) gets one "reset" event: the client
+# reloads the task list and continues from there.
+# - NullBus ("off"): no streams are served and publishing does nothing. The change stream bus costs every task
+#   write one task_events insert (a PATCH is 4 Mongo operations instead of 3), which a deployment that serves no
+#   streams (a WSGI-only one, see settings_api.py) should not pay.
+
+CREATED, UPDATED, DELETED, PROJECT_DELETED = "task.created", "task.updated", "task.deleted", "project.deleted"
+RESET = "reset"
+
+
+def config():
+	conf = getattr(settings, "PROJECT_EVENTS", {})
+	return {
+		"BUS": conf.get("BUS", "auto"),
+		"MAX_SUBSCRIBERS": conf.get("MAX_SUBSCRIBERS", 1000),
+		"QUEUE_SIZE": conf.get("QUEUE_SIZE", 100),
+		"HISTORY": conf.get("HISTORY", 100),
+		"HEARTBEAT_SECONDS": conf.get("HEARTBEAT_SECONDS", 15),
+		"MAX_SECONDS": conf.get("MAX_SECONDS", 300),
+		"TICKET_SECONDS": conf.get("TICKET_SECONDS", 60),
+	}
+
+
+# EventSource cannot send an Authorization header, so a page trades its access token for a stream ticket
+# (AsyncTaskEventsTicketAPIView) and puts that in the URL instead: signed with SECRET_KEY under its own salt, bound to
+# one user and one project, valid for TICKET_SECONDS. It opens that project's stream and nothing else, so a URL that
+# ends up in a proxy log or the browser history is no access token.
+TICKET_SALT = "project_handler.events.ticket"
+
+
+def issue_ticket(user_id, project_id):
+	return signing.dumps({"user_id": str(user_id), "project": str(project_id)}, salt=TICKET_SALT)
+
+
+# {"user_id", "project"} of a valid ticket, None when it is forged, meant for something else or expired
+def read_ticket(ticket):
+	try:
+		return signing.loads(ticket, salt=TICKET_SALT, max_age=config()["TICKET_SECONDS"])
+	except signing.BadSignature:
+		return None
+
+
+class TooManySubscribers(Exception):
+	pass
+
+
+# one open stream: events pushed from any thread are handed to the subscriber's event loop. A subscriber that falls
+# QUEUE_SIZE events behind is closed (overflowed) instead of buffering without bound; it resumes on reconnect
+class Subscription:
+	def __init__(self, bus, project_id, queue_size):
+		self.bus = bus
+		self.project_id = project_id
+		self.loop = asyncio.get_running_loop()
+		self.events = deque()
+		self.ready = asyncio.Event()
+		self.queue_size = queue_size
+		self.overflowed = False
+
+	def push(self, event):
+		try:
+			self.loop.call_soon_threadsafe(self._append, event)
+		except RuntimeError:
+			pass  # the subscriber's loop is closed, it unsubscribes on its way out
+
+	def _append(self, event):
+		if len(self.events) >= self.queue_size:
+			self.overflowed = True
+		else:
+			self.events.append(event)
+		self.ready.set()
+
+	def _overflow(self):
+		self.overflowed = True
+		self.ready.set()
+
+	# the next event, or None after `timeout` seconds without one (or once overflowed)
+	async def next(self, timeout):
+		if not self.events and not self.overflowed:
+			self.ready.clear()
+			try:
+				await asyncio.wait_for(self.ready.wait(), timeout)
+			except asyncio.TimeoutError:
+				return None
+		if self.overflowed or not self.events:
+			return None
+		return self.events.popleft()
+
+	def close(self):
+		self.bus.unsubscribe(self)
+
+
+# subscriber bookkeeping shared by both buses, bounded by MAX_SUBSCRIBERS per process
+class Bus:
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._subscribers = {}  # project_id -> set of Subscriptions
+		self.subscriber_count = 0
+
+	def _add(self, subscription):
+		if self.subscriber_count >= config()["MAX_SUBSCRIBERS"]:
+			raise TooManySubscribers()
+		self._subscribers.setdefault(subscription.project_id, set()).add(subscription)
+		self.subscriber_count += 1
+
+	def unsubscribe(self, subscription):
+		with self._lock:
+			subscribers = self._subscribers.get(subscription.project_id)
+			if subscribers and subscription in subscribers:
+				subscribers.discard(subscription)
+				self.subscriber_count -= 1
+				if not subscribers:
+					del self._subscribers[subscription.project_id]
+
+	def _dispatch(self, project_id, event):
+		with self._lock:
+			subscribers = list(self._subscribers.get(project_id, ()))
+		for subscription in subscribers:
+			subscription.push(event)
+
+
+# the kept events of one project and the sequence of the newest event it no longer has
+class History:
+	def __init__(self, size, dropped):
+		self.events = deque()
+		self.size = size
+		self.dropped = dropped
+
+	def append(self, sequence, event):
+		self.events.append((sequence, event))
+		if len(self.events) > self.size:
+			self.dropped = self.events.popleft()[0]
+
+
+class LocalBus(Bus):
+	# projects whose history is kept, least recently published dropped first
+	HISTORY_PROJECTS = 1000
+
+	def __init__(self):
+		super().__init__()
+		self.boot = secrets.token_hex(4)
+		self._sequence = 0
+		self._history = OrderedDict()  # project_id -> History
+		self._evicted = 0  # newest sequence of any history dropped from the LRU
+
+	def publish(self, project_id, event_type, data):
+		with self._lock:
+			self._sequence += 1
+			event = {"id": f"{self.boot}-{self._sequence}", "type": event_type, "data": data}
+			history = self._history.pop(project_id, None) or History(config()["HISTORY"], self._evicted)
+			history.append(self._sequence, event)
+			self._history[project_id] = history
+			while len(self._history) > self.HISTORY_PROJECTS:
+				_, evicted = self._history.popitem(last=False)
+				self._evicted = max(self._evicted, evicted.events[-1][0])
+		self._dispatch(project_id, event)
+
+	async def apublish(self, project_id, event_type, data):
+		self.publish(project_id, event_type, data)
+
+	# registers the subscription and reads the missed events under one lock, so nothing falls in between;
+	# returns (subscription, missed events) where the missed events may be [reset]
+	async def subscribe(self, project_id, last_event_id=None):
+		subscription = Subscription(self, project_id, config()["QUEUE_SIZE"])
+		with self._lock:
+			self._add(subscription)
+			missed = self._missed(project_id, last_event_id) if last_event_id else []
+		return subscription, missed
+
+	# a resume from an id of another process/boot, or from before events this bus no longer has, is a reset
+	def _missed(self, project_id, last_event_id):
+		boot, _, sequence = last_event_id.rpartition("-")
+		if boot != self.boot or not sequence.isdigit():
+			return [reset_event(f"{self.boot}-{self._sequence}")]
+		sequence = int(sequence)
+		history = self._history.get(project_id)
+		if sequence < (history.dropped if history else self._evicted):
+			return [reset_event(f"{self.boot}-{self._sequence}")]
+		return [event for position, event in (history.events if history else ()) if position > sequence]
+
+
+class ChangeStreamBus(Bus):
+	# how long a subscribe waits for the change stream to open before reading the missed events
+	OPEN_TIMEOUT = 5
+
+	def __init__(self):
+		super().__init__()
+		self._watcher = None
+		self._watching = None  # asyncio.Event, set once the current change stream is open
+
+	@staticmethod
+	def _row(project_id, event_type, data):
+		return {"project": project_id, "type": event_type, "data": data, "created_at": datetime.utcnow()}
+
+	# the insert is the whole publish: the change stream of every process (this one included) delivers it
+	def publish(self, project_id, event_type, data):
+		TaskEvent._get_collection().insert_one(self._row(project_id, event_type, data))
+
+	async def apublish(self, project_id, event_type, data):
+		await get_async_collection(TaskEvent).insert_one(self._row(project_id, event_type, data))
+
+	async def subscribe(self, project_id, last_event_id=None):
+		subscription = Subscription(self, project_id, config()["QUEUE_SIZE"])
+		with self._lock:
+			self._add(subscription)
+			if self._watcher is None or self._watcher.done():
+				self._watching = asyncio.Event()
+				self._watcher = subscription.loop.create_task(self._watch(self._watching))
+			watching = self._watching
+		try:
+			# missed events are read once the stream is open, so every later insert arrives live (the stream
+			# drops live events it already sent from the missed ones)
+			await asyncio.wait_for(watching.wait(), self.OPEN_TIMEOUT)
+			missed = await self.missed(project_id, last_event_id) if last_event_id else []
+		except Exception:
+			subscription.close()
+			raise
+		return subscription, missed
+
+	# events after last_event_id from task_events, oldest first; [reset] when the id is unknown, older than the
+	# collection keeps events, or more than HISTORY events were missed
+	async def missed(self, project_id, last_event_id):
+		try:
+			last = ObjectId(last_event_id)
+		except (InvalidId, TypeError):
+			return [reset_event(str(ObjectId()))]
+		if last.generation_time.replace(tzinfo=None) < datetime.utcnow() - timedelta(seconds=TaskEvent.RETENTION_SECONDS):
+			return [reset_event(str(ObjectId()))]
+		history = config()["HISTORY"]
+		cursor = get_async_collection(TaskEvent).find({"project": project_id, "_id": {"$gt": last}})
+		rows = await cursor.sort([("_id", 1)]).limit(history + 1).to_list()
+		if len(rows) > history:
+			return [reset_event(str(ObjectId()))]
+		return [self.to_event(row) for row in rows]
+
+	@staticmethod
+	def to_event(row):
+		return {"id": str(row["_id"]), "type": row["type"], "data": row["data"]}
+
+	# one change stream of task_events inserts for all of this process's subscribers; it ends with the last one.
+	# If it fails, the open streams are closed (as overflowed) and resume from task_events when they reconnect
+	async def _watch(self, watching):
+		pipeline = [{"$match": {"operationType": "insert"}}]
+		try:
+			async with await get_async_collection(TaskEvent).watch(pipeline) as stream:
+				watching.set()
+				while True:
+					# leaving and forgetting the watcher under the lock, so a new subscriber starts a new one
+					with self._lock:
+						if not self.subscriber_count:
+							self._watcher = None
+							return
+					change = await stream.try_next()
+					if change is not None:
+						row = change["fullDocument"]
+						self._dispatch(row["project"], self.to_event(row))
+		except Exception:
+			logger.exception("task_events change stream failed")
+			with self._lock:
+				self._watcher = None
+				subscribers = [sub for subs in self._subscribers.values() for sub in subs]
+			for subscription in subscribers:
+				subscription.loop.call_soon_threadsafe(subscription._overflow)
+		finally:
+			watching.set()
+
+
+# PROJECT_EVENTS_BUS=off: writes publish nothing and the stream views answer 501, like on a WSGI worker
+class NullBus:
+	def publish(self, project_id, event_type, data):
+		pass
+
+	async def apublish(self, project_id, event_type, data):
+		pass
+
+
+# the reset event carries the current position, so the client's next reconnect resumes from here
+def reset_event(event_id):
+	return {"id": event_id, "type": RESET, "data": {}}
+
+
+# one event in text/event-stream framing
+def format_event(event):
+	data = json.dumps(event["data"], separators=(",", ":"))
+	return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+BUSES = {"local": LocalBus, "change_stream": ChangeStreamBus, "off": NullBus}
+_buses = {}
+_buses_lock = threading.Lock()
+
+
+# the configured bus ("auto": change streams on a real server, the local bus on mongomock), one per process
+def bus_name():
+	name = config()["BUS"]
+	if name == "auto":
+		name = "change_stream" if db.CONNECTION_STRING else "local"
+	return name
+
+
+def enabled():
+	return bus_name() != "off"
+
+
+def bus():
+	name = bus_name()
+	with _buses_lock:
+		if name not in _buses:
+			_buses[name] = BUSES[name]()
+		return _buses[name]
+
+
+def reset():
+	with _buses_lock:
+		_buses.clear()
+
+
+# Publishing from the write views. A task's data matches the task list rows; updates carry only the fields the
+# write set (plus id and project), deletes only id and project
+
+def publish(project_id, event_type, data):
+	bus().publish(project_id, event_type, dict(data))
+
+
+async def apublish(project_id, event_type, data):
+	await bus().apublish(project_id, event_type, dict(data))
+
+
+# list-row data of a raw task document
+def task_data(row):
+	return TaskListSerializer([row]).data[0]
+
+
+def change_data(task_id, project_id, set_doc):
+	serializer = TaskListSerializer(())
+	data = {"id": str(task_id), "project": str(project_id)}
+	data.update({name: serializer.to_value(value) for name, value in set_doc.items()})
+	return data
+
+
+def deleted_data(task_id, project_id):
+	return {"id": str(task_id), "project": str(project_id)}
+
+
+def task_created(project_id, data):
+	publish(project_id, CREATED, data)
+
+
+def task_updated(project_id, task_id, set_doc):
+	publish(project_id, UPDATED, change_data(task_id, project_id, set_doc))
+
+
+def task_deleted(project_id, task_id):
+	publish(project_id, DELETED, deleted_data(task_id, project_id))
+
+
+def project_deleted(project_id):
+	publish(project_id, PROJECT_DELETED, {"id": str(project_id)})
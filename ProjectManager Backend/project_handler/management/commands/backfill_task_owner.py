@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from project_handler.models import Project, Task
+
+
+class Command(BaseCommand):
+	help = "Copy project.owner onto every Task that has no owner yet (one update per project)."
+
+	def add_arguments(self, parser):
+		parser.add_argument("--dry-run", action="store_true", help="Only count the tasks that would be updated")
+
+	def handle(self, *args, **options):
+		projects = 0
+		updated = 0
+		# raw dicts: only the two ids are needed, no Document building or dereferencing
+		for row in Project.objects.only("id", "owner").as_pymongo():
+			pending = Task.objects.filter(project=row["_id"], owner=None)
+			if options["dry_run"]:
+				count = pending.count()
+			else:
+				count = pending.update(set__owner=row["owner"])
+			if count:
+				projects += 1
+				updated += count
+
+		verb = "would update" if options["dry_run"] else "updated"
+		self.stdout.write(self.style.SUCCESS(f"{verb} {updated} task(s) across {projects} project(s)"))
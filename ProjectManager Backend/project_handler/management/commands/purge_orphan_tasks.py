@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from project_handler.models import Project, Task
+from project_handler.purge import purge_project, purge_tasks
+
+
+class Command(BaseCommand):
+	help = (
+		"Remove tasks whose project no longer exists, and finish purging projects that were marked deleted "
+		"but not fully removed (e.g. the worker was restarted mid-purge)."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument("--dry-run", action="store_true", help="Only report what would be removed")
+		parser.add_argument("--batch-size", type=int, default=settings.PROJECT_PURGE_BATCH_SIZE,
+			help="Tasks removed per delete_many")
+
+	def handle(self, *args, **options):
+		dry_run = options["dry_run"]
+		batch_size = options["batch_size"]
+
+		# 1. projects marked deleted whose purge never finished--------------------------------------------------------
+		pending = list(Project.objects.filter(deleted_at__ne=None).scalar("id"))
+		for project_id in pending:
+			if dry_run:
+				count = Task.objects.filter(project=project_id).count()
+				self.stdout.write(f"deleted project {project_id}: {count} task(s) to purge")
+			else:
+				count = purge_project(project_id, batch_size)
+				self.stdout.write(f"deleted project {project_id}: purged {count} task(s)")
+
+		# 2. tasks pointing at a project document that is gone-----------------------------------------------------------
+		referenced = set(Task._get_collection().distinct("project"))
+		existing = set(Project.objects.filter(id__in=list(referenced)).scalar("id")) if referenced else set()
+		orphaned = referenced - existing
+		removed = 0
+		for project_id in orphaned:
+			if dry_run:
+				count = Task.objects.filter(project=project_id).count()
+			else:
+				count = purge_tasks(project_id, batch_size)
+			removed += count
+			self.stdout.write(f"missing project {project_id}: {count} orphaned task(s)")
+
+		verb = "would remove" if dry_run else "removed"
+		self.stdout.write(self.style.SUCCESS(
+			f"{verb} orphaned tasks of {len(orphaned)} missing project(s) ({removed} task(s)), "
+			f"{len(pending)} deleted project(s) pending purge"
+		))
@@ -0,0 +1,51 @@
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.core.management.base import BaseCommand, CommandError
+from pymongo import UpdateMany
+
+from project_handler.models import Project, Task, TASK_STATUS_COUNTERS, empty_task_counts
+
+
+class Command(BaseCommand):
+	help = (
+		"Recount Project.task_counts from the tasks collection with one $group and fix projects whose counters "
+		"drifted or are missing (projects created before the counters existed)."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument("--project", help="Only recount this project id")
+		parser.add_argument("--dry-run", action="store_true", help="Only report projects whose counters are off")
+
+	def handle(self, *args, **options):
+		match = {"deleted_at": None}
+		if options["project"]:
+			try:
+				match["_id"] = ObjectId(options["project"])
+			except InvalidId:
+				raise CommandError(f"Invalid project id {options['project']}")
+
+		# stored counters, then the real counts of every project in one pass over tasks-------------------------------
+		stored = {row["_id"]: row.get("task_counts") for row in Project._get_collection().find(match, {"task_counts": 1})}
+		actual = {project_id: empty_task_counts() for project_id in stored}
+		pipeline = [
+			{"$match": {"project": {"$in": list(stored)}}},
+			{"$group": {"_id": {"project": "$project", "status": "$status"}, "count": {"$sum": 1}}},
+		]
+		for row in Task._get_collection().aggregate(pipeline):
+			key = TASK_STATUS_COUNTERS.get(row["_id"].get("status"))
+			if key:
+				actual[row["_id"]["project"]][key] = row["count"]
+
+		# one bulk_write with a $set for every project that is off------------------------------------------------------
+		writes = []
+		for project_id, counts in actual.items():
+			if stored[project_id] == counts:
+				continue
+			self.stdout.write(f"project {project_id}: {stored[project_id]} -> {counts}")
+			# UpdateMany on the unique _id, as in the task batch view (mongomock rejects UpdateOne in bulk_write)
+			writes.append(UpdateMany({"_id": project_id}, {"$set": {"task_counts": counts}}))
+		if writes and not options["dry_run"]:
+			Project._get_collection().bulk_write(writes, ordered=False)
+
+		verb = "would fix" if options["dry_run"] else "fixed"
+		self.stdout.write(self.style.SUCCESS(f"{verb} counters of {len(writes)} of {len(stored)} project(s)"))
@@ -0,0 +1,104 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from auth_handler.models import User, RevokedToken
+from project_handler.models import Project, Task, TaskEvent
+
+
+# every mongoengine document whose indexes this command manages
+DOCUMENTS = (User, RevokedToken, Project, Task, TaskEvent)
+
+# index options that make two indexes on the same keys different
+COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+
+# text fields collapse into the ("_fts", "text"), ("_ftsx", 1) pair the server reports for a text index
+# (mongomock reports the declared fields); text weights are not compared, change them with --drop --create by hand
+def normalized_key(key):
+	normalized = []
+	for field, direction in key:
+		if direction == "text" or field == "_fts":
+			if ("_fts", "text") not in normalized:
+				normalized += [("_fts", "text"), ("_ftsx", 1)]
+		elif field != "_ftsx":
+			normalized.append((field, direction))
+	return tuple(normalized)
+
+
+# normalizes a declared spec / an index_information() entry to (key, options) so both sides compare equal
+def index_signature(key, options):
+	key = normalized_key(key)
+	opts = tuple((name, options[name]) for name in COMPARED_OPTIONS if options.get(name))
+	return key, opts
+
+
+def declared_indexes(document):
+	declared = {}
+	for spec in document._meta["index_specs"]:
+		spec = spec.copy()
+		fields = spec.pop("fields")
+		declared[index_signature(fields, spec)] = (fields, spec)
+	return declared
+
+
+def existing_indexes(collection):
+	existing = {}
+	for name, info in collection.index_information().items():
+		if name == "_id_":
+			continue
+		existing[index_signature(info["key"], info)] = name
+	return existing
+
+
+class Command(BaseCommand):
+	help = (
+		"Diff the indexes declared in the document meta against the auth_db/project_db collections. "
+		"--create builds missing indexes in the background, --drop removes indexes that are no longer declared."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument("--alias", choices=("auth_db", "project_db"), help="Only handle documents on this alias")
+		parser.add_argument("--create", action="store_true", help="Create missing indexes")
+		parser.add_argument("--drop", action="store_true", help="Drop indexes that are not declared")
+
+	def handle(self, *args, **options):
+		alias = options["alias"]
+		documents = [doc for doc in DOCUMENTS if not alias or doc._meta["db_alias"] == alias]
+		if not documents:
+			raise CommandError(f"No documents registered for alias {alias}")
+
+		for document in documents:
+			# the raw collection: document._get_collection() runs ensure_indexes() on its first call in a process
+			# (MONGO_AUTO_CREATE_INDEX), which would build the missing indexes before the diff is taken
+			collection = document._get_db()[document._get_collection_name()]
+			label = f"{document._meta['db_alias']}.{collection.name}"
+			declared = declared_indexes(document)
+			existing = existing_indexes(collection)
+
+			missing = [sig for sig in declared if sig not in existing]
+			extra = [sig for sig in existing if sig not in declared]
+
+			if not missing and not extra:
+				self.stdout.write(f"{label}: in sync")
+				continue
+
+			for sig in extra:
+				name = existing[sig]
+				self.stdout.write(f"{label}: not declared {name}")
+				if options["drop"]:
+					collection.drop_index(name)
+					self.stdout.write(self.style.WARNING(f"{label}: dropped {name}"))
+
+			for sig in missing:
+				fields, spec = declared[sig]
+				self.stdout.write(f"{label}: missing {spec.get('name') or fields} {dict(sig[1])}")
+				if options["create"]:
+					# background=True keeps pre-4.2 servers from locking the collection during the build;
+					# newer servers always use the non-blocking optimized build
+					collection.create_index(fields, background=True, **spec)
+					self.stdout.write(self.style.SUCCESS(f"{label}: created {spec.get('name') or fields}"))
+
+# Notes:
+# - Without --create/--drop the command only prints the diff and never writes (it reads the raw collections, so
+#   mongoengine's auto index creation does not run either); safe to run against production.
+# - An index whose keys match but whose options changed shows up as both missing and not declared;
+#   run with --drop --create to replace it (drops run before creates).
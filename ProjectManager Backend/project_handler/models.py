@@ -1,20 +1,101 @@
-from mongoengine import Document, StringField, ReferenceField, DateTimeField
+from mongoengine import Document, StringField, ReferenceField, DateTimeField, DictField, IntField, ObjectIdField
 from datetime import datetime
+from django.conf import settings
+
+
+# Task.status value -> its counter key in Project.task_counts
+TASK_STATUS_COUNTERS = {"Todo": "todo", "In Progress": "in_progress", "Done": "done"}
+
+
+def empty_task_counts():
+	return {key: 0 for key in TASK_STATUS_COUNTERS.values()}
 
 
 class Project(Document):
-	meta = {"collection": "projects", "db_alias": "project_db"}
+	meta = {
+		"collection": "projects",
+		"db_alias": "project_db",
+		# list view: filter(owner=...) ordered/paged by (created_at, id)
+		"indexes": [
+			{"fields": ["owner", "created_at", "id"], "name": "owner_created_at"},
+			# search view: $text over name/description behind an owner equality prefix, so a search only reads the
+			# caller's postings (one text index per collection; project_handler/search.py)
+			{"fields": ["owner", "$name", "$description"], "name": "owner_text", "weights": {"name": 10, "description": 2}},
+		],
+		"index_background": True,
+		"auto_create_index": settings.MONGO_AUTO_CREATE_INDEX,
+	}
 	name = StringField(required=True)
 	description = StringField()
 	owner = ReferenceField('auth_handler.models.User', required=True)
 	created_at = DateTimeField(default=datetime.utcnow)
+	# set when the project is deleted; its tasks are then purged in the background (project_handler/purge.py)
+	deleted_at = DateTimeField()
+	# per-status task counters, kept current with $inc by every task write (project_handler/counters.py);
+	# projects created before the field existed lack it until the summary endpoint or recount_task_counters fills it
+	task_counts = DictField(default=empty_task_counts)
+	# bumped with $inc by every write to the project or its tasks, the ETag of the detail and task list views
+	# (project_handler/versions.py); missing on older projects, which read as version 0
+	version = IntField(default=0)
+
+
+# version stamp of one owner's project list, bumped by every project/task write of that owner; the list view
+# answers If-None-Match from this single _id lookup (project_handler/versions.py)
+class ProjectListVersion(Document):
+	meta = {
+		"collection": "project_list_versions",
+		"db_alias": "project_db",
+	}
+	owner = ObjectIdField(primary_key=True)
+	version = IntField(default=0)
 
 
 class Task(Document):
-	meta = {"collection": "tasks", "db_alias": "project_db"}
+	meta = {
+		"collection": "tasks",
+		"db_alias": "project_db",
+		# list view: filter(project=...) and filter(project=..., status=...) paged by (created_at, id)
+		"indexes": [
+			{"fields": ["project", "created_at", "id"], "name": "project_created_at"},
+			{"fields": ["project", "status", "created_at", "id"], "name": "project_status_created_at"},
+			# search view, as on Project (tasks without owner, see backfill_task_owner, are not found)
+			{"fields": ["owner", "$title", "$description"], "name": "owner_text", "weights": {"title": 10, "description": 2}},
+		],
+		"index_background": True,
+		"auto_create_index": settings.MONGO_AUTO_CREATE_INDEX,
+	}
 	title = StringField(required=True)
 	description = StringField()
-	status = StringField(choices=("Todo", "In Progress", "Done"), default="Todo")
+	status = StringField(choices=tuple(TASK_STATUS_COUNTERS), default="Todo")
 	project = ReferenceField(Project, required=True)
+	# copy of project.owner so ownership checks go into the query filter (see backfill_task_owner for old rows)
+	owner = ReferenceField('auth_handler.models.User')
 	created_at = DateTimeField(default=datetime.utcnow)
+	# last write to the task (save() via clean(), PATCH and batch updates set it in their $set)
+	updated_at = DateTimeField(default=datetime.utcnow)
 
+	def clean(self):
+		self.updated_at = datetime.utcnow()
+
+
+
+# outbox of task events for the change stream bus (project_handler/events.py): every task write inserts one row,
+# the change stream of each worker fans it out to that worker's SSE subscribers, and a reconnecting client reads the
+# rows after its Last-Event-ID back from here; rows expire after RETENTION_SECONDS
+class TaskEvent(Document):
+	RETENTION_SECONDS = 3600
+
+	meta = {
+		"collection": "task_events",
+		"db_alias": "project_db",
+		"indexes": [
+			{"fields": ["project", "id"], "name": "project_id"},
+			{"fields": ["created_at"], "expireAfterSeconds": RETENTION_SECONDS, "name": "created_at_ttl"},
+		],
+		"index_background": True,
+		"auto_create_index": settings.MONGO_AUTO_CREATE_INDEX,
+	}
+	project = ObjectIdField(required=True)
+	type = StringField(required=True)
+	data = DictField()
+	created_at = DateTimeField(default=datetime.utcnow)
@@ -0,0 +1,165 @@
+import base64
+import binascii
+import json
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+
+
+EPOCH = datetime(1970, 1, 1)
+ASCENDING = [("created_at", 1), ("_id", 1)]
+DESCENDING = [("created_at", -1), ("_id", -1)]
+
+
+# keyset pagination over (created_at, id) — every page is a range scan that starts right after/before the
+# cursor key, so page 500 costs the same as page 1 (no skip/offset)
+class KeysetPagination:
+	cursor_query_param = "cursor"
+	limit_query_param = "limit"
+	max_limit = 100
+
+	def __init__(self, request):
+		self.request = request
+		self.limit = self.get_limit()
+
+	# reads ?limit=, falls back to REST_FRAMEWORK["PAGE_SIZE"] and clamps it to max_limit
+	def get_limit(self):
+		default = settings.REST_FRAMEWORK.get("PAGE_SIZE") or 10
+		raw = self.request.query_params.get(self.limit_query_param)
+		if raw is None or raw == "":
+			return default
+		try:
+			limit = int(raw)
+		except (TypeError, ValueError):
+			raise ParseError("limit must be a positive integer")
+		if limit < 1:
+			raise ParseError("limit must be a positive integer")
+		return min(limit, self.max_limit)
+
+	# opaque cursor = urlsafe base64 of {"t": created_at in epoch ms, "i": id, "d": "n" (next) / "p" (prev)};
+	# the edge row is either a Document or a raw .as_pymongo() dict
+	@staticmethod
+	def encode_cursor(document, direction):
+		if isinstance(document, dict):
+			created_at, doc_id = document["created_at"], document["_id"]
+		else:
+			created_at, doc_id = document.created_at, document.id
+		payload = {
+			"t": (created_at - EPOCH) // timedelta(milliseconds=1),
+			"i": str(doc_id),
+			"d": direction,
+		}
+		raw = json.dumps(payload, separators=(",", ":")).encode()
+		return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+	@staticmethod
+	def decode_cursor(cursor):
+		try:
+			padded = cursor + "=" * (-len(cursor) % 4)
+			payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+			created_at = EPOCH + timedelta(milliseconds=int(payload["t"]))
+			doc_id = ObjectId(payload["i"])
+			direction = payload["d"]
+		except (binascii.Error, ValueError, TypeError, KeyError, InvalidId, OverflowError):
+			raise ParseError("Invalid cursor")
+		if direction not in ("n", "p"):
+			raise ParseError("Invalid cursor")
+		return created_at, doc_id, direction
+
+	# the range filter + sort for the current ?cursor= as raw Mongo documents, shared by the queryset path and the
+	# raw-collection path of the async views; returns (filter, sort, direction) with direction None on the first page
+	def range_query(self):
+		cursor = self.request.query_params.get(self.cursor_query_param)
+		if not cursor:
+			return {}, ASCENDING, None
+		created_at, doc_id, direction = self.decode_cursor(cursor)
+		if direction == "n":
+			# everything strictly after the cursor key, ascending
+			after = {"$or": [{"created_at": {"$gt": created_at}}, {"created_at": created_at, "_id": {"$gt": doc_id}}]}
+			return after, ASCENDING, direction
+		# everything strictly before the cursor key, scanned descending then flipped back to ascending
+		before = {"$or": [{"created_at": {"$lt": created_at}}, {"created_at": created_at, "_id": {"$lt": doc_id}}]}
+		return before, DESCENDING, direction
+
+	# turns the limit + 1 rows read with range_query into (page, next_cursor, prev_cursor)
+	def build_page(self, rows, direction):
+		has_more = len(rows) > self.limit
+		page = rows[:self.limit]
+		if direction == "p":
+			page.reverse()
+			next_cursor = self.encode_cursor(page[-1], "n") if page else None
+			prev_cursor = self.encode_cursor(page[0], "p") if has_more else None
+			return page, next_cursor, prev_cursor
+		next_cursor = self.encode_cursor(page[-1], "n") if has_more else None
+		prev_cursor = self.encode_cursor(page[0], "p") if direction == "n" and page else None
+		return page, next_cursor, prev_cursor
+
+	# returns (documents, next_cursor, prev_cursor) for the given queryset
+	def paginate_queryset(self, queryset):
+		query, sort, direction = self.range_query()
+		order = ["created_at", "id"] if sort is ASCENDING else ["-created_at", "-id"]
+		rows = list(queryset.filter(__raw__=query).order_by(*order).limit(self.limit + 1))
+		return self.build_page(rows, direction)
+
+	# async flavour for the raw (pymongo / async) collections used by project_handler/async_views.py
+	async def apaginate_collection(self, collection, match, projection=None):
+		query, sort, direction = self.range_query()
+		match = {"$and": [match, query]} if query else match
+		rows = await collection.find(match, projection).sort(sort).limit(self.limit + 1).to_list()
+		return self.build_page(rows, direction)
+
+	# builds the list response body, keeping the existing "results" key
+	def get_paginated_data(self, data, next_cursor, prev_cursor):
+		return {
+			"results": data,
+			"next": next_cursor,
+			"prev": prev_cursor,
+			"limit": self.limit,
+		}
+
+# ranked results (search) have no stable key to seek from, so their cursor is an opaque offset into the ranking
+# ({"o": offset}); the ranking is cut at max_results, which bounds how many rows any page has to rank
+class RankedPagination(KeysetPagination):
+	def __init__(self, request, max_results):
+		super().__init__(request)
+		self.max_results = max_results
+		self.offset = self.get_offset()
+
+	@staticmethod
+	def encode_offset(offset):
+		raw = json.dumps({"o": offset}, separators=(",", ":")).encode()
+		return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+	def get_offset(self):
+		cursor = self.request.query_params.get(self.cursor_query_param)
+		if not cursor:
+			return 0
+		try:
+			padded = cursor + "=" * (-len(cursor) % 4)
+			offset = int(json.loads(base64.urlsafe_b64decode(padded.encode()))["o"])
+		except (binascii.Error, ValueError, TypeError, KeyError):
+			raise ParseError("Invalid cursor")
+		if not 0 <= offset < self.max_results:
+			raise ParseError("Invalid cursor")
+		return offset
+
+	# how many of the best rows this page needs: everything up to its end, plus one to know if there is a next page
+	@property
+	def window(self):
+		return self.offset + self.limit + 1
+
+	# turns the best `window` rows, best first, into (page, next_cursor, prev_cursor)
+	def build_ranked_page(self, ranked):
+		end = self.offset + self.limit
+		page = ranked[self.offset:end]
+		next_cursor = self.encode_offset(end) if len(ranked) > end and end < self.max_results else None
+		prev_cursor = self.encode_offset(max(0, self.offset - self.limit)) if self.offset else None
+		return page, next_cursor, prev_cursor
+
+# Notes:
+# - Cursors carry the sort key of the edge row, not a page number, so inserts/deletes between calls never
+#   shift rows across pages.
+# - The range filters are served by the (owner|project, created_at, _id) indexes declared in models.py.
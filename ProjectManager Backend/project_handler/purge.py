@@ -0,0 +1,23 @@
+from django.conf import settings
+
+from project_handler.models import Project, Task
+
+
+# deletes the tasks of one project in bounded batches (find a batch of ids, delete_many on them, repeat), so a
+# huge project never turns into one long-running delete; returns the number of tasks removed
+def purge_tasks(project_id, batch_size=None):
+	batch_size = batch_size or settings.PROJECT_PURGE_BATCH_SIZE
+	removed = 0
+	while True:
+		ids = list(Task.objects.filter(project=project_id).limit(batch_size).scalar("id"))
+		if not ids:
+			return removed
+		removed += Task.objects.filter(id__in=ids).delete()
+
+
+# background half of a project delete: the project is already marked deleted_at by the view,
+# this removes its tasks and then the project document itself
+def purge_project(project_id, batch_size=None):
+	removed = purge_tasks(project_id, batch_size)
+	Project.objects.filter(id=project_id, deleted_at__ne=None).delete()
+	return removed
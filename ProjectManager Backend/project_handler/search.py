@@ -0,0 +1,192 @@
+import heapq
+import math
+import re
+import threading
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from pymongo.errors import OperationFailure
+
+from project_handler.models import Project, Task
+from project_handler.serializers import ProjectListSerializer, TaskListSerializer
+from ProjectManagerCore import db, read_routing
+
+
+# Owner-scoped full-text search over Project.name/description and Task.title/description, two backends:
+# - "text": $text on the owner_text indexes (models.py), ranked by textScore; the owner equality prefix means the
+#   server only reads the caller's postings of the query terms
+# - "inverted": an in-process inverted index per owner, for mongomock (no $text) and servers where the owner_text
+#   indexes are not built yet. It is tagged with the owner's list version (versions.py), which every project/task
+#   write of the owner bumps, so it is rebuilt on the first search after a write (in any process) and otherwise
+#   answers from memory; a search only walks the postings of its terms.
+# Both backends OR the query terms and weight title/name matches over descriptions (the owner_text weights).
+
+TERM = re.compile(r"\w+")
+STOP_WORDS = frozenset("a an and are as at be by for from in is it of on or that the this to with".split())
+# result type -> (document, list serializer of its rows)
+KINDS = {"project": (Project, ProjectListSerializer), "task": (Task, TaskListSerializer)}
+IndexNotFound = 27
+
+
+def config():
+	conf = getattr(settings, "PROJECT_SEARCH", {})
+	return {
+		"BACKEND": conf.get("BACKEND", "auto"),
+		"MAX_RESULTS": conf.get("MAX_RESULTS", 200),
+		"MAX_TERMS": conf.get("MAX_TERMS", 10),
+		"MAX_OWNERS": conf.get("MAX_OWNERS", 1000),
+	}
+
+
+# field -> weight of a document's owner_text index, shared by both backends
+def text_weights(document):
+	return next(spec["weights"] for spec in document._meta["index_specs"] if spec.get("name") == "owner_text")
+
+
+# lowercased words without stop words, in order (repeats kept: they are the term frequencies)
+def tokenize(text):
+	return [term for term in TERM.findall(text.lower()) if term not in STOP_WORDS]
+
+
+# the distinct terms of a query, at most MAX_TERMS of them
+def query_terms(query):
+	return list(dict.fromkeys(tokenize(query)))[:config()["MAX_TERMS"]]
+
+
+# ties go to the newer row (ObjectIds grow with their creation time)
+def rank_key(hit):
+	return hit[0], hit[2]["_id"]
+
+
+# postings and rows of one owner's live projects and their tasks
+class OwnerIndex:
+	def __init__(self, version):
+		self.version = version
+		self.postings = defaultdict(dict)  # term -> {(kind, _id): weighted term frequency}
+		self.rows = {}  # (kind, _id) -> serializer row
+
+	def add(self, kind, row, weights):
+		key = (kind, row["_id"])
+		self.rows[key] = row
+		for field, weight in weights.items():
+			for term in tokenize(row.get(field) or ""):
+				self.postings[term][key] = self.postings[term].get(key, 0) + weight
+
+	# tf-idf over the postings of the query terms only, the best `window` hits as (score, kind, row)
+	def search(self, terms, kinds, window):
+		scores = defaultdict(float)
+		for term in terms:
+			postings = self.postings.get(term)
+			if not postings:
+				continue
+			idf = math.log(1 + len(self.rows) / len(postings))
+			for key, weight in postings.items():
+				if key[0] in kinds:
+					scores[key] += weight * idf
+		hits = [(score, kind, self.rows[(kind, row_id)]) for (kind, row_id), score in scores.items()]
+		return heapq.nlargest(window, hits, key=rank_key)
+
+
+# one OwnerIndex per owner, bounded LRU of MAX_OWNERS (an evicted owner is rebuilt on their next search)
+class InvertedIndex:
+	def __init__(self):
+		self._lock = threading.Lock()
+		self.clear()
+
+	def clear(self):
+		with self._lock:
+			self._owners = OrderedDict()
+			self.builds = 0
+			self.hits = 0
+
+	# `version` is the owner's list version read before this call, so an index never claims newer data than it has
+	def owner_index(self, owner_id, version):
+		with self._lock:
+			index = self._owners.get(owner_id)
+			if index is not None and index.version == version:
+				self._owners.move_to_end(owner_id)
+				self.hits += 1
+				return index
+		index = self.build(owner_id, version)
+		with self._lock:
+			self._owners[owner_id] = index
+			self._owners.move_to_end(owner_id)
+			while len(self._owners) > config()["MAX_OWNERS"]:
+				self._owners.popitem(last=False)
+			self.builds += 1
+		return index
+
+	# two reads: the owner's live projects, then the tasks under them
+	@staticmethod
+	def build(owner_id, version):
+		index = OwnerIndex(version)
+		projects = read_routing.route_read(Project._get_collection()).find(
+			{"owner": owner_id, "deleted_at": None}, ProjectListSerializer.projection())
+		weights = text_weights(Project)
+		for row in projects:
+			index.add("project", row, weights)
+		project_ids = [row_id for kind, row_id in index.rows]
+		tasks = read_routing.route_read(Task._get_collection()).find(
+			{"owner": owner_id, "project": {"$in": project_ids}}, TaskListSerializer.projection())
+		weights = text_weights(Task)
+		for row in tasks:
+			index.add("task", row, weights)
+		return index
+
+	def __len__(self):
+		return len(self._owners)
+
+
+inverted_index = InvertedIndex()
+
+
+# the best `window` hits of each kind from the owner_text indexes; tasks of a deleted project (still waiting for
+# the purge) are dropped with one _id lookup over their projects
+def text_search(owner_id, terms, kinds, window):
+	hits = []
+	for kind in kinds:
+		document, serializer = KINDS[kind]
+		match = {"owner": owner_id, "$text": {"$search": " ".join(terms)}}
+		if kind == "project":
+			match["deleted_at"] = None
+		projection = dict(serializer.projection(), score={"$meta": "textScore"})
+		cursor = read_routing.route_read(document._get_collection()).find(match, projection)
+		cursor = cursor.sort([("score", {"$meta": "textScore"}), ("_id", -1)]).limit(window)
+		hits += [(row.pop("score"), kind, row) for row in cursor]
+	task_projects = {row["project"] for _, kind, row in hits if kind == "task"}
+	if task_projects:
+		live = {row["_id"] for row in read_routing.route_read(Project._get_collection()).find(
+			{"_id": {"$in": list(task_projects)}, "deleted_at": None}, {"_id": 1})}
+		hits = [hit for hit in hits if hit[1] != "task" or hit[2]["project"] in live]
+	return hits
+
+
+# "auto" uses $text against a real server and the inverted index on mongomock
+def backend():
+	name = config()["BACKEND"]
+	if name == "auto":
+		return "text" if db.CONNECTION_STRING else "inverted"
+	return name
+
+
+# the best `window` hits for the owner as (score, kind, row), best first; `version` is the owner's list version
+def search(owner_id, version, terms, kinds, window):
+	if not terms:
+		return []
+	hits = None
+	if backend() == "text":
+		try:
+			hits = text_search(owner_id, terms, kinds, window)
+		except OperationFailure as exc:
+			# the owner_text index is not built (yet, see sync_indexes --create): fall back to the inverted index
+			if exc.code != IndexNotFound:
+				raise
+	if hits is None:
+		hits = inverted_index.owner_index(owner_id, version).search(terms, kinds, window)
+	return heapq.nlargest(window, hits, key=rank_key)
+
+
+# a hit as it appears in the response: its type, its score and the same fields as the list views
+def to_result(hit):
+	score, kind, row = hit
+	return {"type": kind, "score": round(score, 4), kind: KINDS[kind][1]([row]).data[0]}
@@ -1,3 +1,7 @@
+from datetime import datetime
+
+from bson import DBRef, ObjectId
+from rest_framework import serializers
 from rest_framework_mongoengine.serializers import DocumentSerializer
 from project_handler.models import Project, Task
 from rest_framework.exceptions import ValidationError
@@ -24,8 +28,57 @@ class TaskSerializer(DocumentSerializer):
 			raise ValidationError(f"Invalid status. Choose from {allowed}")
 		return value
 
+# read-only fast path for list responses: works on raw rows from .only(...).as_pymongo() instead of Documents,
+# so a page skips Document construction, per-row field introspection and any ReferenceField dereference.
+# The output matches serializer_class (same fields, ids/references as strings, DRF datetime format).
+class ProjectionListSerializer:
+	serializer_class = None
+	datetime_field = serializers.DateTimeField()
+
+	def __init__(self, rows):
+		self.rows = rows
+
+	@classmethod
+	def fields(cls):
+		return cls.serializer_class.Meta.fields
+
+	# narrows a queryset to the serialized fields and switches it to raw dict rows
+	@classmethod
+	def projected(cls, queryset):
+		return queryset.only(*cls.fields()).as_pymongo()
+
+	# the same narrowing as a pymongo projection, for raw collection reads
+	@classmethod
+	def projection(cls):
+		return {"_id" if name == "id" else name: 1 for name in cls.fields()}
+
+	def to_value(self, value):
+		if isinstance(value, ObjectId):
+			return str(value)
+		if isinstance(value, DBRef):
+			return str(value.id)
+		if isinstance(value, datetime):
+			return self.datetime_field.to_representation(value)
+		return value
+
+	def to_representation(self, row):
+		return {name: self.to_value(row.get("_id" if name == "id" else name)) for name in self.fields()}
+
+	@property
+	def data(self):
+		return [self.to_representation(row) for row in self.rows]
+
+
+class ProjectListSerializer(ProjectionListSerializer):
+	serializer_class = ProjectSerializer
+
+
+class TaskListSerializer(ProjectionListSerializer):
+	serializer_class = TaskSerializer
+
 # Notes:
-# - ProjectSerializer is used for both list and detail responses.
+# - ProjectSerializer/TaskSerializer handle detail responses and every write; the list views use
+#   ProjectListSerializer/TaskListSerializer (benchmarks/list_serializers.py measures the difference).
 # - TaskSerializer validates the status field against allowed choices.
 # - owner and project fields are read-only so they can only be set in the view logic,
 #   preventing users from assigning projects/tasks to other users.
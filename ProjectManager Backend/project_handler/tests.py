@@ -1,11 +1,38 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from io import StringIO
+from unittest import mock
+
+from bson import ObjectId
+from pymongo import ReadPreference
+from pymongo.errors import OperationFailure
+
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.test import override_settings
 from rest_framework.test import APITestCase
 from django.urls import reverse
 from auth_handler.models import User
-from project_handler.models import Project, Task
+from auth_handler import throttling
+from project_handler.models import Project, Task, TaskEvent, ProjectListVersion
+from project_handler.serializers import ProjectSerializer, TaskSerializer
+from project_handler import counters, events, search, versions
+from project_handler.cache import project_cache
+from project_handler.management.commands import sync_indexes
+from ProjectManagerCore import db, read_routing, settings_api
+from ProjectManagerCore.read_routing import route_read
 
 
+# purges run inline so nothing is still writing to mongo when tearDown drops the collections
+@override_settings(BACKGROUND_TASKS={'EAGER': True, 'MAX_WORKERS': 1})
 class ProjectTests(APITestCase):
 	def setUp(self):
+		throttling.reset()
 		# create a test user and get JWT tokens
 		url = reverse('auth-register')
 		data = {
@@ -19,6 +46,13 @@ class ProjectTests(APITestCase):
 		self.token = resp.data['access']
 		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token)
 
+	def tearDown(self):
+		# mongo data is not rolled back with the test transaction, so drop it explicitly
+		User.drop_collection()
+		Project.drop_collection()
+		Task.drop_collection()
+		ProjectListVersion.drop_collection()
+
 	def test_create_project(self):
 		url = reverse('project-list-create')
 		data = {'name': 'My Project', 'description': 'A test project'}
@@ -36,6 +70,109 @@ class ProjectTests(APITestCase):
 		self.assertEqual(resp.status_code, 200)
 		self.assertIn('results', resp.data)
 		self.assertEqual(len(resp.data['results']), 1)
+		self.assertIsNone(resp.data['next'])
+		self.assertIsNone(resp.data['prev'])
+
+	def test_list_projects_cursor_pagination(self):
+		url = reverse('project-list-create')
+		for i in range(5):
+			self.client.post(url, {'name': f'Project {i}'}, format='json')
+		# walk forward two at a time
+		names = []
+		resp = self.client.get(url, {'limit': 2}, format='json')
+		pages = 0
+		while True:
+			self.assertEqual(resp.status_code, 200)
+			pages += 1
+			names.extend(p['name'] for p in resp.data['results'])
+			if not resp.data['next']:
+				break
+			resp = self.client.get(url, {'limit': 2, 'cursor': resp.data['next']}, format='json')
+		self.assertEqual(pages, 3)
+		self.assertEqual(names, [f'Project {i}' for i in range(5)])
+		# and back again from the last page
+		resp = self.client.get(url, {'limit': 2, 'cursor': resp.data['prev']}, format='json')
+		self.assertEqual([p['name'] for p in resp.data['results']], ['Project 2', 'Project 3'])
+
+	def test_list_projects_matches_document_serializer(self):
+		url = reverse('project-list-create')
+		self.client.post(url, {'name': 'With description', 'description': 'text'}, format='json')
+		self.client.post(url, {'name': 'Without description'}, format='json')
+		resp = self.client.get(url, format='json')
+		projects = Project.objects.order_by('created_at', 'id')
+		self.assertEqual(resp.json()['results'], ProjectSerializer(projects, many=True).data)
+
+	def test_list_projects_conditional_get(self):
+		url = reverse('project-list-create')
+		project_id = self.client.post(url, {'name': 'Polled'}, format='json').data['project']['id']
+		resp = self.client.get(url)
+		etag = resp['ETag']
+		self.assertEqual(resp['Cache-Control'], 'private, no-cache')
+		# an unchanged poll is answered from the owner's version stamp alone
+		with mock.patch.object(Project, '_get_collection', side_effect=AssertionError('projects were read')):
+			resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(resp.status_code, 304)
+		self.assertEqual(resp.content, b'')
+		self.assertEqual(resp['ETag'], etag)
+		# other pages / includes have their own tags
+		self.assertEqual(self.client.get(url, {'include': 'task_stats'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+		# a task write changes the list too (task_stats)
+		self.client.post(reverse('task-list-create', args=[project_id]), {'title': 'New'}, format='json')
+		resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(resp.status_code, 200)
+		self.assertNotEqual(resp['ETag'], etag)
+
+	def test_project_detail_conditional_get(self):
+		project_id = self.client.post(reverse('project-list-create'), {'name': 'Polled'}, format='json').data['project']['id']
+		url = reverse('project-detail', args=[project_id])
+		etag = self.client.get(url)['ETag']
+		self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+		self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"other", W/' + etag).status_code, 304)
+		self.client.patch(url, {'name': 'Renamed'}, format='json')
+		resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp.data['name'], 'Renamed')
+		self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=resp['ETag']).status_code, 304)
+		# the tag of someone else's project never turns a 403 into a 304
+		other = self.client.post(reverse('auth-register'), {
+			'username': 'pollother', 'email': 'pollother@example.com',
+			'password': 'securepass', 'password_confirm': 'securepass'
+		}, format='json').data['access']
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + other)
+		self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='*').status_code, 403)
+
+	def test_list_projects_with_task_stats(self):
+		url = reverse('project-list-create')
+		busy = self.client.post(url, {'name': 'Busy'}, format='json').data['project']['id']
+		empty = self.client.post(url, {'name': 'Empty'}, format='json').data['project']['id']
+		self.client.post(url, {'name': 'Next page'}, format='json')
+		tasks_url = reverse('task-list-create', args=[busy])
+		self.client.post(tasks_url, {'title': 'One'}, format='json')
+		task_id = self.client.post(tasks_url, {'title': 'Two'}, format='json').data['task']['id']
+		self.client.patch(reverse('task-detail', args=[task_id]), {'status': 'Done'}, format='json')
+		patched = Task.objects.get(id=task_id)
+		with mock.patch('project_handler.counters.task_stats', wraps=counters.task_stats) as task_stats:
+			resp = self.client.get(url, {'include': 'task_stats', 'limit': 2}, format='json')
+		self.assertEqual(resp.status_code, 200)
+		# one aggregation, over the projects of this page only
+		task_stats.assert_called_once()
+		self.assertEqual({str(i) for i in task_stats.call_args.args[0]}, {busy, empty})
+		stats = {p['id']: p['task_stats'] for p in resp.data['results']}
+		self.assertEqual(stats[busy]['counts'], {'Todo': 1, 'In Progress': 0, 'Done': 1})
+		self.assertEqual(stats[busy]['total'], 2)
+		self.assertEqual(stats[busy]['last_activity_at'], ProjectSerializer().fields['created_at'].to_representation(patched.updated_at))
+		self.assertEqual(stats[empty]['total'], 0)
+		self.assertEqual(stats[empty]['last_activity_at'], resp.data['results'][1]['created_at'])
+		# without the include the shape is unchanged
+		self.assertNotIn('task_stats', self.client.get(url, format='json').data['results'][0])
+		self.assertEqual(self.client.get(url, {'include': 'everything'}, format='json').status_code, 400)
+
+	def test_list_projects_invalid_cursor(self):
+		url = reverse('project-list-create')
+		resp = self.client.get(url, {'cursor': 'not-a-cursor'}, format='json')
+		self.assertEqual(resp.status_code, 400)
+		resp = self.client.get(url, {'limit': 0}, format='json')
+		self.assertEqual(resp.status_code, 400)
 
 	def test_update_project(self):
 		# create
@@ -48,6 +185,35 @@ class ProjectTests(APITestCase):
 		self.assertEqual(resp2.status_code, 200)
 		self.assertEqual(resp2.data['name'], 'New Name')
 
+	def test_patch_project(self):
+		url = reverse('project-list-create')
+		project_id = self.client.post(url, {'name': 'Old Name', 'description': 'keep'}, format='json').data['project']['id']
+		detail_url = reverse('project-detail', args=[project_id])
+		# default answer is 204 with no read-back
+		resp = self.client.patch(detail_url, {'name': 'Patched'}, format='json')
+		self.assertEqual(resp.status_code, 204)
+		project = Project.objects.get(id=project_id)
+		self.assertEqual(project.name, 'Patched')
+		self.assertEqual(project.description, 'keep')
+		# read-back on request, read-only fields are ignored
+		resp = self.client.patch(detail_url, {'description': 'new', 'owner': '0' * 24}, format='json',
+			HTTP_PREFER='return=representation')
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp['Preference-Applied'], 'return=representation')
+		self.assertEqual(resp.data['description'], 'new')
+		self.assertEqual(resp.data['owner'], str(project.owner.id))
+
+	def test_patch_project_validation_and_not_found(self):
+		url = reverse('project-list-create')
+		project_id = self.client.post(url, {'name': 'Name'}, format='json').data['project']['id']
+		detail_url = reverse('project-detail', args=[project_id])
+		self.assertEqual(self.client.patch(detail_url, {'name': ''}, format='json').status_code, 400)
+		self.assertEqual(self.client.patch(detail_url, {}, format='json').status_code, 400)
+		missing_url = reverse('project-detail', args=['0' * 24])
+		self.assertEqual(self.client.patch(missing_url, {'name': 'x'}, format='json').status_code, 404)
+		bad_url = reverse('project-detail', args=['not-an-id'])
+		self.assertEqual(self.client.patch(bad_url, {'name': 'x'}, format='json').status_code, 404)
+
 	def test_delete_project(self):
 		# create
 		url = reverse('project-list-create')
@@ -58,9 +224,62 @@ class ProjectTests(APITestCase):
 		resp2 = self.client.delete(detail_url, format='json')
 		self.assertEqual(resp2.status_code, 204)
 
+	def test_delete_project_cascades_to_tasks(self):
+		url = reverse('project-list-create')
+		project_id = self.client.post(url, {'name': 'Parent'}, format='json').data['project']['id']
+		other_id = self.client.post(url, {'name': 'Sibling'}, format='json').data['project']['id']
+		tasks_url = reverse('task-list-create', args=[project_id])
+		for i in range(5):
+			self.client.post(tasks_url, {'title': f'Child {i}'}, format='json')
+		self.client.post(reverse('task-list-create', args=[other_id]), {'title': 'Unrelated'}, format='json')
+
+		with self.settings(PROJECT_PURGE_BATCH_SIZE=2):
+			resp = self.client.delete(reverse('project-detail', args=[project_id]))
+		self.assertEqual(resp.status_code, 204)
+		self.assertEqual(Task.objects.filter(project=project_id).count(), 0)
+		self.assertIsNone(Project.objects.filter(id=project_id).first())
+		self.assertEqual(Task.objects.filter(project=other_id).count(), 1)
+		self.assertEqual(self.client.delete(reverse('project-detail', args=[project_id])).status_code, 404)
+
+	@override_settings(BACKGROUND_TASKS={'EAGER': False, 'MAX_WORKERS': 1})
+	def test_deleted_project_is_hidden_before_purge_finishes(self):
+		url = reverse('project-list-create')
+		project_id = self.client.post(url, {'name': 'Going'}, format='json').data['project']['id']
+		with mock.patch('project_handler.views.background.submit') as submit:
+			resp = self.client.delete(reverse('project-detail', args=[project_id]))
+		self.assertEqual(resp.status_code, 204)
+		submit.assert_called_once()
+		# marked only: the document is still there but no read returns it
+		self.assertIsNotNone(Project.objects.get(id=project_id).deleted_at)
+		self.assertEqual(len(self.client.get(url).data['results']), 0)
+		self.assertEqual(self.client.get(reverse('project-detail', args=[project_id])).status_code, 404)
+		self.assertEqual(self.client.get(reverse('task-list-create', args=[project_id])).status_code, 404)
+
+	def test_purge_orphan_tasks_command(self):
+		url = reverse('project-list-create')
+		live_id = self.client.post(url, {'name': 'Live'}, format='json').data['project']['id']
+		gone_id = self.client.post(url, {'name': 'Gone'}, format='json').data['project']['id']
+		half_id = self.client.post(url, {'name': 'Half purged'}, format='json').data['project']['id']
+		for project_id in (live_id, gone_id, half_id):
+			self.client.post(reverse('task-list-create', args=[project_id]), {'title': 'Task'}, format='json')
+		# old-style delete that left tasks behind, and a purge that never ran
+		Project.objects.filter(id=gone_id).delete()
+		Project.objects.filter(id=half_id).update_one(set__deleted_at=datetime.utcnow())
+
+		out = StringIO()
+		call_command('purge_orphan_tasks', '--dry-run', stdout=out)
+		self.assertIn('would remove orphaned tasks of 1 missing project(s) (1 task(s)), 1 deleted project(s)', out.getvalue())
+		self.assertEqual(Task.objects.count(), 3)
+
+		call_command('purge_orphan_tasks', stdout=StringIO())
+		self.assertEqual(Task.objects.count(), 1)
+		self.assertEqual(Task.objects.filter(project=live_id).count(), 1)
+		self.assertIsNone(Project.objects.filter(id=half_id).first())
+
 
 class TaskTests(APITestCase):
 	def setUp(self):
+		throttling.reset()
 		# create a test user and get JWT tokens
 		url = reverse('auth-register')
 		data = {
@@ -79,6 +298,12 @@ class TaskTests(APITestCase):
 		proj_resp = self.client.post(proj_url, {'name': 'Task Project'}, format='json')
 		self.project_id = proj_resp.data['project']['id']
 
+	def tearDown(self):
+		User.drop_collection()
+		Project.drop_collection()
+		Task.drop_collection()
+		ProjectListVersion.drop_collection()
+
 	def test_create_task(self):
 		url = reverse('task-list-create', args=[self.project_id])
 		data = {'title': 'My Task', 'description': 'A test task'}
@@ -98,6 +323,39 @@ class TaskTests(APITestCase):
 		self.assertIn('results', resp.data)
 		self.assertEqual(len(resp.data['results']), 1)
 
+	def test_list_tasks_matches_document_serializer(self):
+		url = reverse('task-list-create', args=[self.project_id])
+		self.client.post(url, {'title': 'Task 1', 'description': 'text'}, format='json')
+		self.client.post(url, {'title': 'Task 2', 'status': 'Done'}, format='json')
+		resp = self.client.get(url, format='json')
+		tasks = Task.objects.order_by('created_at', 'id')
+		self.assertEqual(resp.json()['results'], TaskSerializer(tasks, many=True).data)
+
+	def test_list_tasks_conditional_get(self):
+		url = reverse('task-list-create', args=[self.project_id])
+		task_id = self.client.post(url, {'title': 'Task 1'}, format='json').data['task']['id']
+		etag = self.client.get(url)['ETag']
+		# 304 without reading a single task
+		with mock.patch.object(Task, '_get_collection', side_effect=AssertionError('tasks were read')):
+			self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+		self.assertEqual(self.client.get(url, {'status': 'Done'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+		# every task write moves the project's version on
+		detail = reverse('task-detail', args=[task_id])
+		writes = [
+			lambda: self.client.patch(detail, {'status': 'Done'}, format='json'),
+			lambda: self.client.patch(detail, {'title': 'Renamed'}, format='json'),
+			lambda: self.client.put(detail, {'description': 'text'}, format='json'),
+			lambda: self.client.post(reverse('task-batch', args=[self.project_id]),
+				{'operations': [{'op': 'create', 'data': {'title': 'Batched'}}]}, format='json'),
+			lambda: self.client.delete(detail),
+		]
+		for write in writes:
+			self.assertLess(write().status_code, 300)
+			resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+			self.assertEqual(resp.status_code, 200)
+			etag = resp['ETag']
+		self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
 	def test_filter_tasks_by_status(self):
 		url = reverse('task-list-create', args=[self.project_id])
 		self.client.post(url, {'title': 'Todo Task', 'status': 'Todo'}, format='json')
@@ -108,6 +366,27 @@ class TaskTests(APITestCase):
 		self.assertEqual(len(resp.data['results']), 1)
 		self.assertEqual(resp.data['results'][0]['title'], 'Done Task')
 
+	def test_list_tasks_pagination_with_same_created_at(self):
+		# rows sharing a created_at are still split deterministically by id
+		project = Project.objects.get(id=self.project_id)
+		stamp = datetime(2024, 1, 1)
+		for i in range(7):
+			Task(title=f'Task {i}', project=project, created_at=stamp).save()
+		url = reverse('task-list-create', args=[self.project_id])
+		titles = []
+		cursor = None
+		while True:
+			params = {'limit': 3}
+			if cursor:
+				params['cursor'] = cursor
+			resp = self.client.get(url, params, format='json')
+			self.assertEqual(resp.status_code, 200)
+			titles.extend(t['title'] for t in resp.data['results'])
+			cursor = resp.data['next']
+			if not cursor:
+				break
+		self.assertEqual(titles, [f'Task {i}' for i in range(7)])
+
 	def test_update_task(self):
 		# create
 		url = reverse('task-list-create', args=[self.project_id])
@@ -129,3 +408,1014 @@ class TaskTests(APITestCase):
 		detail_url = reverse('task-detail', args=[task_id])
 		resp2 = self.client.delete(detail_url, format='json')
 		self.assertEqual(resp2.status_code, 204)
+
+	def test_task_owner_is_stored_on_create(self):
+		url = reverse('task-list-create', args=[self.project_id])
+		resp = self.client.post(url, {'title': 'Owned'}, format='json')
+		task = Task.objects.get(id=resp.data['task']['id'])
+		self.assertEqual(str(task.owner.id), str(Project.objects.get(id=self.project_id).owner.id))
+		self.assertNotIn('owner', resp.data['task'])
+
+	def test_other_user_gets_forbidden_and_missing_task_not_found(self):
+		url = reverse('task-list-create', args=[self.project_id])
+		task_id = self.client.post(url, {'title': 'Mine'}, format='json').data['task']['id']
+		# second user
+		resp = self.client.post(reverse('auth-register'), {
+			'username': 'intruder',
+			'email': 'intruder@example.com',
+			'password': 'securepass',
+			'password_confirm': 'securepass'
+		}, format='json')
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + resp.data['access'])
+		detail_url = reverse('task-detail', args=[task_id])
+		self.assertEqual(self.client.put(detail_url, {'title': 'Hacked'}, format='json').status_code, 403)
+		self.assertEqual(self.client.delete(detail_url).status_code, 403)
+		self.assertTrue(Task.objects.filter(id=task_id, title='Mine').first())
+		missing_url = reverse('task-detail', args=['0' * 24])
+		self.assertEqual(self.client.delete(missing_url).status_code, 404)
+
+	def test_task_without_owner_is_still_reachable_by_project_owner(self):
+		project = Project.objects.get(id=self.project_id)
+		legacy = Task(title='Legacy', project=project).save()
+		detail_url = reverse('task-detail', args=[str(legacy.id)])
+		resp = self.client.put(detail_url, {'status': 'Done'}, format='json')
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp.data['status'], 'Done')
+		# the owner was filled in on the way
+		self.assertIsNotNone(Task.objects.get(id=legacy.id).owner)
+
+	def test_backfill_task_owner_command(self):
+		project = Project.objects.get(id=self.project_id)
+		for i in range(3):
+			Task(title=f'Legacy {i}', project=project).save()
+		out = StringIO()
+		call_command('backfill_task_owner', '--dry-run', stdout=out)
+		self.assertIn('would update 3 task(s) across 1 project(s)', out.getvalue())
+		self.assertEqual(Task.objects.filter(owner=None).count(), 3)
+		call_command('backfill_task_owner', stdout=StringIO())
+		self.assertEqual(Task.objects.filter(owner=None).count(), 0)
+		self.assertEqual(Task.objects.filter(owner=project.owner).count(), 3)
+
+	def test_patch_task_status(self):
+		url = reverse('task-list-create', args=[self.project_id])
+		task_id = self.client.post(url, {'title': 'Flip me'}, format='json').data['task']['id']
+		detail_url = reverse('task-detail', args=[task_id])
+		resp = self.client.patch(detail_url, {'status': 'In Progress'}, format='json')
+		self.assertEqual(resp.status_code, 204)
+		self.assertEqual(Task.objects.get(id=task_id).status, 'In Progress')
+		resp = self.client.patch(detail_url, {'status': 'Done'}, format='json', HTTP_PREFER='return=representation')
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp.data['status'], 'Done')
+		self.assertEqual(resp.data['title'], 'Flip me')
+		self.assertEqual(resp.data['project'], self.project_id)
+		self.assertEqual(self.client.patch(detail_url, {'status': 'Nope'}, format='json').status_code, 400)
+
+	def test_patch_task_forbidden_for_other_user(self):
+		url = reverse('task-list-create', args=[self.project_id])
+		task_id = self.client.post(url, {'title': 'Mine'}, format='json').data['task']['id']
+		resp = self.client.post(reverse('auth-register'), {
+			'username': 'patcher',
+			'email': 'patcher@example.com',
+			'password': 'securepass',
+			'password_confirm': 'securepass'
+		}, format='json')
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + resp.data['access'])
+		resp = self.client.patch(reverse('task-detail', args=[task_id]), {'status': 'Done'}, format='json')
+		self.assertEqual(resp.status_code, 403)
+		self.assertEqual(Task.objects.get(id=task_id).status, 'Todo')
+
+	def test_patch_task_without_owner(self):
+		legacy = Task(title='Legacy', project=Project.objects.get(id=self.project_id)).save()
+		resp = self.client.patch(reverse('task-detail', args=[str(legacy.id)]), {'status': 'Done'}, format='json')
+		self.assertEqual(resp.status_code, 204)
+		self.assertEqual(Task.objects.get(id=legacy.id).status, 'Done')
+
+	def test_task_summary_follows_every_write(self):
+		url = reverse('task-list-create', args=[self.project_id])
+		ids = [self.client.post(url, {'title': f'Task {i}'}, format='json').data['task']['id'] for i in range(3)]
+		self.client.post(url, {'title': 'Done already', 'status': 'Done'}, format='json')
+		self.client.patch(reverse('task-detail', args=[ids[0]]), {'status': 'In Progress'}, format='json')
+		self.client.put(reverse('task-detail', args=[ids[1]]), {'status': 'Done'}, format='json')
+		self.client.delete(reverse('task-detail', args=[ids[2]]))
+		self.client.post(reverse('task-batch', args=[self.project_id]), {'operations': [
+			{'op': 'create', 'data': {'title': 'Batch', 'status': 'In Progress'}},
+			{'op': 'update', 'id': ids[0], 'data': {'status': 'Todo'}},
+		]}, format='json')
+		resp = self.client.get(reverse('task-summary', args=[self.project_id]))
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp.data['counts'], {'Todo': 1, 'In Progress': 1, 'Done': 2})
+		self.assertEqual(resp.data['total'], 4)
+		self.assertEqual(counters.count_tasks(ObjectId(self.project_id)), Project.objects.get(id=self.project_id).task_counts)
+
+	def test_task_summary_falls_back_to_group_for_old_projects(self):
+		url = reverse('task-list-create', args=[self.project_id])
+		self.client.post(url, {'title': 'Task', 'status': 'Done'}, format='json')
+		Project._get_collection().update_one({'_id': ObjectId(self.project_id)}, {'$unset': {'task_counts': 1}})
+		# counters that do not exist are not half-created by later writes
+		self.client.post(url, {'title': 'Task 2'}, format='json')
+		self.assertNotIn('task_counts', Project._get_collection().find_one({'_id': ObjectId(self.project_id)}))
+		resp = self.client.get(reverse('task-summary', args=[self.project_id]))
+		self.assertEqual(resp.data['counts'], {'Todo': 1, 'In Progress': 0, 'Done': 1})
+		stored = Project._get_collection().find_one({'_id': ObjectId(self.project_id)})['task_counts']
+		self.assertEqual(stored, {'todo': 1, 'in_progress': 0, 'done': 1})
+		self.assertEqual(self.client.get(reverse('task-summary', args=[str(ObjectId())])).status_code, 404)
+
+	def test_status_flip_writes_counters_and_version_once(self):
+		url = reverse('task-list-create', args=[self.project_id])
+		task_id = self.client.post(url, {'title': 'Flip me'}, format='json').data['task']['id']
+		collection = Project._get_collection()
+		version = collection.find_one({'_id': ObjectId(self.project_id)})['version']
+		with mock.patch.object(collection, 'update_one', wraps=collection.update_one) as update_one:
+			self.client.patch(reverse('task-detail', args=[task_id]), {'status': 'Done'}, format='json')
+		update_one.assert_called_once()
+		stored = collection.find_one({'_id': ObjectId(self.project_id)})
+		self.assertEqual(stored['version'], version + 1)
+		self.assertEqual(stored['task_counts'], {'todo': 0, 'in_progress': 0, 'done': 1})
+		# a project without counters still changes version
+		collection.update_one({'_id': ObjectId(self.project_id)}, {'$unset': {'task_counts': 1}})
+		self.client.patch(reverse('task-detail', args=[task_id]), {'status': 'Todo'}, format='json')
+		stored = collection.find_one({'_id': ObjectId(self.project_id)})
+		self.assertEqual(stored['version'], version + 2)
+		self.assertNotIn('task_counts', stored)
+
+	def test_recount_task_counters_command(self):
+		self.client.post(reverse('task-list-create', args=[self.project_id]), {'title': 'Task'}, format='json')
+		Project._get_collection().update_one({'_id': ObjectId(self.project_id)}, {'$set': {'task_counts.todo': 7}})
+		out = StringIO()
+		call_command('recount_task_counters', '--dry-run', stdout=out)
+		self.assertIn('would fix counters of 1 of 1 project(s)', out.getvalue())
+		self.assertEqual(Project.objects.get(id=self.project_id).task_counts['todo'], 7)
+		call_command('recount_task_counters', stdout=StringIO())
+		self.assertEqual(Project.objects.get(id=self.project_id).task_counts, {'todo': 1, 'in_progress': 0, 'done': 0})
+
+
+class TaskBatchTests(APITestCase):
+	def setUp(self):
+		throttling.reset()
+		resp = self.client.post(reverse('auth-register'), {
+			'username': 'batchuser',
+			'email': 'batch@example.com',
+			'password': 'securepass',
+			'password_confirm': 'securepass'
+		}, format='json')
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + resp.data['access'])
+		proj_resp = self.client.post(reverse('project-list-create'), {'name': 'Batch Project'}, format='json')
+		self.project_id = proj_resp.data['project']['id']
+		self.url = reverse('task-batch', args=[self.project_id])
+
+	def tearDown(self):
+		User.drop_collection()
+		Project.drop_collection()
+		Task.drop_collection()
+
+	def test_mixed_batch(self):
+		tasks_url = reverse('task-list-create', args=[self.project_id])
+		keep = self.client.post(tasks_url, {'title': 'Keep'}, format='json').data['task']['id']
+		drop = self.client.post(tasks_url, {'title': 'Drop'}, format='json').data['task']['id']
+		resp = self.client.post(self.url, {'operations': [
+			{'op': 'create', 'data': {'title': 'New 1'}},
+			{'op': 'create', 'data': {'title': 'New 2', 'status': 'Done'}},
+			{'op': 'update', 'id': keep, 'data': {'status': 'In Progress'}},
+			{'op': 'delete', 'id': drop},
+		]}, format='json')
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp.data['summary']['created'], 2)
+		self.assertEqual(resp.data['summary']['updated'], 1)
+		self.assertEqual(resp.data['summary']['deleted'], 1)
+		created = Task.objects.get(id=resp.data['results'][0]['id'])
+		self.assertEqual(created.title, 'New 1')
+		self.assertIsNotNone(created.owner)
+		self.assertEqual(Task.objects.get(id=keep).status, 'In Progress')
+		self.assertIsNone(Task.objects.filter(id=drop).first())
+
+	def test_ordered_batch_with_invalid_items_applies_nothing(self):
+		resp = self.client.post(self.url, {'operations': [
+			{'op': 'create', 'data': {'title': 'Fine'}},
+			{'op': 'create', 'data': {}},
+			{'op': 'update', 'id': '0' * 24, 'data': {'title': 'x'}},
+			{'op': 'explode'},
+		]}, format='json')
+		self.assertEqual(resp.status_code, 400)
+		statuses = [r['status'] for r in resp.data['results']]
+		# every invalid item is reported, not only the first one
+		self.assertEqual(statuses, ['skipped', 'invalid', 'invalid', 'invalid'])
+		self.assertEqual(Task.objects.count(), 0)
+
+	def test_unordered_batch_applies_valid_items(self):
+		resp = self.client.post(self.url, {'ordered': False, 'operations': [
+			{'op': 'create', 'data': {'title': 'Fine'}},
+			{'op': 'create', 'data': {'title': 'Bad', 'status': 'Nope'}},
+		]}, format='json')
+		self.assertEqual(resp.status_code, 207)
+		self.assertEqual([r['status'] for r in resp.data['results']], ['created', 'invalid'])
+		self.assertEqual(Task.objects.count(), 1)
+
+	def test_one_operation_per_task(self):
+		task_id = self.client.post(reverse('task-list-create', args=[self.project_id]), {'title': 'Twice'}, format='json').data['task']['id']
+		for operations in (
+			[{'op': 'update', 'id': task_id, 'data': {'status': 'Done'}}, {'op': 'delete', 'id': task_id}],
+			[{'op': 'delete', 'id': task_id}, {'op': 'update', 'id': task_id, 'data': {'status': 'Done'}}],
+		):
+			resp = self.client.post(self.url, {'operations': operations}, format='json')
+			self.assertEqual(resp.status_code, 400)
+			self.assertEqual([r['status'] for r in resp.data['results']], ['skipped', 'invalid'])
+			self.assertIn('id', resp.data['results'][1]['errors'])
+			self.assertEqual(Task.objects.get(id=task_id).status, 'Todo')
+		# unordered: the first operation is applied, the second is reported, the counters follow the one write
+		resp = self.client.post(self.url, {'ordered': False, 'operations': [
+			{'op': 'delete', 'id': task_id}, {'op': 'update', 'id': task_id, 'data': {'status': 'Done'}},
+		]}, format='json')
+		self.assertEqual(resp.status_code, 207)
+		self.assertEqual([r['status'] for r in resp.data['results']], ['deleted', 'invalid'])
+		summary = self.client.get(reverse('task-summary', args=[self.project_id])).data
+		self.assertEqual((summary['counts'], summary['total']), ({'Todo': 0, 'In Progress': 0, 'Done': 0}, 0))
+
+	def test_tasks_deleted_during_the_batch_are_not_counted(self):
+		tasks_url = reverse('task-list-create', args=[self.project_id])
+		kept, gone, removed = (self.client.post(tasks_url, {'title': title}, format='json').data['task']['id'] for title in ('Kept', 'Gone', 'Removed'))
+		collection = Task._get_collection()
+		bulk_write = collection.bulk_write
+
+		# another request deletes two of the tasks between the existence query and the bulk write
+		def racing_bulk_write(*args, **kwargs):
+			collection.delete_many({'_id': {'$in': [ObjectId(gone), ObjectId(removed)]}})
+			return bulk_write(*args, **kwargs)
+
+		with mock.patch.object(collection, 'bulk_write', side_effect=racing_bulk_write):
+			resp = self.client.post(self.url, {'ordered': False, 'operations': [
+				{'op': 'update', 'id': kept, 'data': {'status': 'Done'}},
+				{'op': 'update', 'id': gone, 'data': {'status': 'Done'}},
+				{'op': 'delete', 'id': removed},
+			]}, format='json')
+		self.assertEqual([r['status'] for r in resp.data['results']], ['updated', 'failed', 'deleted'])
+		summary = self.client.get(reverse('task-summary', args=[self.project_id])).data
+		self.assertEqual((summary['counts'], summary['total']), ({'Todo': 0, 'In Progress': 0, 'Done': 1}, 1))
+
+	def test_batch_limits_and_ownership(self):
+		with self.settings(TASK_BATCH_MAX_OPERATIONS=2):
+			resp = self.client.post(self.url, {'operations': [{'op': 'delete', 'id': '0' * 24}] * 3}, format='json')
+			self.assertEqual(resp.status_code, 400)
+		self.assertEqual(self.client.post(self.url, {'operations': []}, format='json').status_code, 400)
+		# an id that is not an ObjectId is a 404, on the batch, export and import routes alike
+		for name in ('task-batch', 'task-export', 'task-import'):
+			url = reverse(name, args=['not-an-id'])
+			body = {'operations': [{'op': 'create', 'data': {'title': 'x'}}]}
+			resp = self.client.get(url) if name == 'task-export' else self.client.post(url, body, format='json')
+			self.assertEqual(resp.status_code, 404, name)
+		for ordered in ('false', 0, None):
+			resp = self.client.post(self.url, {'ordered': ordered, 'operations': [{'op': 'create', 'data': {'title': 'x'}}]}, format='json')
+			self.assertEqual(resp.status_code, 400, ordered)
+		self.assertEqual(Task.objects.count(), 0)
+		# tasks of another project cannot be touched through this one
+		other = self.client.post(reverse('project-list-create'), {'name': 'Other'}, format='json').data['project']['id']
+		other_task = self.client.post(reverse('task-list-create', args=[other]), {'title': 'Other task'}, format='json').data['task']['id']
+		resp = self.client.post(self.url, {'operations': [{'op': 'delete', 'id': other_task}]}, format='json')
+		self.assertEqual(resp.status_code, 400)
+		self.assertTrue(Task.objects.filter(id=other_task).first())
+
+
+class ProjectCacheTests(APITestCase):
+	def setUp(self):
+		throttling.reset()
+		project_cache.clear()
+		self.token = self.register('cacheowner')
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token)
+		self.project_id = self.client.post(reverse('project-list-create'), {'name': 'Cached'}, format='json').data['project']['id']
+		tasks_url = reverse('task-list-create', args=[self.project_id])
+		self.task_id = self.client.post(tasks_url, {'title': 'Cached task'}, format='json').data['task']['id']
+		self.project_url = reverse('project-detail', args=[self.project_id])
+		self.task_url = reverse('task-detail', args=[self.task_id])
+
+	def tearDown(self):
+		User.drop_collection()
+		Project.drop_collection()
+		Task.drop_collection()
+		ProjectListVersion.drop_collection()
+		project_cache.clear()
+
+	def register(self, username):
+		return self.client.post(reverse('auth-register'), {
+			'username': username,
+			'email': f'{username}@example.com',
+			'password': 'securepass',
+			'password_confirm': 'securepass'
+		}, format='json').data['access']
+
+	def test_reads_are_served_from_the_cache(self):
+		project = self.client.get(self.project_url)
+		self.assertEqual(project.data, ProjectSerializer(Project.objects.get(id=self.project_id)).data)
+		# a miss reads the task once and stores it unverified, the next GET refills it at the project version
+		expected = TaskSerializer(Task.objects.get(id=self.task_id)).data
+		with mock.patch('project_handler.cache.TaskSerializer', wraps=TaskSerializer) as task_reads:
+			self.assertEqual(self.client.get(self.task_url).data, expected)
+		self.assertEqual(task_reads.call_count, 1)
+		self.client.get(self.task_url)
+		# only the narrow owner + version read goes to Mongo, no task is read and nothing is refilled
+		with mock.patch('project_handler.versions.project_state', wraps=versions.project_state) as project_state, \
+				mock.patch('project_handler.cache.read_routing.primary_reads', side_effect=AssertionError('refilled')), \
+				mock.patch.object(Task, '_get_collection', side_effect=AssertionError('tasks were read')):
+			self.assertEqual(self.client.get(self.project_url).data, project.data)
+			self.assertEqual(self.client.get(self.project_url, HTTP_IF_NONE_MATCH=project['ETag']).status_code, 304)
+			self.assertEqual(self.client.get(self.task_url).data['title'], 'Cached task')
+		self.assertEqual(project_state.call_count, 3)
+		stats = self.client.get(reverse('project-cache-stats')).data
+		self.assertEqual(stats['backend'], 'LocMemCache')
+		self.assertEqual(stats['project']['misses'], 1)
+		self.assertEqual(stats['project']['hits'], 1)
+		# unverified fill + refill; the refilling GET looks the entry up twice (any version, then its own)
+		self.assertEqual(stats['task']['sets'], 2)
+		self.assertEqual(stats['task']['hits'], 3)
+
+	def test_writes_of_another_worker_are_never_served(self):
+		project = self.client.get(self.project_url)
+		self.client.get(self.task_url)
+		# another process writes and bumps the version; its invalidation never reaches this process' LocMem entries
+		Task._get_collection().update_one({'_id': ObjectId(self.task_id)}, {'$set': {'title': 'Elsewhere'}})
+		Project._get_collection().update_one({'_id': ObjectId(self.project_id)}, {'$set': {'name': 'Elsewhere'}, '$inc': {'version': 1}})
+		self.assertEqual(self.client.get(self.project_url, HTTP_IF_NONE_MATCH=project['ETag']).data['name'], 'Elsewhere')
+		self.assertEqual(self.client.get(self.task_url).data['title'], 'Elsewhere')
+		tasks_url = reverse('task-list-create', args=[self.project_id])
+		self.assertEqual(self.client.get(tasks_url, HTTP_IF_NONE_MATCH=project['ETag']).status_code, 200)
+		# a project deleted elsewhere is gone at once, not after the TTL
+		Project._get_collection().update_one({'_id': ObjectId(self.project_id)}, {'$set': {'deleted_at': datetime.utcnow()}})
+		self.assertEqual(self.client.get(self.project_url).status_code, 404)
+		self.assertEqual(self.client.get(self.task_url).status_code, 404)
+
+	def test_every_write_invalidates(self):
+		batch_url = reverse('task-batch', args=[self.project_id])
+		writes = [
+			(self.project_url, lambda: self.client.patch(self.project_url, {'name': 'Patched'}, format='json'), 'name', 'Patched'),
+			(self.project_url, lambda: self.client.put(self.project_url, {'name': 'Put'}, format='json'), 'name', 'Put'),
+			(self.task_url, lambda: self.client.patch(self.task_url, {'status': 'Done'}, format='json'), 'status', 'Done'),
+			(self.task_url, lambda: self.client.put(self.task_url, {'title': 'Put'}, format='json'), 'title', 'Put'),
+			(self.task_url, lambda: self.client.post(batch_url, {'operations': [
+				{'op': 'update', 'id': self.task_id, 'data': {'title': 'Batched'}}]}, format='json'), 'title', 'Batched'),
+		]
+		for url, write, field, value in writes:
+			self.client.get(url)
+			self.assertLess(write().status_code, 300)
+			self.assertEqual(self.client.get(url).data[field], value)
+		self.client.delete(self.task_url)
+		self.assertEqual(self.client.get(self.task_url).status_code, 404)
+		self.assertGreaterEqual(project_cache.stats()['task']['invalidations'], 4)
+
+	def test_deleted_project_is_not_served(self):
+		self.client.get(self.project_url)
+		self.client.get(self.task_url)
+		with mock.patch('project_handler.views.background.submit'):
+			self.assertEqual(self.client.delete(self.project_url).status_code, 204)
+		self.assertEqual(self.client.get(self.project_url).status_code, 404)
+		# the cached task is only served through its project's entry, which is gone
+		self.assertEqual(self.client.get(self.task_url).status_code, 404)
+		self.assertEqual(self.client.get(reverse('task-list-create', args=[self.project_id])).status_code, 404)
+
+	def test_cached_ownership_never_grants_access(self):
+		self.client.get(self.project_url)
+		self.client.get(self.task_url)
+		# another user gets 403 from the cached entries
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.register('cacheother'))
+		self.assertEqual(self.client.get(self.project_url).status_code, 403)
+		self.assertEqual(self.client.get(self.task_url).status_code, 403)
+		# and writes check Mongo, never the cache: a project deleted behind the cache's back is gone for them
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token)
+		Project.objects.filter(id=self.project_id).update_one(set__deleted_at=datetime.utcnow())
+		tasks_url = reverse('task-list-create', args=[self.project_id])
+		self.assertEqual(self.client.post(tasks_url, {'title': 'Late'}, format='json').status_code, 404)
+		self.assertEqual(self.client.put(self.project_url, {'name': 'Late'}, format='json').status_code, 404)
+
+	@override_settings(PROJECT_CACHE={'ENABLED': False})
+	def test_disabled_cache_always_reads_mongo(self):
+		for _ in range(2):
+			self.assertEqual(self.client.get(self.project_url).status_code, 200)
+		stats = project_cache.stats()
+		self.assertFalse(stats['enabled'])
+		self.assertEqual(stats['project']['hits'] + stats['project']['misses'] + stats['project']['sets'], 0)
+
+	def test_file_based_backend(self):
+		with tempfile.TemporaryDirectory() as location:
+			caches = {'projects': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}
+			with override_settings(CACHES=caches, PROJECT_CACHE={'ENABLED': True, 'ALIAS': 'projects', 'TTL_SECONDS': 30}):
+				self.client.get(self.project_url)
+				self.assertEqual(len(os.listdir(location)), 1)
+				self.client.patch(self.project_url, {'name': 'Renamed'}, format='json')
+				self.assertEqual(os.listdir(location), [])
+				self.assertEqual(self.client.get(self.project_url).data['name'], 'Renamed')
+				self.assertEqual(project_cache.stats()['backend'], 'FileBasedCache')
+
+
+class AsyncViewTests(APITestCase):
+	def setUp(self):
+		throttling.reset()
+		resp = self.client.post(reverse('auth-register'), {
+			'username': 'asyncuser',
+			'email': 'async@example.com',
+			'password': 'securepass',
+			'password_confirm': 'securepass'
+		}, format='json')
+		self.auth = {'Authorization': 'Bearer ' + resp.data['access']}
+		self.client.credentials(HTTP_AUTHORIZATION=self.auth['Authorization'])
+
+	def tearDown(self):
+		User.drop_collection()
+		Project.drop_collection()
+		Task.drop_collection()
+
+	# the sync and async routes of one request must answer with the same status, the same bytes and the same
+	# caching headers; a current ETag gets 304 from both
+	async def assertSameResponse(self, name, args=(), params=None, headers=None):
+		headers = self.auth if headers is None else headers
+		sync = await sync_to_async(self.client_class(headers=headers).get)(reverse(name, args=args), params)
+		resp = await self.async_client.get(reverse('async-' + name, args=args), params, headers=headers)
+		self.assertEqual((resp.status_code, resp.content), (sync.status_code, sync.content))
+		for header in ('ETag', 'Cache-Control'):
+			self.assertEqual(resp.headers.get(header), sync.headers.get(header))
+		if resp.status_code == 200:
+			revalidated = await self.async_client.get(reverse('async-' + name, args=args), params,
+				headers=dict(headers, **{'If-None-Match': sync['ETag']}))
+			self.assertEqual(revalidated.status_code, 304)
+		return resp
+
+	async def test_lists_and_detail_match_sync_views(self):
+		for i in range(3):
+			resp = await self.async_client.post(reverse('async-project-list-create'), {'name': f'Project {i}'},
+				content_type='application/json', headers=self.auth)
+			self.assertEqual(resp.status_code, 201)
+		project_id = resp.json()['project']['id']
+		tasks_url = reverse('async-task-list-create', args=[project_id])
+		for title, task_status in (('One', 'Todo'), ('Two', 'Done'), ('Three', 'Done')):
+			resp = await self.async_client.post(tasks_url, {'title': title, 'status': task_status},
+				content_type='application/json', headers=self.auth)
+			self.assertEqual(resp.status_code, 201)
+		self.assertEqual(resp.json()['task']['project'], project_id)
+		project = await sync_to_async(Project.objects.get)(id=project_id)
+		self.assertEqual(project.task_counts, {'todo': 1, 'in_progress': 0, 'done': 2})
+
+		first = await self.assertSameResponse('project-list-create', params={'limit': 2, 'include': 'task_stats'})
+		await self.assertSameResponse('project-list-create', params={'limit': 2, 'cursor': first.json()['next']})
+		await self.assertSameResponse('project-detail', args=[project_id])
+		await self.assertSameResponse('task-list-create', args=[project_id], params={'status': 'Done', 'limit': 1})
+
+	async def test_errors_match_sync_views(self):
+		await self.assertSameResponse('project-list-create', headers={})
+		await self.assertSameResponse('project-list-create', headers={'Authorization': 'Bearer nonsense'})
+		await self.assertSameResponse('project-detail', args=['0' * 24])
+		await self.assertSameResponse('task-list-create', args=['0' * 24])
+		resp = await self.async_client.post(reverse('async-project-list-create'), {}, content_type='application/json',
+			headers=self.auth)
+		self.assertEqual(resp.status_code, 400)
+		self.assertEqual(resp.json()['missing_fields'], ['name'])
+
+
+class SyncIndexesCommandTests(APITestCase):
+	def tearDown(self):
+		Task.drop_collection()
+
+	def test_diff_create_and_drop(self):
+		collection = Task._get_collection()
+		collection.drop_index('project_status_created_at')
+		collection.create_index([('title', 1)], name='title_1')
+
+		out = StringIO()
+		call_command('sync_indexes', '--alias', 'project_db', stdout=out)
+		self.assertIn('missing project_status_created_at', out.getvalue())
+		self.assertIn('not declared title_1', out.getvalue())
+		# a plain diff does not touch anything
+		self.assertIn('title_1', collection.index_information())
+
+		call_command('sync_indexes', '--alias', 'project_db', '--create', '--drop', stdout=StringIO())
+		indexes = collection.index_information()
+		self.assertIn('project_status_created_at', indexes)
+		self.assertNotIn('title_1', indexes)
+
+		out = StringIO()
+		call_command('sync_indexes', '--alias', 'project_db', stdout=out)
+		self.assertIn('project_db.tasks: in sync', out.getvalue())
+
+	def test_diff_does_not_build_indexes_in_a_fresh_process(self):
+		Task._get_collection().drop_index('project_status_created_at')
+		Task._collection = None  # as in a new process: the next _get_collection() would run ensure_indexes()
+		out = StringIO()
+		call_command('sync_indexes', '--alias', 'project_db', stdout=out)
+		self.assertIn('missing project_status_created_at', out.getvalue())
+		indexes = Task._get_db()[Task._get_collection_name()].index_information()
+		self.assertNotIn('project_status_created_at', indexes)
+
+	def test_text_index_matches_server_form(self):
+		# a server reports a text index as _fts/_ftsx keys, mongoengine declares the text fields
+		declared = [('owner', 1), ('title', 'text'), ('description', 'text')]
+		reported = [('owner', 1), ('_fts', 'text'), ('_ftsx', 1)]
+		self.assertEqual(sync_indexes.normalized_key(declared), sync_indexes.normalized_key(reported))
+
+
+class ConnectionManagerTests(APITestCase):
+	def test_client_options_from_env(self):
+		env = {'MONGO_MAX_POOL_SIZE': '50', 'MONGO_WAIT_QUEUE_TIMEOUT_MS': '250', 'MONGO_COMPRESSORS': 'zstd,zlib',
+			'MONGO_READ_PREFERENCE': 'secondaryPreferred'}
+		with mock.patch.dict(os.environ, env):
+			options = db.client_options()
+			self.assertEqual(db.read_preference(), ReadPreference.SECONDARY_PREFERRED)
+		self.assertEqual(options, {'maxPoolSize': 50, 'waitQueueTimeoutMS': 250, 'compressors': 'zstd,zlib',
+			'serverSelectionTimeoutMS': 5000, 'connectTimeoutMS': 5000})
+		with mock.patch.dict(os.environ, {'MONGO_READ_PREFERENCE': 'closest'}):
+			with self.assertRaises(ValueError):
+				db.read_preference()
+
+	def test_init_db_registers_once_and_again_after_fork(self):
+		with mock.patch.object(db, 'register_connection') as register, mock.patch.object(db, 'disconnect') as disconnect:
+			db.init_db()
+			register.assert_not_called()
+			with mock.patch.object(db, 'CONNECTION_STRING', 'mongodb://db.example:27017'):
+				db._reset_after_fork()
+		self.assertEqual(sorted(c.args[0] for c in disconnect.call_args_list), ['auth_db', 'project_db'])
+		self.assertEqual(sorted(c.args[0] for c in register.call_args_list), ['auth_db', 'project_db'])
+		self.assertFalse(register.call_args.kwargs['connect'])
+		self.assertNotIn('host', register.call_args.kwargs)
+		self.assertTrue(db._registered)
+
+	def test_srv_uri_is_not_resolved_before_first_use(self):
+		with mock.patch.object(db, 'CONNECTION_STRING', 'mongodb+srv://cluster0.does-not-exist.invalid/'):
+			client = db.uri_client(host='localhost', port=27017, connect=False, serverSelectionTimeoutMS=100)
+		client.close()
+
+
+class ApiProfileTests(APITestCase):
+	def setUp(self):
+		# every test registers/logs in from the same client IP, so start with full buckets
+		throttling.reset()
+
+	def tearDown(self):
+		User.drop_collection()
+		Project.drop_collection()
+
+	def test_api_profile_boots_without_sql_database(self):
+		env = dict(os.environ, CONNECTION_STRING='')
+		result = subprocess.run([sys.executable, 'manage.py', 'check', '--settings', 'ProjectManagerCore.settings_api'],
+			capture_output=True, text=True, env=env, cwd=settings_api.BASE_DIR)
+		self.assertEqual(result.returncode, 0, result.stderr)
+		self.assertEqual(settings_api.DATABASES, {})
+		self.assertNotIn('django.contrib.sessions', settings_api.INSTALLED_APPS)
+
+	# the API works through the lean middleware stack: no session/CSRF/auth middleware in the way
+	def test_api_flow_through_lean_middleware(self):
+		with override_settings(MIDDLEWARE=settings_api.MIDDLEWARE):
+			resp = self.client.post(reverse('auth-register'), {
+				'username': 'leanuser',
+				'email': 'lean@example.com',
+				'password': 'securepass',
+				'password_confirm': 'securepass'
+			}, format='json')
+			self.assertEqual(resp.status_code, 201)
+			self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + resp.data['access'])
+			url = reverse('project-list-create')
+			self.assertEqual(self.client.post(url, {'name': 'Lean'}, format='json').status_code, 201)
+			resp = self.client.get(url)
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp.data['results'][0]['name'], 'Lean')
+		self.assertNotIn('Set-Cookie', resp)
+		self.assertNotIn('X-Frame-Options', resp)
+
+
+@override_settings(MONGO_READ_ROUTING={'ENABLED': True, 'READ_PREFERENCE': 'secondaryPreferred'})
+class ReadRoutingTests(APITestCase):
+	def setUp(self):
+		throttling.reset()
+		resp = self.client.post(reverse('auth-register'), {
+			'username': 'routeduser',
+			'email': 'routed@example.com',
+			'password': 'securepass',
+			'password_confirm': 'securepass'
+		}, format='json')
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + resp.data['access'])
+		self.project_id = self.client.post(reverse('project-list-create'), {'name': 'Routed'}, format='json').data['project']['id']
+
+	def tearDown(self):
+		User.drop_collection()
+		Project.drop_collection()
+		Task.drop_collection()
+
+	# read preferences of everything route_read() handed out while making one request
+	def routed_preferences(self, method, url, data=None):
+		preferences = []
+		def spy(target):
+			routed = route_read(target)
+			preference = routed._read_preference if hasattr(routed, '_read_preference') else routed.read_preference
+			preferences.append(preference if preference and preference.mode else None)
+			return routed
+		with mock.patch.object(read_routing, 'route_read', side_effect=spy):
+			resp = getattr(self.client, method)(url, data, format='json')
+		self.assertLess(resp.status_code, 300)
+		return preferences
+
+	def test_route_read_only_inside_routed_requests(self):
+		queryset = Project.objects.all()
+		self.assertIs(read_routing.route_read(queryset), queryset)
+		with read_routing.routed_reads('secondaryPreferred'):
+			self.assertEqual(read_routing.route_read(queryset)._read_preference, ReadPreference.SECONDARY_PREFERRED)
+			collection = read_routing.route_read(Project._get_collection())
+			self.assertEqual(collection.read_preference, ReadPreference.SECONDARY_PREFERRED)
+			self.assertEqual(collection.find_one({'_id': ObjectId(self.project_id)})['name'], 'Routed')
+			with read_routing.primary_reads():
+				self.assertIs(read_routing.route_read(queryset), queryset)
+			with override_settings(MONGO_READ_ROUTING={'ENABLED': False}):
+				self.assertIs(read_routing.route_read(queryset), queryset)
+
+	def test_get_reads_use_secondaries_and_writes_the_primary(self):
+		url = reverse('project-list-create')
+		preferences = self.routed_preferences('get', url, {'include': 'task_stats'})
+		self.assertTrue(preferences)
+		self.assertTrue(all(p == ReadPreference.SECONDARY_PREFERRED for p in preferences))
+		detail = reverse('project-detail', args=[self.project_id])
+		self.assertTrue(all(p == ReadPreference.SECONDARY_PREFERRED for p in self.routed_preferences('get', detail)))
+		# the PUT reads its project from the primary, as does the pinned summary endpoint
+		self.assertEqual(set(self.routed_preferences('put', detail, {'name': 'Renamed'})), {None})
+		summary = reverse('task-summary', args=[self.project_id])
+		self.assertEqual(set(self.routed_preferences('get', summary)), {None})
+
+
+@override_settings(BACKGROUND_TASKS={'EAGER': True, 'MAX_WORKERS': 1})
+class SearchTests(APITestCase):
+	def setUp(self):
+		throttling.reset()
+		search.inverted_index.clear()
+		self.token = self.register('searcher')
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token)
+		self.url = reverse('project-search')
+
+	def tearDown(self):
+		User.drop_collection()
+		Project.drop_collection()
+		Task.drop_collection()
+		ProjectListVersion.drop_collection()
+		project_cache.clear()
+		search.inverted_index.clear()
+
+	def register(self, username):
+		return self.client.post(reverse('auth-register'), {
+			'username': username,
+			'email': f'{username}@example.com',
+			'password': 'securepass',
+			'password_confirm': 'securepass'
+		}, format='json').data['access']
+
+	def project(self, name, description=''):
+		return self.client.post(reverse('project-list-create'), {'name': name, 'description': description},
+			format='json').data['project']['id']
+
+	def task(self, project_id, title, description=''):
+		return self.client.post(reverse('task-list-create', args=[project_id]),
+			{'title': title, 'description': description}, format='json').data['task']['id']
+
+	def test_ranked_across_projects_and_tasks(self):
+		website = self.project('Website redesign', 'New landing page')
+		self.project('Backend', 'Invoices for the website')
+		task = self.task(website, 'Fix website footer')
+		self.task(website, 'Unrelated')
+		resp = self.client.get(self.url, {'q': 'website'})
+		self.assertEqual(resp.status_code, 200)
+		results = resp.data['results']
+		self.assertEqual([result['type'] for result in results], ['task', 'project', 'project'])
+		self.assertEqual(results[0]['task']['id'], task)
+		self.assertEqual(results[1]['project']['id'], website)
+		self.assertGreater(results[1]['score'], results[2]['score'])
+		# the hit has the list view fields
+		self.assertEqual(set(results[0]['task']), set(TaskSerializer.Meta.fields))
+		resp = self.client.get(self.url, {'q': 'website', 'type': 'project'})
+		self.assertEqual([result['type'] for result in resp.data['results']], ['project', 'project'])
+
+	def test_scoped_to_owner(self):
+		self.project('Shared word')
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.register('othersearcher'))
+		self.project('Other shared word')
+		resp = self.client.get(self.url, {'q': 'shared'})
+		self.assertEqual([result['project']['name'] for result in resp.data['results']], ['Other shared word'])
+
+	def test_paginates(self):
+		for i in range(5):
+			self.project(f'Report {i}')
+		seen = []
+		resp = self.client.get(self.url, {'q': 'report', 'limit': 2})
+		while True:
+			seen += [result['project']['name'] for result in resp.data['results']]
+			if not resp.data['next']:
+				break
+			resp = self.client.get(self.url, {'q': 'report', 'limit': 2, 'cursor': resp.data['next']})
+		self.assertEqual(sorted(seen), [f'Report {i}' for i in range(5)])
+		prev = self.client.get(self.url, {'q': 'report', 'limit': 2, 'cursor': resp.data['prev']})
+		self.assertEqual(len(prev.data['results']), 2)
+		self.assertEqual(self.client.get(self.url, {'q': 'report', 'cursor': 'nonsense'}).status_code, 400)
+
+	def test_index_follows_writes(self):
+		project = self.project('Launch')
+		self.assertEqual(len(self.client.get(self.url, {'q': 'launch'}).data['results']), 1)
+		# no write since: answered from the index, without reading projects or tasks
+		with mock.patch.object(Project, '_get_collection', side_effect=AssertionError('projects were read')), \
+				mock.patch.object(Task, '_get_collection', side_effect=AssertionError('tasks were read')):
+			self.assertEqual(len(self.client.get(self.url, {'q': 'launch'}).data['results']), 1)
+		self.assertEqual((search.inverted_index.builds, search.inverted_index.hits), (1, 1))
+		self.task(project, 'Launch checklist')
+		self.assertEqual(len(self.client.get(self.url, {'q': 'launch'}).data['results']), 2)
+		with mock.patch('project_handler.views.background.submit'):
+			self.client.delete(reverse('project-detail', args=[project]))
+		self.assertEqual(self.client.get(self.url, {'q': 'launch'}).data['results'], [])
+
+	def test_conditional_get(self):
+		self.project('Polled')
+		resp = self.client.get(self.url, {'q': 'polled'})
+		self.assertEqual(self.client.get(self.url, {'q': 'polled'}, HTTP_IF_NONE_MATCH=resp['ETag']).status_code, 304)
+		self.project('Polled again')
+		resp = self.client.get(self.url, {'q': 'polled'}, HTTP_IF_NONE_MATCH=resp['ETag'])
+		self.assertEqual(len(resp.data['results']), 2)
+
+	def test_bad_requests(self):
+		self.assertEqual(self.client.get(self.url).status_code, 400)
+		self.assertEqual(self.client.get(self.url, {'q': 'x', 'type': 'user'}).status_code, 400)
+		self.assertEqual(self.client.get(self.url, {'q': 'the and of'}).data['results'], [])
+
+	@override_settings(PROJECT_SEARCH={'BACKEND': 'text'})
+	def test_text_backend_falls_back_without_index(self):
+		self.project('Fallback')
+		with mock.patch('project_handler.search.text_search', side_effect=OperationFailure('text index required', 27)):
+			resp = self.client.get(self.url, {'q': 'fallback'})
+		self.assertEqual(len(resp.data['results']), 1)
+		with mock.patch('project_handler.search.text_search', side_effect=OperationFailure('boom', 2)):
+			with self.assertRaises(OperationFailure):
+				self.client.get(self.url, {'q': 'fallback'})
+
+
+@override_settings(BACKGROUND_TASKS={'EAGER': True, 'MAX_WORKERS': 1},
+	PROJECT_EVENTS={'BUS': 'local', 'HEARTBEAT_SECONDS': 0.05, 'MAX_SECONDS': 30})
+class TaskEventTests(APITestCase):
+	def setUp(self):
+		throttling.reset()
+		events.reset()
+		resp = self.client.post(reverse('auth-register'), {
+			'username': 'streamer',
+			'email': 'streamer@example.com',
+			'password': 'securepass',
+			'password_confirm': 'securepass'
+		}, format='json')
+		self.auth = {'Authorization': 'Bearer ' + resp.data['access']}
+		self.client.credentials(HTTP_AUTHORIZATION=self.auth['Authorization'])
+		self.project_id = self.client.post(reverse('project-list-create'), {'name': 'Live'}, format='json').data['project']['id']
+		self.url = reverse('async-task-events', args=[self.project_id])
+
+	def tearDown(self):
+		User.drop_collection()
+		Project.drop_collection()
+		Task.drop_collection()
+		TaskEvent.drop_collection()
+		ProjectListVersion.drop_collection()
+		project_cache.clear()
+		events.reset()
+
+	# the next event of a stream as (id, type, data), keepalives skipped; None once the stream has ended
+	async def next_event(self, stream):
+		while True:
+			try:
+				chunk = await asyncio.wait_for(anext(stream), 5)
+			except StopAsyncIteration:
+				return None
+			chunk = chunk.decode()
+			if chunk.startswith(('retry:', ':')):
+				continue
+			fields = dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+			return fields['id'], fields['event'], json.loads(fields['data'])
+
+	async def open_stream(self, **headers):
+		resp = await self.async_client.get(self.url, headers=dict(self.auth, **headers))
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp['Content-Type'], 'text/event-stream')
+		return resp.streaming_content
+
+	def write(self, method, url, data=None):
+		return sync_to_async(getattr(self.client, method))(url, data, format='json')
+
+	async def test_task_writes_are_pushed(self):
+		stream = await self.open_stream()
+		tasks_url = reverse('task-list-create', args=[self.project_id])
+		task_id = (await self.write('post', tasks_url, {'title': 'Live task'})).data['task']['id']
+		_, kind, data = await self.next_event(stream)
+		self.assertEqual((kind, data['id'], data['title'], data['status']), ('task.created', task_id, 'Live task', 'Todo'))
+
+		await self.write('patch', reverse('task-detail', args=[task_id]), {'status': 'Done'})
+		_, kind, data = await self.next_event(stream)
+		self.assertEqual((kind, data['id'], data['project'], data['status']), ('task.updated', task_id, self.project_id, 'Done'))
+
+		batch_url = reverse('task-batch', args=[self.project_id])
+		await self.write('post', batch_url, {'operations': [
+			{'op': 'create', 'data': {'title': 'Batched'}}, {'op': 'delete', 'id': task_id}]})
+		self.assertEqual([(await self.next_event(stream))[1] for _ in range(2)], ['task.created', 'task.deleted'])
+
+		with mock.patch('project_handler.views.background.submit'):
+			await self.write('delete', reverse('project-detail', args=[self.project_id]))
+		self.assertEqual((await self.next_event(stream))[1], 'project.deleted')
+		self.assertIsNone(await self.next_event(stream))
+		self.assertEqual(events.bus().subscriber_count, 0)
+
+	async def test_resume_from_last_event_id(self):
+		stream = await self.open_stream()
+		tasks_url = reverse('task-list-create', args=[self.project_id])
+		await self.write('post', tasks_url, {'title': 'Seen'})
+		last_id, _, _ = await self.next_event(stream)
+		await stream.aclose()
+		for title in ('Missed 1', 'Missed 2'):
+			await self.write('post', tasks_url, {'title': title})
+
+		stream = await self.open_stream(**{'Last-Event-ID': last_id})
+		self.assertEqual([(await self.next_event(stream))[2]['title'] for _ in range(2)], ['Missed 1', 'Missed 2'])
+		await stream.aclose()
+		# an id this process never issued cannot be resumed: the client is told to reload
+		stream = await self.open_stream(**{'Last-Event-ID': 'unknown-1'})
+		self.assertEqual((await self.next_event(stream))[1], 'reset')
+		await stream.aclose()
+
+	async def test_history_is_bounded(self):
+		with override_settings(PROJECT_EVENTS={'BUS': 'local', 'HISTORY': 2}):
+			bus = events.bus()
+			project = ObjectId(self.project_id)
+			for i in range(4):
+				bus.publish(project, events.CREATED, {'n': i})
+			_, missed = await bus.subscribe(project, f'{bus.boot}-2')
+			self.assertEqual([event['data']['n'] for event in missed], [2, 3])
+			_, missed = await bus.subscribe(project, f'{bus.boot}-1')
+			self.assertEqual([event['type'] for event in missed], ['reset'])
+
+	async def test_subscribers_are_bounded_and_slow_ones_dropped(self):
+		with override_settings(PROJECT_EVENTS={'BUS': 'local', 'MAX_SUBSCRIBERS': 1, 'QUEUE_SIZE': 2,
+				'HEARTBEAT_SECONDS': 0.05, 'MAX_SECONDS': 30}):
+			stream = await self.open_stream()
+			resp = await self.async_client.get(self.url, headers=self.auth)
+			self.assertEqual(resp.status_code, 503)
+			self.assertIn('Retry-After', resp)
+			self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+			# the stream is not read while 3 events come in: the subscriber is dropped instead of buffering them
+			for i in range(3):
+				events.publish(ObjectId(self.project_id), events.CREATED, {'n': i})
+			await asyncio.sleep(0)
+			self.assertIsNone(await self.next_event(stream))
+			self.assertEqual(events.bus().subscriber_count, 0)
+
+	async def test_ownership_and_stream_ticket(self):
+		ticket_url = reverse('async-task-events-ticket', args=[self.project_id])
+		resp = await self.async_client.post(ticket_url, headers=self.auth)
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp.json()['expires_in'], 60)
+		ticket = resp.json()['ticket']
+		resp = await self.async_client.get(self.url, {'ticket': ticket})
+		self.assertEqual(resp.status_code, 200)
+		await resp.streaming_content.aclose()
+		# the access token itself no longer works in the URL, and no token is 401
+		token = self.auth['Authorization'].split()[1]
+		self.assertEqual((await self.async_client.get(self.url, {'access_token': token})).status_code, 401)
+		self.assertEqual((await self.async_client.get(self.url)).status_code, 401)
+		self.assertEqual((await self.async_client.get(self.url, {'ticket': token})).status_code, 401)
+		# a ticket opens the stream of its own project only, and not once it is TICKET_SECONDS old
+		other_project = (await self.write('post', reverse('project-list-create'), {'name': 'Other'})).data['project']['id']
+		other_url = reverse('async-task-events', args=[other_project])
+		self.assertEqual((await self.async_client.get(other_url, {'ticket': ticket})).status_code, 403)
+		with override_settings(PROJECT_EVENTS={'BUS': 'local', 'TICKET_SECONDS': -1}):
+			self.assertEqual((await self.async_client.get(self.url, {'ticket': ticket})).status_code, 401)
+		other = await sync_to_async(self.client.post)(reverse('auth-register'), {
+			'username': 'peeker', 'email': 'peeker@example.com', 'password': 'securepass', 'password_confirm': 'securepass'
+		}, format='json')
+		other_auth = {'Authorization': 'Bearer ' + other.data['access']}
+		self.assertEqual((await self.async_client.get(self.url, headers=other_auth)).status_code, 403)
+		self.assertEqual((await self.async_client.post(ticket_url, headers=other_auth)).status_code, 403)
+
+	def test_ticket_needs_an_asgi_server(self):
+		# the sync test client is a WSGI request: the page learns it cannot stream and keeps polling
+		resp = self.client.post(reverse('async-task-events-ticket', args=[self.project_id]))
+		self.assertEqual(resp.status_code, 501)
+
+	# PROJECT_EVENTS_BUS=off: writes skip the task_events insert and nothing offers a stream
+	async def test_switched_off_bus_publishes_nothing(self):
+		with override_settings(PROJECT_EVENTS={'BUS': 'off'}):
+			tasks_url = reverse('task-list-create', args=[self.project_id])
+			task_id = (await self.write('post', tasks_url, {'title': 'Quiet'})).data['task']['id']
+			self.assertEqual((await self.write('patch', reverse('task-detail', args=[task_id]), {'status': 'Done'})).status_code, 204)
+			ticket_url = reverse('async-task-events-ticket', args=[self.project_id])
+			self.assertEqual((await self.async_client.post(ticket_url, headers=self.auth)).status_code, 501)
+			self.assertEqual((await self.async_client.get(self.url, headers=self.auth)).status_code, 501)
+		self.assertEqual(await sync_to_async(TaskEvent.objects.count)(), 0)
+		self.assertEqual(settings_api.PROJECT_EVENTS['BUS'], 'off')
+
+	async def test_change_stream_bus_reads_missed_events_back(self):
+		bus = events.ChangeStreamBus()
+		project = ObjectId(self.project_id)
+		bus.publish(project, events.CREATED, {'n': 0})
+		first = await sync_to_async(TaskEvent.objects.get)(data__n=0)
+		bus.publish(project, events.CREATED, {'n': 1})
+		bus.publish(ObjectId(), events.CREATED, {'n': 2})
+		missed = await bus.missed(project, str(first.id))
+		self.assertEqual([event['data'] for event in missed], [{'n': 1}])
+		self.assertEqual((await bus.missed(project, 'nonsense'))[0]['type'], 'reset')
+		old = ObjectId.from_datetime(datetime(2020, 1, 1))
+		self.assertEqual((await bus.missed(project, str(old)))[0]['type'], 'reset')
+
+
+@override_settings(PROJECT_EVENTS={'BUS': 'local'})
+class TaskTransferTests(APITestCase):
+	def setUp(self):
+		throttling.reset()
+		events.reset()
+		resp = self.client.post(reverse('auth-register'), {
+			'username': 'mover',
+			'email': 'mover@example.com',
+			'password': 'securepass',
+			'password_confirm': 'securepass'
+		}, format='json')
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + resp.data['access'])
+		self.project_id = self.client.post(reverse('project-list-create'), {'name': 'Source'}, format='json').data['project']['id']
+		self.target_id = self.client.post(reverse('project-list-create'), {'name': 'Target'}, format='json').data['project']['id']
+
+	def tearDown(self):
+		User.drop_collection()
+		Project.drop_collection()
+		Task.drop_collection()
+		ProjectListVersion.drop_collection()
+		project_cache.clear()
+		events.reset()
+
+	def export(self, project_id):
+		resp = self.client.get(reverse('task-export', args=[project_id]))
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp['Content-Type'], 'application/x-ndjson')
+		return [chunk.decode() for chunk in resp.streaming_content]
+
+	# the report lines of an import of `body` (a list of lines, or raw bytes)
+	def import_lines(self, project_id, body):
+		if isinstance(body, list):
+			body = ''.join(line + '\n' for line in body).encode()
+		resp = self.client.post(reverse('task-import', args=[project_id]), body, content_type='application/x-ndjson')
+		self.assertEqual(resp.status_code, 200)
+		return [json.loads(line) for line in b''.join(resp.streaming_content).decode().splitlines()]
+
+	def test_export_streams_batches_and_round_trips(self):
+		tasks_url = reverse('task-list-create', args=[self.project_id])
+		for i, task_status in enumerate(['Todo', 'Done', 'In Progress', 'Done', 'Todo']):
+			self.client.post(tasks_url, {'title': f'Task {i}', 'description': f'About {i}', 'status': task_status}, format='json')
+		with override_settings(TASK_TRANSFER={'EXPORT_BATCH_SIZE': 2}):
+			chunks = self.export(self.project_id)
+		self.assertEqual(len(chunks), 3)  # 2 + 2 + 1 tasks, one chunk per cursor batch
+		rows = [json.loads(line) for line in ''.join(chunks).splitlines()]
+		self.assertEqual([row['title'] for row in rows], [f'Task {i}' for i in range(5)])
+		# the exported lines are a valid import, created_at is kept
+		report = self.import_lines(self.target_id, [json.dumps(row) for row in rows])
+		self.assertEqual(report[-1], {'type': 'summary', 'lines': 5, 'imported': 5, 'errors': 0})
+		copied = [json.loads(line) for line in ''.join(self.export(self.target_id)).splitlines()]
+		for field in ('title', 'description', 'status', 'created_at'):
+			self.assertEqual([row[field] for row in copied], [row[field] for row in rows])
+		self.assertTrue(all(row['project'] == self.target_id for row in copied))
+		resp = self.client.get(reverse('task-summary', args=[self.target_id]))
+		self.assertEqual(resp.data['counts'], {'Todo': 2, 'In Progress': 1, 'Done': 2})
+
+	def test_import_reports_invalid_lines_and_keeps_the_rest(self):
+		too_long = json.dumps({'title': 'x' * 200})
+		lines = [
+			json.dumps({'title': 'One'}),
+			'{not json',
+			'',
+			json.dumps({'title': 'Two', 'status': 'Nope'}),
+			json.dumps(['a list']),
+			too_long,
+			json.dumps({'title': 'Three', 'status': 'Done'}),
+			json.dumps({'title': 'Four', 'created_at': 'yesterday'}),
+			json.dumps({'title': 'Five'}),
+		]
+		with override_settings(TASK_TRANSFER={'IMPORT_CHUNK_SIZE': 2, 'MAX_LINE_BYTES': 100, 'MAX_REPORTED_ERRORS': 4}):
+			report = self.import_lines(self.target_id, lines)
+		errors = [line for line in report if line['type'] == 'error']
+		self.assertEqual([line['line'] for line in errors], [2, 4, 5, 6])  # the fifth error (line 8) is only counted
+		self.assertIn('status', errors[1]['errors'])
+		progress = [line for line in report if line['type'] == 'progress']
+		self.assertEqual([line['imported'] for line in progress], [2, 3])
+		self.assertEqual(report[-1], {'type': 'summary', 'lines': 9, 'imported': 3, 'errors': 5})
+		titles = sorted(Task.objects(project=self.target_id).scalar('title'))
+		self.assertEqual(titles, ['Five', 'One', 'Three'])
+
+	def test_import_updates_counters_version_and_streams(self):
+		tasks_url = reverse('task-list-create', args=[self.target_id])
+		etag = self.client.get(tasks_url)['ETag']
+		self.client.get(reverse('project-detail', args=[self.target_id]))  # cached before the import
+		version = versions.project_state(ObjectId(self.target_id))['version']
+		received = []
+		subscription = mock.Mock(push=received.append, project_id=ObjectId(self.target_id))
+		events.bus()._add(subscription)
+		self.import_lines(self.target_id, [json.dumps({'title': f'T{i}', 'status': 'Done'}) for i in range(3)])
+		self.assertEqual(self.client.get(tasks_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+		self.assertNotEqual(versions.project_state(ObjectId(self.target_id))['version'], version)
+		self.assertEqual(project_cache.stats()['project']['invalidations'], 1)
+		resp = self.client.get(reverse('task-summary', args=[self.target_id]))
+		self.assertEqual(resp.data['counts']['Done'], 3)
+		self.assertEqual([(event['type'], event['data']) for event in received], [('reset', {'imported': 3})])
+
+	def test_ownership(self):
+		other = self.client.post(reverse('auth-register'), {
+			'username': 'outsider', 'email': 'outsider@example.com', 'password': 'securepass', 'password_confirm': 'securepass'
+		}, format='json')
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + other.data['access'])
+		self.assertEqual(self.client.get(reverse('task-export', args=[self.project_id])).status_code, 403)
+		resp = self.client.post(reverse('task-import', args=[self.project_id]), b'{"title": "x"}\n', content_type='application/x-ndjson')
+		self.assertEqual(resp.status_code, 403)
+		self.assertEqual(self.client.get(reverse('task-export', args=['0' * 24])).status_code, 404)
+		self.assertEqual(Task.objects.count(), 0)
@@ -0,0 +1,150 @@
+import json
+from collections import Counter
+from datetime import timezone
+from itertools import islice
+
+from django.conf import settings
+from django.utils.timezone import make_naive
+from pymongo.errors import BulkWriteError
+from rest_framework import serializers
+
+from project_handler.models import Task
+from project_handler.pagination import ASCENDING
+from project_handler.serializers import TaskSerializer, TaskListSerializer
+from project_handler import counters, events, versions
+
+
+# NDJSON export/import of one project's tasks, one JSON object per line (the task list row fields).
+# Export reads one server-side cursor in batches of EXPORT_BATCH_SIZE and sends each batch as one chunk, import reads
+# the upload line by line and writes IMPORT_CHUNK_SIZE tasks per insert_many, so memory follows the batch sizes and
+# never the number of tasks.
+
+datetime_field = serializers.DateTimeField()
+
+
+def config():
+	conf = getattr(settings, "TASK_TRANSFER", {})
+	return {
+		"EXPORT_BATCH_SIZE": conf.get("EXPORT_BATCH_SIZE", 500),
+		"IMPORT_CHUNK_SIZE": conf.get("IMPORT_CHUNK_SIZE", 500),
+		"MAX_LINE_BYTES": conf.get("MAX_LINE_BYTES", 64 * 1024),
+		"MAX_REPORTED_ERRORS": conf.get("MAX_REPORTED_ERRORS", 100),
+	}
+
+
+def dumps(data):
+	return json.dumps(data, separators=(",", ":")) + "\n"
+
+
+# the project's tasks in (created_at, _id) order (the project_created_at index), one chunk of lines per batch;
+# `collection` is taken by the view, so the read preference of the request applies
+def export_chunks(collection, project_id):
+	batch_size = config()["EXPORT_BATCH_SIZE"]
+	cursor = collection.find({"project": project_id}, TaskListSerializer.projection()).sort(ASCENDING)
+	cursor = cursor.batch_size(batch_size)
+	serializer = TaskListSerializer(())
+	try:
+		while rows := list(islice(cursor, batch_size)):
+			yield "".join(dumps(serializer.to_representation(row)) for row in rows)
+	finally:
+		cursor.close()
+
+
+# (line number, line) from a binary stream, never holding more than max_bytes of a line;
+# an oversized line is skipped up to its newline and yielded as None
+def read_lines(stream, max_bytes):
+	number = 0
+	while line := stream.readline(max_bytes + 1):
+		number += 1
+		if len(line) > max_bytes and not line.endswith(b"\n"):
+			while line and not line.endswith(b"\n"):
+				line = stream.readline(max_bytes + 1)
+			yield number, None
+		else:
+			yield number, line
+
+
+# one import line -> (validated task fields, None) or (None, errors); the same rules as task create, plus an
+# optional created_at so a migrated project keeps its order
+def parse_line(line):
+	try:
+		data = json.loads(line)
+	except ValueError:
+		return None, {"line": ["Not valid JSON"]}
+	if not isinstance(data, dict):
+		return None, {"line": ["Expected a JSON object"]}
+	serializer = TaskSerializer(data=data)
+	if not serializer.is_valid():
+		return None, serializer.errors
+	fields = dict(serializer.validated_data)
+	if data.get("created_at") is not None:
+		try:
+			created_at = datetime_field.to_internal_value(data["created_at"])
+		except serializers.ValidationError as exc:
+			return None, {"created_at": exc.detail}
+		fields["created_at"] = make_naive(created_at, timezone.utc)
+	return fields, None
+
+
+# one import into a project; run() is the generator behind the streamed report:
+#   {"type": "error", "line": 7, "errors": {...}}                 per rejected line (the first MAX_REPORTED_ERRORS)
+#   {"type": "progress", "lines": 1000, "imported": 998, ...}    after every chunk written
+#   {"type": "summary", "lines": ..., "imported": ..., "errors": ...}  last
+# Chunks written before a failure or a disconnect stay imported; counters and the project version follow them
+class TaskImport:
+	def __init__(self, project, user):
+		self.project = project
+		self.user = user
+		self.lines = 0
+		self.imported = 0
+		self.errors = 0
+
+	def run(self, stream):
+		conf = config()
+		chunk = []  # (line number, task document)
+		try:
+			for number, line in read_lines(stream, conf["MAX_LINE_BYTES"]):
+				self.lines = number
+				if line is None:
+					yield from self.error(number, {"line": [f"Longer than {conf['MAX_LINE_BYTES']} bytes"]})
+					continue
+				if not line.strip():
+					continue
+				fields, errors = parse_line(line)
+				if errors:
+					yield from self.error(number, errors)
+					continue
+				chunk.append((number, Task(project=self.project, owner=self.user, **fields).to_mongo().to_dict()))
+				if len(chunk) >= conf["IMPORT_CHUNK_SIZE"]:
+					yield from self.write(chunk)
+					chunk = []
+			if chunk:
+				yield from self.write(chunk)
+			yield dumps(dict(self.totals(), type="summary"))
+		finally:
+			if self.imported:
+				versions.project_changed(self.project.id, self.user.id)
+				# open event streams reload the list once instead of receiving every imported task
+				events.publish(self.project.id, events.RESET, {"imported": self.imported})
+
+	def totals(self):
+		return {"lines": self.lines, "imported": self.imported, "errors": self.errors}
+
+	def error(self, number, errors):
+		self.errors += 1
+		if self.errors <= config()["MAX_REPORTED_ERRORS"]:
+			yield dumps({"type": "error", "line": number, "errors": errors})
+
+	# one unordered insert_many; a failed document is reported on its line, the rest of the chunk is kept
+	def write(self, chunk):
+		failed = {}
+		try:
+			Task._get_collection().insert_many([doc for _, doc in chunk], ordered=False)
+		except BulkWriteError as exc:
+			failed = {error["index"]: error.get("errmsg", "Write failed") for error in exc.details.get("writeErrors", [])}
+		deltas = Counter(doc["status"] for position, (_, doc) in enumerate(chunk) if position not in failed)
+		counters.apply_deltas(self.project.id, deltas)
+		self.imported += len(chunk) - len(failed)
+		for position, message in sorted(failed.items()):
+			yield from self.error(chunk[position][0], {"write": [message]})
+		yield dumps(dict(self.totals(), type="progress"))
@@ -4,11 +4,23 @@ from project_handler.views import (
 	ProjectDetailAPIView,
 	TaskListCreateAPIView,
 	TaskDetailAPIView,
+	TaskBatchAPIView,
+	TaskExportAPIView,
+	TaskImportAPIView,
+	TaskSummaryAPIView,
+	SearchAPIView,
+	ProjectCacheStatsAPIView,
 )
 
 urlpatterns = [
 	path("", ProjectListCreateAPIView.as_view(), name="project-list-create"),
+	path("search/", SearchAPIView.as_view(), name="project-search"),
+	path("cache/stats/", ProjectCacheStatsAPIView.as_view(), name="project-cache-stats"),
 	path("<str:project_id>/", ProjectDetailAPIView.as_view(), name="project-detail"),
 	path("<str:project_id>/tasks/", TaskListCreateAPIView.as_view(), name="task-list-create"),
+	path("<str:project_id>/tasks/batch/", TaskBatchAPIView.as_view(), name="task-batch"),
+	path("<str:project_id>/tasks/export/", TaskExportAPIView.as_view(), name="task-export"),
+	path("<str:project_id>/tasks/import/", TaskImportAPIView.as_view(), name="task-import"),
+	path("<str:project_id>/tasks/summary/", TaskSummaryAPIView.as_view(), name="task-summary"),
 	path("tasks/<str:task_id>/", TaskDetailAPIView.as_view(), name="task-detail"),
 ]
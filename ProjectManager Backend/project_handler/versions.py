@@ -0,0 +1,110 @@
+import hashlib
+
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from project_handler import counters
+from project_handler.cache import project_cache
+from project_handler.models import Project, ProjectListVersion
+from ProjectManagerCore import read_routing
+from ProjectManagerCore.db import get_async_collection
+
+
+# Version stamps behind the ETags of the polled read views:
+# - Project.version covers one project and its tasks (project detail, task list)
+# - ProjectListVersion.version covers one owner's project list, ?include=task_stats included
+# Writes bump them after writing, reads take them before loading any data, so a response is never tagged with a
+# version newer than its content (a write racing a read only costs the client one more full response).
+
+
+# {"owner", "version"} of an undeleted project, None if there is none: one narrow _id read that the cached GETs
+# take from Mongo for their ownership check and ETag, so neither ever comes from another worker's stale cache entry
+def project_state(project_id):
+	collection = read_routing.route_read(Project._get_collection())
+	row = collection.find_one({"_id": project_id, "deleted_at": None}, {"owner": 1, "version": 1})
+	return {"owner": row["owner"], "version": row.get("version", 0)} if row else None
+
+
+# version of the owner's project list, a single _id lookup (0 until the owner's first write)
+def list_version(owner_id):
+	row = read_routing.route_read(ProjectListVersion._get_collection()).find_one({"_id": owner_id}, {"version": 1})
+	return row["version"] if row else 0
+
+
+async def alist_version(owner_id):
+	collection = read_routing.route_read(get_async_collection(ProjectListVersion))
+	row = await collection.find_one({"_id": owner_id}, {"version": 1})
+	return row["version"] if row else 0
+
+
+def owner_changed(owner_id):
+	ProjectListVersion._get_collection().update_one({"_id": owner_id}, {"$inc": {"version": 1}}, upsert=True)
+
+
+# the project's version $inc, folded into the counter $inc of the same write when it moves tasks between statuses
+# (`deltas` as in counters.apply_deltas), so a task write costs one update_one on the project. The counter update only
+# matches projects that have task_counts; a project from before the counters gets the version alone, in a second
+# update_one, until its first recount
+def version_updates(project_id, deltas):
+	update = counters.counter_update(project_id, deltas or {})
+	if update:
+		query, change = update
+		yield query, {"$inc": dict(change["$inc"], version=1)}
+	yield {"_id": project_id}, {"$inc": {"version": 1}}
+
+
+# a write to the project or one of its tasks: the project, and the list that shows it, change version
+# (and the cached project entry, which carries the old version, is dropped)
+def project_changed(project_id, owner_id, deltas=None):
+	collection = Project._get_collection()
+	for update in version_updates(project_id, deltas):
+		if collection.update_one(*update).matched_count:
+			break
+	project_cache.invalidate("project", project_id)
+	owner_changed(owner_id)
+
+
+async def aowner_changed(owner_id):
+	await get_async_collection(ProjectListVersion).update_one({"_id": owner_id}, {"$inc": {"version": 1}}, upsert=True)
+
+
+async def aproject_changed(project_id, owner_id, deltas=None):
+	collection = get_async_collection(Project)
+	for update in version_updates(project_id, deltas):
+		if (await collection.update_one(*update)).matched_count:
+			break
+	await project_cache.ainvalidate("project", project_id)
+	await aowner_changed(owner_id)
+
+
+# strong ETag of one representation: the version plus a digest of who asked for what (user, route and its
+# arguments, query string with cursor/limit/filters, negotiated media type), so two users or two pages never share
+# a tag. The route name drops the "async-" prefix: a sync view and its async twin serve the same representation
+def etag(request, name, version):
+	match = request.resolver_match
+	route = f"{match.url_name.removeprefix('async-')}|{sorted(match.kwargs.items())}"
+	query = request.META.get("QUERY_STRING", "")
+	key = f"{request.user.id}|{route}|{query}|{getattr(request, 'accepted_media_type', '')}"
+	return f'"{name}-{version}-{hashlib.blake2b(key.encode(), digest_size=8).hexdigest()}"'
+
+
+# True when If-None-Match already holds this tag (weak comparison, as If-None-Match asks for)
+def matches(request, tag):
+	header = request.headers.get("If-None-Match")
+	if not header:
+		return False
+	tags = parse_etags(header)
+	return "*" in tags or any(candidate.removeprefix("W/") == tag for candidate in tags)
+
+
+# ETag + "private, no-cache": browsers keep the response per user but revalidate it on every poll
+def tagged(response, tag):
+	response["ETag"] = tag
+	patch_cache_control(response, private=True, no_cache=True)
+	return response
+
+
+def not_modified(tag):
+	return tagged(Response(status=status.HTTP_304_NOT_MODIFIED), tag)
@@ -1,12 +1,28 @@
 
 
+from collections import Counter
+from datetime import datetime
+from io import BytesIO
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from pymongo import DeleteOne, InsertOne, ReturnDocument, UpdateMany
+from pymongo.errors import BulkWriteError
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 
 from project_handler.models import Project, Task
-from project_handler.serializers import ProjectSerializer, TaskSerializer
+from project_handler.serializers import ProjectSerializer, TaskSerializer, ProjectListSerializer, TaskListSerializer
+from project_handler.pagination import KeysetPagination, RankedPagination
+from project_handler.purge import purge_project
+from project_handler.cache import project_cache
+from project_handler import counters, events, search, transfer, versions
+from ProjectManagerCore import background, read_routing
+from ProjectManagerCore.read_routing import ReadRoutingMixin
 
 
 # checks if all required keys are present in the request data, returns 400 response if any are missing
@@ -22,19 +38,91 @@ def validate_keys(data, required_keys):
 		)
 	return None
 
+
+# builds the $set document for a PATCH body using the write serializer (partial=True), so the same field rules
+# as create/update apply and read-only/unknown keys are ignored; returns (set_doc, None) or (None, 400 response)
+def build_set_document(serializer_class, data):
+	serializer = serializer_class(data=data, partial=True)
+	if not serializer.is_valid():
+		return None, Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+	if not serializer.validated_data:
+		return None, Response({"detail": "No updatable fields in request ..."}, status=status.HTTP_400_BAD_REQUEST)
+	fields = serializer_class.Meta.model._fields
+	set_doc = {
+		fields[name].db_field: fields[name].to_mongo(value)
+		for name, value in serializer.validated_data.items()
+	}
+	return set_doc, None
+
+
+# PATCH answers 204 unless the client asks for the updated document with "Prefer: return=representation"
+def wants_representation(request):
+	return "return=representation" in request.headers.get("Prefer", "")
+
+
+# path ids come in as strings, raw pymongo filters need ObjectIds (None for anything that is not one)
+def to_object_id(value):
+	try:
+		return ObjectId(value)
+	except (InvalidId, TypeError):
+		return None
+
+
+# the live project owned by the user, or the 403/404 response for it (batch, export and import check ownership once)
+def owned_project(user, project_id):
+	project_oid = to_object_id(project_id)
+	if project_oid is None:
+		return None, Response({"detail": "Project not found"}, status=status.HTTP_404_NOT_FOUND)
+	project = Project.objects.filter(id=project_oid, owner=user, deleted_at=None).no_dereference().first()
+	if project:
+		return project, None
+	if Project.objects.filter(id=project_oid, deleted_at=None).only("id").first():
+		return None, Response({"detail": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
+	return None, Response({"detail": "Project not found"}, status=status.HTTP_404_NOT_FOUND)
+
+
+# runs one atomic $set filtered by query (always _id + owner): update_one normally, find_one_and_update when the
+# updated document is needed; returns the updated raw document, True (matched, no read-back) or None (nothing matched)
+def atomic_owned_update(document, query, set_doc, return_document):
+	collection = document._get_collection()
+	if return_document:
+		return collection.find_one_and_update(query, {"$set": set_doc}, return_document=ReturnDocument.AFTER)
+	return True if collection.update_one(query, {"$set": set_doc}).matched_count else None
+
 #List all projects for the logged-in user or create a new project.
 
-class ProjectListCreateAPIView(APIView):
+class ProjectListCreateAPIView(ReadRoutingMixin, APIView):
 	permission_classes = (IsAuthenticated,)
 
-	# returns a list of all projects owned by the currently logged-in user
+	includes = ("task_stats",)
+
+	# returns one page of the projects owned by the currently logged-in user (?cursor=, ?limit=);
+	# ?include=task_stats adds task counts + last activity to every project on the page;
+	# a poll with a current If-None-Match gets 304 after a single version lookup
 	def get(self, request):
 		# Variables---------------------------------------------------------------------------------------------------
 		user = request.user
+		paginator = KeysetPagination(request)
+		include = [name for name in request.query_params.get("include", "").split(",") if name]
+		unknown = [name for name in include if name not in self.includes]
+		if unknown:
+			return Response({"detail": f"Unknown include {unknown}, choose from {self.includes}"},
+				status=status.HTTP_400_BAD_REQUEST)
+		# Answering an unchanged poll from the owner's list version, before loading any project--------------------
+		etag = versions.etag(request, "projects", versions.list_version(user.id))
+		if versions.matches(request, etag):
+			return versions.not_modified(etag)
 		# Fetching projects owned by user-----------------------------------------------------------------------------
-		projects_under_user = Project.objects.filter(owner=user)
-		data = ProjectSerializer(projects_under_user, many=True).data
-		return Response({"results": data}, status=status.HTTP_200_OK)
+		projects_under_user = read_routing.route_read(Project.objects.filter(owner=user, deleted_at=None))
+		page, next_cursor, prev_cursor = paginator.paginate_queryset(ProjectListSerializer.projected(projects_under_user))
+		data = ProjectListSerializer(page).data
+		# Task stats for this page only, in one aggregation over its tasks----------------------------------------------
+		if "task_stats" in include:
+			stats = counters.task_stats([row["_id"] for row in page])
+			for row, project in zip(page, data):
+				project["task_stats"] = stats.get(row["_id"]) or counters.empty_stats(row["created_at"])
+		response = Response(paginator.get_paginated_data(data, next_cursor, prev_cursor), status=status.HTTP_200_OK)
+		return versions.tagged(response, etag)
 
 	# creates a new project with the current user automatically set as the owner
 	def post(self, request):
@@ -61,6 +149,7 @@ class ProjectListCreateAPIView(APIView):
 			project.save()
 		except Exception:
 			return Response({"detail": "Failed to create project ..."}, status=status.HTTP_400_BAD_REQUEST)
+		versions.owner_changed(user.id)
 
 		return Response(
 			{
@@ -73,21 +162,32 @@ class ProjectListCreateAPIView(APIView):
 
 #Update or delete a specific project (owner only).
 
-class ProjectDetailAPIView(APIView):
+class ProjectDetailAPIView(ReadRoutingMixin, APIView):
 	permission_classes = (IsAuthenticated,)
 
-	# helper to fetch a single project by its id, returns None if not found
+	# helper to fetch a single project by its id, returns None if not found (or already deleted);
+	# a secondary may serve it for GET, PUT reads from the primary (read routing only applies to safe requests)
 	def get_object(self, project_id):
-		return Project.objects.filter(id=project_id).first()
+		return read_routing.route_read(Project.objects.filter(id=project_id, deleted_at=None)).first()
 
-	# retrieve a single project
+	# retrieve a single project: owner + version come from Mongo (one narrow read), a poll with a current
+	# If-None-Match gets 304, anything else is served from the project cache entry of that version
 	def get(self, request, project_id):
-		project = self.get_object(project_id)
-		if not project:
+		project_oid = to_object_id(project_id)
+		state = versions.project_state(project_oid) if project_oid is not None else None
+		if not state:
 			return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
-		if project.owner != request.user:
+		if state["owner"] != request.user.id:
 			return Response({"detail": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
-		return Response(ProjectSerializer(project).data, status=status.HTTP_200_OK)
+		etag = versions.etag(request, "project", state["version"])
+		if versions.matches(request, etag):
+			return versions.not_modified(etag)
+		project = project_cache.project(project_oid, state["version"])
+		if not project:
+			return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+		# a write between the two reads: the refilled entry is newer, tag it with its own version
+		etag = versions.etag(request, "project", project["version"])
+		return versions.tagged(Response(project["data"], status=status.HTTP_200_OK), etag)
 
 	# updates an existing project's name/description, only if the requesting user is the owner
 	def put(self, request, project_id):
@@ -108,49 +208,92 @@ class ProjectDetailAPIView(APIView):
 		if description is not None:
 			project.description = description
 		project.save()
+		versions.project_changed(project.id, request.user.id)
 		return Response(ProjectSerializer(project).data, status=status.HTTP_200_OK)
 
-	# deletes a project permanently, only if the requesting user is the owner
-	def delete(self, request, project_id):
-		# Variables---------------------------------------------------------------------------------------------------
-		project = self.get_object(project_id)
-		# Checking if project exists----------------------------------------------------------------------------------
-		if not project:
+	# partial update as a single update_one filtered by id + owner, no prior fetch
+	def patch(self, request, project_id):
+		# Validating the body into a $set------------------------------------------------------------------------------
+		set_doc, error = build_set_document(ProjectSerializer, request.data or {})
+		if error:
+			return error
+		project_oid = to_object_id(project_id)
+		if project_oid is None:
 			return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
-		# Checking ownership------------------------------------------------------------------------------------------
-		if project.owner != request.user:
+		# One round trip: update (and optionally read back) only if the user owns it-----------------------------------
+		representation = wants_representation(request)
+		query = {"_id": project_oid, "owner": request.user.id, "deleted_at": None}
+		result = atomic_owned_update(Project, query, set_doc, representation)
+		if result is None:
+			# nothing matched: either it does not exist or it belongs to someone else
+			if Project.objects.filter(id=project_oid, deleted_at=None).only("id").first():
+				return Response({"detail": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
+			return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+		versions.project_changed(project_oid, request.user.id)
+		if not representation:
+			return Response(status=status.HTTP_204_NO_CONTENT)
+		project = Project._from_son(result, _auto_dereference=False)
+		return Response(
+			ProjectSerializer(project).data,
+			status=status.HTTP_200_OK,
+			headers={"Preference-Applied": "return=representation"},
+		)
+
+	# deletes a project and all of its tasks, only if the requesting user is the owner
+	def delete(self, request, project_id):
+		# Marking the project deleted (ownership check inside the filter), it disappears from every read right away---
+		marked = Project.objects.filter(id=project_id, owner=request.user, deleted_at=None).update_one(
+			set__deleted_at=datetime.utcnow()
+		)
+		if not marked:
+			# Checking if project exists / ownership------------------------------------------------------------------
+			if not self.get_object(project_id):
+				return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
 			return Response({"detail": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
-		project.delete()
+		versions.owner_changed(request.user.id)
+		project_cache.invalidate("project", project_id) # its cached tasks go with it, they are served via this entry
+		events.project_deleted(to_object_id(project_id)) # ends the project's open event streams
+		# The tasks (and then the project document) are removed in batches off the request thread-------------------
+		background.submit(purge_project, project_id)
 		return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 #List all tasks for a project or create a new task under a project.
 
-class TaskListCreateAPIView(APIView):
+class TaskListCreateAPIView(ReadRoutingMixin, APIView):
 	permission_classes = (IsAuthenticated,)
 
-	# lists all tasks under a project, supports optional ?status= query param for filtering
+	# lists one page of tasks under a project (?cursor=, ?limit=), supports optional ?status= query param for filtering;
+	# a poll with a current If-None-Match gets 304 without reading any task
 	def get(self, request, project_id):
-		# Variables---------------------------------------------------------------------------------------------------
-		project = Project.objects.filter(id=project_id).first()
+		# Variables (owner + version of the project, one narrow read, for the ownership check and the ETag)-------
+		project_oid = to_object_id(project_id)
+		project = versions.project_state(project_oid) if project_oid is not None else None
+		paginator = KeysetPagination(request)
 		# Checking if project exists----------------------------------------------------------------------------------
 		if not project:
 			return Response({"detail": "Project not found"}, status=status.HTTP_404_NOT_FOUND)
 		# Checking ownership------------------------------------------------------------------------------------------
-		if project.owner != request.user:
+		if project["owner"] != request.user.id:
 			return Response({"detail": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
+		# Answering an unchanged poll-------------------------------------------------------------------------------
+		etag = versions.etag(request, "tasks", project["version"])
+		if versions.matches(request, etag):
+			return versions.not_modified(etag)
 		# Filtering by status (optional)------------------------------------------------------------------------------
 		status_filter = request.query_params.get("status") # in param we can pass status=Done, Todo, In Progress
-		tasks_in_project = Task.objects.filter(project=project)
+		tasks_in_project = read_routing.route_read(Task.objects.filter(project=project_oid))
 		if status_filter:
 			tasks_in_project = tasks_in_project.filter(status=status_filter)
-		data = TaskSerializer(tasks_in_project, many=True).data
-		return Response({"results": data}, status=status.HTTP_200_OK)
+		page, next_cursor, prev_cursor = paginator.paginate_queryset(TaskListSerializer.projected(tasks_in_project))
+		data = TaskListSerializer(page).data
+		response = Response(paginator.get_paginated_data(data, next_cursor, prev_cursor), status=status.HTTP_200_OK)
+		return versions.tagged(response, etag)
 
 	# creates a new task under the given project, only if the requesting user owns the project
 	def post(self, request, project_id):
 		# Variables---------------------------------------------------------------------------------------------------
-		project = Project.objects.filter(id=project_id).first()
+		project = Project.objects.filter(id=project_id, deleted_at=None).first()
 		# Checking if project exists----------------------------------------------------------------------------------
 		if not project:
 			return Response({"detail": "Project not found"}, status=status.HTTP_404_NOT_FOUND)
@@ -177,43 +320,75 @@ class TaskListCreateAPIView(APIView):
 				task.description = description
 			task.status = status_val
 			task.project = project
+			task.owner = request.user # same user that just passed the project ownership check
 			task.save()
 		except Exception:
 			return Response({"detail": "Failed to create task"}, status=status.HTTP_400_BAD_REQUEST)
+		versions.project_changed(project.id, request.user.id, counters.task_deltas(new_status=task.status))
+		data = TaskSerializer(task).data
+		events.task_created(project.id, data)
 
 		return Response(
 			{
-				"task": TaskSerializer(task).data,
+				"task": data,
 				"message": "Task Created Successfully ..."
 			},
 			status=status.HTTP_201_CREATED,
 		)
 
 
-#Update or delete a specific task (project owner only).
+#Retrieve, update or delete a specific task (project owner only).
 
-class TaskDetailAPIView(APIView):
+class TaskDetailAPIView(ReadRoutingMixin, APIView):
 	permission_classes = (IsAuthenticated,)
 
-	# helper to fetch a single task by its id, returns None if not found
-	def get_object(self, task_id):
-		return Task.objects.filter(id=task_id).first()
-
-	# updates an existing task's title/description/status, only if the user owns the parent project
-	def put(self, request, task_id):
-		# Variables---------------------------------------------------------------------------------------------------
-		task = self.get_object(task_id)
-		# Checking if task exists-------------------------------------------------------------------------------------
+	# helper to fetch a single task owned by user, returns (task, None) or (None, error response)
+	# the ownership check is part of the query filter (Task.owner), so the happy path is a single read;
+	# no_dereference keeps task.project/task.owner as DBRefs instead of loading the Project/User behind them
+	def get_object(self, task_id, user):
+		task = Task.objects.filter(id=task_id, owner=user).no_dereference().first()
+		if task:
+			return task, None
+		# only on a miss: tell 404 from 403 with a second, narrow read
+		task = Task.objects.filter(id=task_id).no_dereference().only("id", "owner", "project").first()
 		if not task:
+			return None, Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+		# tasks written before Task.owner existed: check the parent project and store the owner for next time
+		if task.owner is None and Project.objects.filter(id=task.project.id, owner=user, deleted_at=None).first():
+			Task.objects.filter(id=task_id, owner=None).update(set__owner=user)
+			return Task.objects.filter(id=task_id).no_dereference().first(), None
+		return None, Response({"detail": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
+
+	# retrieve a single task, read through the project cache; access follows the owner of its (undeleted) project,
+	# read from Mongo together with the project version the cached task has to match. A miss reads the task once
+	# (it names the project to check) and serves that document; the entry it leaves is refilled at a known version
+	# by the next request, so no request reads the task twice
+	def get(self, request, task_id):
+		task_oid = to_object_id(task_id)
+		task = project_cache.task(task_oid) if task_oid is not None else None
+		project = versions.project_state(task["project"]) if task else None
+		if not project:
 			return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
-		# Checking ownership (via project.owner)----------------------------------------------------------------------
-		if task.project.owner != request.user:
+		if project["owner"] != request.user.id:
 			return Response({"detail": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
+		if not task.get("fresh") and task["version"] != project["version"]:
+			task = project_cache.task(task_oid, project["version"])
+			if not task:
+				return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+		return Response(task["data"], status=status.HTTP_200_OK)
+
+	# updates an existing task's title/description/status, only if the user owns the parent project
+	def put(self, request, task_id):
+		# Variables + checking existence and ownership (via task.owner)-----------------------------------------------
+		task, error = self.get_object(task_id, request.user)
+		if error:
+			return error
 		# Other validations-------------------------------------------------------------------------------------------
 		raw = request.data or {}
 		title = raw.get("title")
 		description = raw.get("description")
 		status_val = raw.get("status")
+		old_status = task.status
 		if title:
 			task.title = title
 		if description is not None:
@@ -221,17 +396,363 @@ class TaskDetailAPIView(APIView):
 		if status_val:
 			task.status = status_val
 		task.save()
-		return Response(TaskSerializer(task).data, status=status.HTTP_200_OK)
+		project_cache.invalidate("task", task.id)
+		versions.project_changed(task.project.id, request.user.id, counters.task_deltas(old_status, task.status))
+		data = TaskSerializer(task).data
+		events.publish(task.project.id, events.UPDATED, data)
+		return Response(data, status=status.HTTP_200_OK)
+
+	# the PATCH write: one find_one_and_update that returns the previous document (just project + status unless the
+	# representation is wanted), so the project counters and version move in the same round trip
+	def patch_write(self, query, set_doc, representation):
+		before = Task._get_collection().find_one_and_update(
+			query, {"$set": set_doc}, projection=None if representation else {"project": 1, "status": 1},
+			return_document=ReturnDocument.BEFORE,
+		)
+		if before is None:
+			return None
+		deltas = counters.task_deltas(before.get("status", "Todo"), set_doc["status"]) if "status" in set_doc else None
+		project_cache.invalidate("task", query["_id"])
+		versions.project_changed(before["project"], query["owner"], deltas)
+		events.task_updated(before["project"], query["_id"], set_doc)
+		return dict(before, **set_doc) if representation else True
+
+	# partial update (e.g. a status flip) as a single write filtered by id + owner, no prior fetch
+	def patch(self, request, task_id):
+		# Validating the body into a $set------------------------------------------------------------------------------
+		set_doc, error = build_set_document(TaskSerializer, request.data or {})
+		if error:
+			return error
+		set_doc["updated_at"] = datetime.utcnow()
+		task_oid = to_object_id(task_id)
+		if task_oid is None:
+			return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+		# One round trip: update (and optionally read back) only if the user owns it-----------------------------------
+		representation = wants_representation(request)
+		query = {"_id": task_oid, "owner": request.user.id}
+		result = self.patch_write(query, set_doc, representation)
+		if result is None:
+			# nothing matched: 404/403, or a task from before Task.owner that get_object backfills, then retry once
+			_, error = self.get_object(task_id, request.user)
+			if error:
+				return error
+			result = self.patch_write(query, set_doc, representation)
+		if not representation:
+			return Response(status=status.HTTP_204_NO_CONTENT)
+		task = Task._from_son(result, _auto_dereference=False)
+		return Response(
+			TaskSerializer(task).data,
+			status=status.HTTP_200_OK,
+			headers={"Preference-Applied": "return=representation"},
+		)
 
 	# deletes a task permanently, only if the user owns the parent project
 	def delete(self, request, task_id):
-		# Variables---------------------------------------------------------------------------------------------------
-		task = self.get_object(task_id)
-		# Checking if task exists-------------------------------------------------------------------------------------
-		if not task:
+		task_oid = to_object_id(task_id)
+		if task_oid is None:
 			return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
-		# Checking ownership (via project.owner)----------------------------------------------------------------------
-		if task.project.owner != request.user:
-			return Response({"detail": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
+		# Deleting with the ownership check inside the filter, a single write on the happy path----------------------
+		# (find_one_and_delete hands back project + status for the counters)
+		deleted = Task._get_collection().find_one_and_delete(
+			{"_id": task_oid, "owner": request.user.id}, projection={"project": 1, "status": 1}
+		)
+		if deleted:
+			project_cache.invalidate("task", task_oid)
+			deltas = counters.task_deltas(old_status=deleted.get("status", "Todo"))
+			versions.project_changed(deleted["project"], request.user.id, deltas)
+			events.task_deleted(deleted["project"], task_oid)
+			return Response(status=status.HTTP_204_NO_CONTENT)
+		# Nothing deleted: checking existence and ownership to pick 404/403 (or a not yet backfilled task)-----------
+		task, error = self.get_object(task_id, request.user)
+		if error:
+			return error
 		task.delete()
+		project_cache.invalidate("task", task.id)
+		versions.project_changed(task.project.id, request.user.id, counters.task_deltas(old_status=task.status))
+		events.task_deleted(task.project.id, task.id)
 		return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+#Apply many task create/update/delete operations to one project in a single bulk_write.
+
+class TaskBatchAPIView(APIView):
+	permission_classes = (IsAuthenticated,)
+	operations = ("create", "update", "delete")
+
+	# validates one operation and turns it into a pymongo write plus the (type, data) of the task event it publishes
+	# once applied; returns (write, task_id, event, None) or (None, None, None, errors)
+	def build_write(self, item, project, user):
+		if not isinstance(item, dict) or item.get("op") not in self.operations:
+			return None, None, None, {"op": [f"Must be one of {self.operations}"]}
+		op = item["op"]
+		data = item.get("data") or {}
+
+		if op == "create":
+			serializer = TaskSerializer(data=data)
+			if not serializer.is_valid():
+				return None, None, None, serializer.errors
+			task = Task(project=project, owner=user, **serializer.validated_data)
+			doc = task.to_mongo().to_dict()
+			doc["_id"] = ObjectId() # generated here so every created item can report its id
+			return InsertOne(doc), doc["_id"], (events.CREATED, events.task_data(doc)), None
+
+		task_oid = to_object_id(item.get("id"))
+		if task_oid is None:
+			return None, None, None, {"id": ["A valid task id is required"]}
+		query = {"_id": task_oid, "project": project.id}
+		if op == "delete":
+			return DeleteOne(query), task_oid, (events.DELETED, events.deleted_data(task_oid, project.id)), None
+		set_doc, error = build_set_document(TaskSerializer, data)
+		if error:
+			return None, None, None, error.data
+		set_doc["updated_at"] = datetime.utcnow()
+		event = (events.UPDATED, events.change_data(task_oid, project.id, set_doc))
+		# UpdateMany on a unique _id touches at most one task; mongomock's bulk API rejects pymongo 4's UpdateOne
+		return UpdateMany(query, {"$set": set_doc}), task_oid, event, None
+
+	def post(self, request, project_id):
+		# Variables---------------------------------------------------------------------------------------------------
+		raw = request.data or {}
+		items = raw.get("operations")
+		ordered = raw.get("ordered", True)
+		max_operations = settings.TASK_BATCH_MAX_OPERATIONS
+
+		# Checking the batch itself-----------------------------------------------------------------------------------
+		if not isinstance(items, list) or not items:
+			return Response({"detail": "operations must be a non-empty list"}, status=status.HTTP_400_BAD_REQUEST)
+		if len(items) > max_operations:
+			return Response(
+				{"detail": f"Too many operations, the limit is {max_operations} per batch"},
+				status=status.HTTP_400_BAD_REQUEST,
+			)
+		# a JSON boolean only: bool("false") would silently run an ordered batch
+		if not isinstance(ordered, bool):
+			return Response({"detail": "ordered must be true or false"}, status=status.HTTP_400_BAD_REQUEST)
+
+		# Checking project ownership once for the whole batch----------------------------------------------------------
+		project, error = owned_project(request.user, project_id)
+		if error:
+			return error
+
+		# Validating every operation (no early exit, so the client sees all errors at once)---------------------------
+		results = []
+		writes = []  # (index into results, task id, pymongo write)
+		published = {}  # index into results -> task event once applied
+		targeted = set()  # task ids already updated/deleted by an earlier operation
+		for index, item in enumerate(items):
+			write, task_oid, event, errors = self.build_write(item, project, request.user)
+			result = {
+				"index": index,
+				"op": item.get("op") if isinstance(item, dict) else None,
+				"id": str(task_oid) if task_oid else None,
+			}
+			# one operation per task: the existence query and the counters read each task's status once, before
+			# the batch, so a second operation on it would be counted against a status it no longer has
+			if not errors and result["op"] != "create":
+				if task_oid in targeted:
+					errors = {"id": ["Task appears in more than one operation of this batch"]}
+				targeted.add(task_oid)
+			if errors:
+				result.update(status="invalid", errors=errors)
+			else:
+				writes.append((index, task_oid, write))
+				published[index] = event
+			results.append(result)
+
+		# update/delete ids that are not tasks of this project are reported per item, in one query---------------------
+		# (which also returns their current status for the counters)
+		target_ids = [task_oid for index, task_oid, _ in writes if results[index]["op"] != "create"]
+		found = {}
+		if target_ids:
+			rows = Task.objects.filter(id__in=target_ids, project=project.id).only("id", "status").as_pymongo()
+			found = {row["_id"]: row.get("status", "Todo") for row in rows}
+			for index, task_oid, _ in writes:
+				if results[index]["op"] != "create" and task_oid not in found:
+					results[index].update(status="invalid", errors={"id": ["Task not found in this project"]})
+			writes = [entry for entry in writes if "status" not in results[entry[0]]]
+
+		invalid = len(writes) != len(items)
+		if invalid and ordered:
+			# an ordered batch runs all or nothing up to the first failure, so invalid input runs nothing
+			for result in results:
+				result.setdefault("status", "skipped")
+			return Response({"results": results, "detail": "Batch not applied, fix the invalid operations"},
+				status=status.HTTP_400_BAD_REQUEST)
+
+		# One bulk_write for everything that passed validation---------------------------------------------------------
+		failed = {}
+		applied_counts = {"nMatched": 0, "nRemoved": 0}
+		if writes:
+			try:
+				applied_counts = Task._get_collection().bulk_write([write for _, _, write in writes], ordered=ordered).bulk_api_result
+			except BulkWriteError as exc:
+				applied_counts = exc.details
+				for error in exc.details.get("writeErrors", []):
+					failed[error["index"]] = error.get("errmsg", "Write failed")
+				if ordered and failed:
+					# ordered stops at the first failed write, everything after it never ran
+					first = min(failed)
+					for position in range(first + 1, len(writes)):
+						failed.setdefault(position, None)
+
+		done = {"create": "created", "update": "updated", "delete": "deleted"}
+		deltas = Counter()
+		for position, (index, task_oid, _) in enumerate(writes):
+			if position not in failed:
+				op = results[index]["op"]
+				results[index]["status"] = done[op]
+				new_status = (items[index].get("data") or {}).get("status")
+				if op == "create":
+					deltas[new_status or "Todo"] += 1
+				elif op == "delete":
+					deltas[found[task_oid]] -= 1
+				elif new_status:
+					deltas[found[task_oid]] -= 1
+					deltas[new_status] += 1
+			elif failed[position] is None:
+				results[index]["status"] = "skipped"
+			else:
+				results[index].update(status="failed", errors={"write": [failed[position]]})
+
+		# The deltas above assume every update/delete matched the task the existence query saw-----------------------
+		# (each task is in one operation only). Fewer matches mean a concurrent write deleted some of them: updates of
+		# tasks that are gone are reported and not published, and the counters are recounted instead of trusted
+		targets = sum(1 for index, _, _ in writes if results[index]["status"] in ("updated", "deleted"))
+		recount = applied_counts["nMatched"] + applied_counts["nRemoved"] < targets
+		if recount:
+			updated = {task_oid for index, task_oid, _ in writes if results[index]["status"] == "updated"}
+			still_there = set(Task.objects.filter(id__in=list(updated)).scalar("id")) if updated else set()
+			for index, task_oid, _ in writes:
+				if task_oid in updated - still_there:
+					results[index].update(status="failed", errors={"id": ["Task was deleted while the batch ran"]})
+
+		applied_indexes = [index for index, _, _ in writes if results[index]["status"] in ("created", "updated", "deleted")]
+		if applied_indexes:
+			project_cache.invalidate("task", *found)
+			versions.project_changed(project.id, request.user.id, None if recount else deltas)
+			if recount:
+				counters.recount(project.id)
+			for index in applied_indexes:
+				events.publish(project.id, *published[index])
+
+		summary = {name: 0 for name in ("created", "updated", "deleted", "invalid", "failed", "skipped")}
+		for result in results:
+			summary[result["status"]] += 1
+		applied = summary["created"] + summary["updated"] + summary["deleted"]
+		code = status.HTTP_200_OK if applied == len(items) else status.HTTP_207_MULTI_STATUS
+		if not applied:
+			code = status.HTTP_400_BAD_REQUEST
+		return Response({"results": results, "summary": summary}, status=code)
+
+
+#Streaming NDJSON export and import of a project's tasks (project_handler/transfer.py).
+
+class TaskExportAPIView(ReadRoutingMixin, APIView):
+	permission_classes = (IsAuthenticated,)
+
+	# every task of the project as NDJSON (one task list row per line, oldest first), streamed from one cursor
+	# in batches of TASK_TRANSFER["EXPORT_BATCH_SIZE"]
+	def get(self, request, project_id):
+		# Checking project ownership------------------------------------------------------------------------------------
+		project, error = owned_project(request.user, project_id)
+		if error:
+			return error
+		# Streaming the tasks (the collection is routed here, the body is read after the view returns)---------------
+		collection = read_routing.route_read(Task._get_collection())
+		response = StreamingHttpResponse(transfer.export_chunks(collection, project.id), content_type="application/x-ndjson")
+		response["Content-Disposition"] = f'attachment; filename="project-{project.id}-tasks.ndjson"'
+		return response
+
+
+class TaskImportAPIView(APIView):
+	permission_classes = (IsAuthenticated,)
+
+	# creates tasks from an NDJSON body (one task per line: title, description, status, optional created_at), read
+	# line by line and written in chunks of TASK_TRANSFER["IMPORT_CHUNK_SIZE"]; invalid lines are skipped and reported.
+	# The response streams the report as NDJSON: error lines, one progress line per chunk, a summary line last
+	def post(self, request, project_id):
+		# Checking project ownership------------------------------------------------------------------------------------
+		project, error = owned_project(request.user, project_id)
+		if error:
+			return error
+		# Streaming the report while the body is read (request.data is never touched, nothing is parsed up front)------
+		importer = transfer.TaskImport(project, request.user)
+		return StreamingHttpResponse(importer.run(request.stream or BytesIO()), content_type="application/x-ndjson")
+
+
+#Task counts per status for one project, served from the counters stored on the project.
+
+class TaskSummaryAPIView(ReadRoutingMixin, APIView):
+	permission_classes = (IsAuthenticated,)
+	# read-your-writes: the counters are usually read right after a task write, a lagging secondary would show old counts
+	read_preference = "primary"
+
+	# one read of the project's counters filtered by id + owner; a project without counters yet (created before
+	# they existed) is counted once with the $group fallback and the result is stored for the next call
+	def get(self, request, project_id):
+		# Reading the counters with the ownership check inside the filter--------------------------------------------
+		project_oid = to_object_id(project_id)
+		row = None
+		if project_oid is not None:
+			row = read_routing.route_read(Project._get_collection()).find_one(
+				{"_id": project_oid, "owner": request.user.id, "deleted_at": None}, {"task_counts": 1}
+			)
+		# Nothing matched: checking existence to pick 404/403-----------------------------------------------------------
+		if row is None:
+			project = read_routing.route_read(Project.objects.filter(id=project_oid, deleted_at=None))
+			if project_oid is not None and project.only("id").first():
+				return Response({"detail": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
+			return Response({"detail": "Project not found"}, status=status.HTTP_404_NOT_FOUND)
+		counts = row.get("task_counts")
+		if counts is None:
+			counts = counters.recount(project_oid)
+		return Response(counters.summary(project_oid, counts), status=status.HTTP_200_OK)
+
+
+#Full-text search over the logged-in user's projects and tasks.
+
+class SearchAPIView(ReadRoutingMixin, APIView):
+	permission_classes = (IsAuthenticated,)
+
+	types = tuple(search.KINDS)
+
+	# one ranked page of the user's projects and tasks matching ?q= (any of its words), best match first;
+	# ?type=project or ?type=task narrows it, ?cursor= / ?limit= page through the first MAX_RESULTS hits.
+	# Every project/task write of the user changes the list version, so an unchanged poll gets 304
+	def get(self, request):
+		# Variables---------------------------------------------------------------------------------------------------
+		user = request.user
+		query = request.query_params.get("q", "").strip()
+		kinds = [name for name in request.query_params.get("type", "").split(",") if name] or list(self.types)
+		unknown = [name for name in kinds if name not in self.types]
+		# Checking the query------------------------------------------------------------------------------------------
+		if not query:
+			return Response({"detail": "Query parameter q is required"}, status=status.HTTP_400_BAD_REQUEST)
+		if unknown:
+			return Response({"detail": f"Unknown type {unknown}, choose from {self.types}"},
+				status=status.HTTP_400_BAD_REQUEST)
+		paginator = RankedPagination(request, search.config()["MAX_RESULTS"])
+		# Answering an unchanged poll from the owner's list version----------------------------------------------------
+		version = versions.list_version(user.id)
+		etag = versions.etag(request, "search", version)
+		if versions.matches(request, etag):
+			return versions.not_modified(etag)
+		# Ranking the hits up to the end of this page------------------------------------------------------------------
+		hits = search.search(user.id, version, search.query_terms(query), kinds, paginator.window)
+		page, next_cursor, prev_cursor = paginator.build_ranked_page(hits)
+		data = [search.to_result(hit) for hit in page]
+		response = Response(paginator.get_paginated_data(data, next_cursor, prev_cursor), status=status.HTTP_200_OK)
+		return versions.tagged(response, etag)
+
+
+# Counters of the project/task read-through cache (project_handler/cache.py).
+
+class ProjectCacheStatsAPIView(APIView):
+	"""
+	Returns the hit/miss/set/invalidation counters of the project cache, per entry kind.
+	The counters are kept per worker process, even when the cache backend itself is shared.
+	"""
+	permission_classes = (IsAuthenticated,)
+
+	def get(self, request):
+		return Response(project_cache.stats(), status=status.HTTP_200_OK)
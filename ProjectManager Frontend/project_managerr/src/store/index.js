@@ -29,6 +29,7 @@ export default new Vuex.Store({
             const user = response.data.user;
 
             localStorage.setItem('token', token);
+            localStorage.setItem('refresh', response.data.refresh);
             localStorage.setItem('user', JSON.stringify(user));
             // Set default header for future requests
             axios.defaults.headers.common['Authorization'] = 'Bearer ' + token;
@@ -42,15 +43,27 @@ export default new Vuex.Store({
             const user = response.data.user;
 
             localStorage.setItem('token', token);
+            localStorage.setItem('refresh', response.data.refresh);
             localStorage.setItem('user', JSON.stringify(user));
             axios.defaults.headers.common['Authorization'] = 'Bearer ' + token;
 
             commit('auth_success', { token, user });
             return response;
         },
-        logout({ commit }) {
+        async logout({ commit }) {
+            // Revoke the tokens server-side; the local session is cleared even if this fails
+            const refresh = localStorage.getItem('refresh');
+            if (refresh) {
+                try {
+                    await axios.post('/auth/logout/', { refresh });
+                } catch (error) {
+                    // already expired or revoked
+                }
+            }
+
             commit('logout');
             localStorage.removeItem('token');
+            localStorage.removeItem('refresh');
             localStorage.removeItem('user');
             delete axios.defaults.headers.common['Authorization'];
         }